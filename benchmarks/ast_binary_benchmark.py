@@ -0,0 +1,65 @@
+"""Binary AST benchmark.
+
+Compares three ways of getting the Program of a large synthetic Noggin source
+into memory: lexing and parsing the source, unpickling the Program and its
+tokens, and loading the binary form of parser_binary. The size of the pickle
+and of the binary form are reported too.
+
+Usage: python benchmarks/ast_binary_benchmark.py [number of functions]
+"""
+
+import os
+import pickle
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'noggin'))
+
+import parser_binary
+from lexer_regex import RegexLexerContext
+from parser_code import ParserContext
+from parser_elements import Program
+
+from lexer_benchmark import synthetic_source
+
+
+def best_time(run, repeats=3):
+    """Return the result of run() and the least time it took."""
+    best = None
+    for i in range(repeats):
+        start = time.perf_counter()
+        result = run()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return result, best
+
+
+def lex_and_parse(source):
+    lexer = RegexLexerContext()
+    lexer.set_source(source)
+    tokens = lexer.lex_buffer()
+    return tokens, Program.parse(parser=ParserContext(tokens))
+
+
+def main():
+    functions = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    source = synthetic_source(functions)
+
+    (tokens, program), parseTime = best_time(lambda: lex_and_parse(source))
+    pickled = pickle.dumps((list(tokens), program), pickle.HIGHEST_PROTOCOL)
+    unused, pickleTime = best_time(lambda: pickle.loads(pickled))
+    binary = parser_binary.dumps(program, tokens)
+    (loadedTokens, loaded), binaryTime = best_time(
+        lambda: parser_binary.loads(binary))
+    assert str(loaded) == str(program)
+
+    print("%d functions, %d lines, %d tokens" % (functions,
+        source.count('\n'), len(tokens)))
+    print("lex and parse: %.3fs" % parseTime)
+    print("pickle:        %.3fs, %.1f MB" % (pickleTime, len(pickled) / 1e6))
+    print("binary:        %.3fs, %.1f MB" % (binaryTime, len(binary) / 1e6))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""AST memory benchmark.
+
+Parses a large synthetic Noggin program and reports the memory held by its
+syntax tree, per node, with the slotted node classes of parser_elements. For
+comparison the same tree is copied into plain classes keeping their fields in
+a per-instance __dict__, as the node classes did before, and the memory held
+by the copy is reported too. The tokens are held by both trees alike, so they
+are left out of both counts.
+
+Usage: python benchmarks/ast_memory_benchmark.py [number of nodes]
+"""
+
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'noggin'))
+
+import parser_elements
+from lexer_regex import RegexLexerContext
+from parser_code import ParserContext
+from parser_elements import Program
+
+from lexer_benchmark import synthetic_source
+
+# The node classes are the classes defined in parser_elements
+nodeClasses = set(value for value in vars(parser_elements).values()
+    if isinstance(value, type)
+        and value.__module__ == parser_elements.__name__)
+
+
+def fields(node):
+    """Return the names of the fields of a slotted node or node class."""
+    if not isinstance(node, type):
+        node = type(node)
+    names = []
+    for cls in reversed(node.__mro__):
+        names.extend(cls.__dict__.get('__slots__', ()))
+    return names
+
+
+def children(value):
+    """Return the nodes directly under a field value."""
+    if type(value) in nodeClasses:
+        return [value]
+    if isinstance(value, list):
+        return [v for v in value if type(v) in nodeClasses]
+    return []
+
+
+def count_nodes(program):
+    """Return the number of nodes in the tree, without recursion.
+
+    A node held in two fields, as an ident is by a function call expression,
+    is only counted once.
+    """
+    seen = set()
+    stack = [program]
+    while stack:
+        node = stack.pop()
+        if id(node) in seen:
+            continue
+        seen.add(id(node))
+        for name in fields(node):
+            stack.extend(children(getattr(node, name, None)))
+    return len(seen)
+
+
+def plain_class(cls):
+    """Return a plain class standing in for a node class.
+
+    Its constructor sets every field, in the order of the slots, as the
+    constructors of the node classes did before, so that the instances share
+    the keys of their __dict__s as they did then.
+    """
+    names = fields(cls)
+
+    def __init__(self, *values):
+        for name, value in zip(names, values):
+            setattr(self, name, value)
+
+    return type(cls.__name__, (object,), {'__init__': __init__})
+
+
+plainClasses = dict((cls, plain_class(cls)) for cls in nodeClasses)
+
+
+def plain_copy(program):
+    """Return a copy of the tree made of plain classes, without recursion."""
+    order = []
+    seen = set()
+    stack = [program]
+    while stack:
+        node = stack.pop()
+        if id(node) in seen:
+            continue
+        seen.add(id(node))
+        order.append(node)
+        for name in fields(node):
+            stack.extend(children(getattr(node, name, None)))
+
+    copies = {}
+
+    def copy_value(value):
+        if type(value) in nodeClasses:
+            return copies[id(value)]
+        if isinstance(value, list):
+            return [copy_value(v) for v in value]
+        return value
+
+    # Every node comes after the nodes under it in the reversed order
+    for node in reversed(order):
+        copies[id(node)] = plainClasses[type(node)](*[
+            copy_value(getattr(node, name, None))
+            for name in fields(node)])
+    return copies[id(program)]
+
+
+def held_memory(make):
+    """Return the result of make() and the memory it still holds."""
+    tracemalloc.start()
+    result = make()
+    # Free whatever make() left in reference cycles before measuring
+    gc.collect()
+    held = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, held
+
+
+def main():
+    nodes = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+
+    # Work out how many functions give about the number of nodes asked for
+    lexer = RegexLexerContext()
+    lexer.set_source(synthetic_source(10))
+    sample = Program.parse(parser=ParserContext(lexer.lex_buffer()))
+    functions = max(1, nodes * 10 // count_nodes(sample))
+
+    lexer.set_source(synthetic_source(functions))
+    tokens = lexer.lex_buffer()
+    # Make every token view up front, so neither tree is charged for them
+    tokenList = list(tokens)
+
+    start = time.perf_counter()
+    program, slottedHeld = held_memory(
+        lambda: Program.parse(parser=ParserContext(tokenList)))
+    parseTime = time.perf_counter() - start
+    count = count_nodes(program)
+
+    plain, plainHeld = held_memory(lambda: plain_copy(program))
+
+    print("%d functions, %d nodes, parsed in %.3fs" % (functions, count,
+        parseTime))
+    print("slotted nodes: %.1f MB held (%.1f bytes per node)"
+        % (slottedHeld / 1e6, float(slottedHeld) / count))
+    print("__dict__ nodes: %.1f MB held (%.1f bytes per node)"
+        % (plainHeld / 1e6, float(plainHeld) / count))
+    print("saved: %.1f bytes per node (%.0f%%)"
+        % (float(plainHeld - slottedHeld) / count,
+            100.0 * (plainHeld - slottedHeld) / plainHeld))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Expression benchmark.
+
+Parses long chains of binary operators, both chains of one operator and
+chains cycling through operators of every precedence, and reports the time
+taken to parse each of them.
+
+Usage: python benchmarks/expression_benchmark.py [number of operators]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'noggin'))
+
+from lexer_regex import RegexLexerContext
+from parser_code import ParserContext
+from parser_elements import Expression
+
+operators = ['*', '/', '+', '-', '>>', '<<', '>', '<', '>=', '<=', '==',
+    '!=', '&', '|', '&&', '||']
+
+
+def chain(length, cycle):
+    """Return an expression of length operators, taken in turn from cycle."""
+    parts = ['1']
+    for i in range(length):
+        parts.append(cycle[i % len(cycle)])
+        parts.append(str(i % 100))
+    return ' '.join(parts)
+
+
+def time_parse(source, repeats=5):
+    """Return the best time of several parses of an expression."""
+    lexer = RegexLexerContext()
+    lexer.set_source(source)
+    tokens = lexer.lex_buffer()
+    best = None
+    for i in range(repeats):
+        parser = ParserContext(tokens)
+        start = time.perf_counter()
+        Expression.parse(parser=parser)
+        taken = time.perf_counter() - start
+        if best is None or taken < best:
+            best = taken
+    return best
+
+
+def main():
+    length = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    for name, cycle in [
+            ("same operator", ['+']),
+            ("all operators", operators),
+            ("descending", list(reversed(operators)))]:
+        taken = time_parse(chain(length, cycle))
+        print("%-14s %d operators parsed in %.3fs (%.2f us per operator)"
+            % (name + ":", length, taken, taken * 1e6 / length))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Lexer benchmark.
+
+Lexes a large synthetic Noggin source with both lexer engines, once after
+reading the file into a string buffer and once straight out of a memory map,
+and reports the time taken and the memory allocated by each run.
+
+Usage: python benchmarks/lexer_benchmark.py [number of functions]
+"""
+
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'noggin'))
+
+from lexer_code import Lexer
+from lexer_regex import RegexLexer
+
+FUNCTION_TEMPLATE = """
+# generated function number %(n)d
+function int generated%(n)d(int a, uint b) {
+    declare int total = 0;
+    declare uint mask = 0x%(n)X;
+    while (total < a) {
+        total = total + b * %(n)d - 0b101;
+        if (total >= 100) {
+            print("generated function %(n)d");
+        } elif (total == 0o17) {
+            mask = mask << 2;
+        }
+    }
+    return total;
+}
+"""
+
+
+DECLARATION_TEMPLATE = """declare function int generated%(n)d(int a, uint b);
+"""
+
+
+def synthetic_source(functions):
+    """Return a synthetic Noggin program with the given number of functions."""
+    return ("declare function void print(string s);\n"
+        + "".join(DECLARATION_TEMPLATE % {'n': n} for n in range(functions))
+        + "".join(FUNCTION_TEMPLATE % {'n': n} for n in range(functions)))
+
+
+def lex_tokens(lexer):
+    tokens = []
+    t = lexer.lex()
+    while t is not None:
+        tokens.append(t)
+        t = lexer.lex()
+    return tokens
+
+
+def bench(lexer, load, path):
+    """Lex the file at path after loading it into the lexer with load.
+
+    Returns the token count, the time taken and the peak memory allocated,
+    which is measured in a second run so that tracing does not affect the
+    timing.
+    """
+    start = time.perf_counter()
+    load(lexer, path)
+    count = len(lex_tokens(lexer))
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    load(lexer, path)
+    lex_tokens(lexer)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return count, elapsed, peak
+
+
+def load_buffer(lexer, path):
+    with open(path) as f:
+        lexer.set_source(f.read())
+
+
+def load_mapped(lexer, path):
+    lexer.set_source_file(path)
+
+
+def main():
+    functions = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    source = synthetic_source(functions)
+    fd, path = tempfile.mkstemp(suffix='.ngs')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(source)
+        print("Synthetic source: %d functions, %d bytes"
+            % (functions, len(source)))
+
+        for lexerName, lexer in [("hand", Lexer), ("regex", RegexLexer)]:
+            for loadName, load in [("string buffer", load_buffer),
+                    ("memory map", load_mapped)]:
+                count, elapsed, peak = bench(lexer, load, path)
+                print("%-5s %-14s %d tokens in %.3fs, peak allocated %.1f MB"
+                    % (lexerName, loadName + ":", count, elapsed, peak / 1e6))
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
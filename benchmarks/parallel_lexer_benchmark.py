@@ -0,0 +1,49 @@
+"""Parallel lexer benchmark.
+
+Lexes a large synthetic Noggin program into a TokenBuffer with one RegexLexer
+and then with lex_parallel() on an increasing number of worker processes,
+checking that every run gives the same tokens.
+
+Usage: python benchmarks/parallel_lexer_benchmark.py [number of functions]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'noggin'))
+
+from lexer_regex import RegexLexer
+from lexer_parallel import lex_parallel
+
+from lexer_benchmark import synthetic_source
+
+
+def fields(buffer):
+    return (buffer.kinds, buffer.starts, buffer.ends, buffer.lines,
+        buffer.columns, buffer.symbols)
+
+
+def main():
+    functions = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    source = synthetic_source(functions)
+
+    start = time.perf_counter()
+    RegexLexer.set_source(source)
+    serial = RegexLexer.lex_buffer()
+    serialTime = time.perf_counter() - start
+    print("serial:     %d tokens in %.3fs" % (len(serial), serialTime))
+
+    workers = 1
+    while workers <= max(os.cpu_count(), 2):
+        start = time.perf_counter()
+        buffer = lex_parallel(source, workers, len(source) // (4 * workers))
+        parallelTime = time.perf_counter() - start
+        assert fields(buffer) == fields(serial)
+        print("%2d workers: %d tokens in %.3fs (%.2fx)"
+            % (workers, len(buffer), parallelTime, serialTime / parallelTime))
+        workers *= 2
+
+
+if __name__ == "__main__":
+    main()
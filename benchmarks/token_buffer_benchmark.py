@@ -0,0 +1,66 @@
+"""Token buffer benchmark.
+
+Lexes a large synthetic Noggin program into a list of Token objects and into
+a TokenBuffer, reporting the memory held by each, and then parses the program
+from each of them.
+
+Usage: python benchmarks/token_buffer_benchmark.py [number of functions]
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'noggin'))
+
+from lexer_regex import RegexLexer
+from parser_code import Parser
+from parser_elements import Program
+
+from lexer_benchmark import synthetic_source
+
+
+def held_memory(make):
+    """Return the result of make() and the memory it still holds."""
+    tracemalloc.start()
+    result = make()
+    held = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, held
+
+
+def lex_list(source):
+    RegexLexer.set_source(source)
+    return list(RegexLexer.tokens())
+
+
+def lex_buffer(source):
+    RegexLexer.set_source(source)
+    return RegexLexer.lex_buffer()
+
+
+def time_parse(tokens):
+    Parser.set_tokens(tokens)
+    start = time.perf_counter()
+    Program.parse()
+    return time.perf_counter() - start
+
+
+def main():
+    functions = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    source = synthetic_source(functions)
+
+    for name, lex in [("token list", lex_list), ("token buffer", lex_buffer)]:
+        start = time.perf_counter()
+        tokens = lex(source)
+        lexTime = time.perf_counter() - start
+        tokens, held = held_memory(lambda: lex(source))
+        print("%-13s %d tokens, lexed in %.3fs, %.1f MB held (%.1f bytes per "
+            "token), parsed in %.3fs"
+            % (name + ":", len(tokens), lexTime, held / 1e6,
+                float(held) / len(tokens), time_parse(tokens)))
+
+
+if __name__ == "__main__":
+    main()
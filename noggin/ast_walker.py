@@ -0,0 +1,117 @@
+"""Syntax tree walker module.
+
+This module contains the AstWalker, the base of the passes over a parsed
+Program, such as the NameResolver and the TypeChecker, that go through the
+statements and expressions of its function bodies. Both statements and
+expressions are gone through with an explicit stack rather than by recursion,
+so deeply nested sources are fine.
+"""
+
+from parser_elements import *
+
+
+def subexpressions(expression):
+    """Return the expressions directly under an expression."""
+    if isinstance(expression, BinaryExpression):
+        return [expression.left, expression.right]
+    elif isinstance(expression, ArrayAccessExpression):
+        return expression.levelExpression
+    elif isinstance(expression, FunctionCallExpression):
+        return expression.callArguments.callExpressions
+    elif isinstance(expression, AssignmentExpression):
+        return [expression.expression]
+    return []
+
+
+class AstWalker(object):
+
+    """Walker of the statements and expressions of a Program.
+
+    A subclass gives a method for each kind of expression and statement, as
+    named in the rules below. The method of an expression is called once the
+    expressions under it have been walked. The method of a statement returns
+    the walks to be made next, as (method, node) pairs, such as the blocks
+    nested in it.
+    """
+
+    def __init__(self):
+        self.expressionRules = {
+            BinaryExpression: self.binary_expression,
+            VariableAccessExpression: self.variable_access,
+            ArrayAccessExpression: self.array_access,
+            FunctionCallExpression: self.function_call,
+            AssignmentExpression: self.assignment,
+            Bool: self.literal,
+            Number: self.literal,
+            Char: self.literal,
+            String: self.literal,
+        }
+        self.statementRules = {
+            DeclareStatement: self.declare,
+            ExpressionStatement: self.expression_statement,
+            IfElseStatement: self.if_else_statement,
+            WhileStatement: self.while_statement,
+            DoWhileStatement: self.do_while_statement,
+            ForLoopStatement: self.for_loop_statement,
+            SwitchStatement: self.switch_statement,
+            ReturnStatement: self.return_statement,
+            Statements: self.block,
+            BreakStatement: self.no_statement,
+            FallThroughStatement: self.no_statement,
+            ASMStatement: self.no_statement,
+        }
+
+    def walk_expression(self, expression):
+        """Visit an expression and every expression under it, each after the
+        expressions under it."""
+        # Each entry is an expression and whether the expressions under it
+        # have been pushed
+        stack = [(expression, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if expanded:
+                self.visit_expression(node)
+            elif not self.walked(node):
+                stack.append((node, True))
+                stack.extend((child, False)
+                    for child in reversed(subexpressions(node)))
+
+    def walked(self, expression):
+        """Return whether an expression, and so every expression under it,
+        has already been visited."""
+        return False
+
+    def visit_expression(self, expression):
+        self.expressionRules[type(expression)](expression)
+
+    def walk_statements(self, statements):
+        """Walk the statements of a block and every block nested in it."""
+        stack = [(self.block, statements)]
+        while stack:
+            method, node = stack.pop()
+            stack.extend(reversed(method(node)))
+
+    def block(self, statements):
+        rules = self.statementRules
+        return ([(self.open_scope, None)]
+            + [(rules[type(statement)], statement)
+                for statement in statements.statements]
+            + [(self.close_scope, None)])
+
+    # A walker that keeps track of the variables in scope does so here
+
+    def open_scope(self, node):
+        return []
+
+    def close_scope(self, node):
+        return []
+
+    def no_statement(self, statement):
+        return []
+
+    def for_loop_statement(self, statement):
+        # The loop variable is only in scope within the loop
+        return [(self.open_scope, None),
+            (self.for_loop_header, statement),
+            (self.block, statement.statements),
+            (self.close_scope, None)]
@@ -0,0 +1,243 @@
+"""Call graph module.
+
+This module contains the CallGraph of a parsed Program: which functions each
+function calls, found from the FunctionCallExpressions in its body, and which
+functions call it. Every declared function is in the graph, including those
+that are declared but not defined in the Program, such as print, which only
+ever have callers.
+
+The graph also groups the functions into their strongly connected
+components, found with Tarjan's algorithm. A function is recursive when its
+component holds more than one function, or it calls itself. The components
+are kept in bottom-up order, each after every component it calls into, which
+is the order to go through the functions in to always have gone through the
+callees of a function first, as inlining or working out stack usage needs.
+
+Each call is followed to its function by the declaration the NameResolver
+gave it, rather than by the name of the function.
+"""
+
+from name_resolver import NameResolver
+from parser_arena import nodeKinds, nodeFields
+from parser_elements import FunctionCallExpression
+
+
+def calls_under(statements):
+    """Return every FunctionCallExpression under some Statements, in order.
+
+    The declaration links set by name_resolver are not followed, so only the
+    calls in the statements themselves are found.
+    """
+    calls = []
+    stack = [statements]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, list):
+            stack.extend(reversed(value))
+        elif type(value) in nodeKinds:
+            if isinstance(value, FunctionCallExpression):
+                calls.append(value)
+            stack.extend(getattr(value, name, None)
+                for name in reversed(nodeFields[nodeKinds[type(value)]])
+                if name != 'declaration')
+    return calls
+
+
+class CallGraph(object):
+
+    """Call graph of a Program, with its recursion groups.
+
+    The functions are numbered in the order they are declared in the
+    Program. The callers and callees of each are kept as lists of those
+    numbers, each function only once, in the order it is first called.
+    """
+
+    def __init__(self, program, resolver=None):
+        """Construct the call graph of a Program.
+
+        Arguments:
+        program -- the Program
+        resolver -- the NameResolver the names of the Program have been
+            resolved by, or None to resolve them here first, in which case
+            a NameResolveException is raised for a call to a function that
+            is not declared
+        """
+        if resolver is None:
+            NameResolver().resolve(program)
+        # The FunctionDeclaration and FunctionDefinition of each function,
+        # the definition None if it is only declared, and the number of each
+        # function by the id of its declaration and by name
+        self.declarations = list(program.functionDeclarations)
+        self.definitions = [None] * len(self.declarations)
+        self.indices = dict((id(declaration), i)
+            for i, declaration in enumerate(self.declarations))
+        self.nameIndices = dict((str(declaration.functionName), i)
+            for i, declaration in enumerate(self.declarations))
+        self.callees = [[] for declaration in self.declarations]
+        self.callers = [[] for declaration in self.declarations]
+        # The number of calls made from one function to another, by the pair
+        # of their numbers
+        self.callCounts = {}
+
+        for definition in program.functionDefinitions:
+            caller = self.indices[id(definition.declaration)]
+            self.definitions[caller] = definition
+            for call in calls_under(definition.statements):
+                callee = self.indices[id(call.declaration)]
+                edge = (caller, callee)
+                if edge not in self.callCounts:
+                    self.callCounts[edge] = 0
+                    self.callees[caller].append(callee)
+                    self.callers[callee].append(caller)
+                self.callCounts[edge] += 1
+
+        # The strongly connected components, in bottom-up order, and the
+        # number of the component of each function
+        self.components = self.strongly_connected_components()
+        self.componentOf = [0] * len(self.declarations)
+        for c, component in enumerate(self.components):
+            for i in component:
+                self.componentOf[i] = c
+
+    def __len__(self):
+        return len(self.declarations)
+
+    def index_of(self, name):
+        """Return the number of the function of a name."""
+        return self.nameIndices[name]
+
+    def name(self, i):
+        """Return the name of function i."""
+        return str(self.declarations[i].functionName)
+
+    def is_leaf(self, i):
+        """Return whether function i calls no functions."""
+        return not self.callees[i]
+
+    def is_recursive(self, i):
+        """Return whether function i can call itself, directly or not."""
+        return len(self.components[self.componentOf[i]]) > 1 \
+            or (i, i) in self.callCounts
+
+    def strongly_connected_components(self):
+        """Return the strongly connected components, in bottom-up order.
+
+        This is Tarjan's algorithm, with an explicit stack of the functions
+        being visited rather than recursion, so a long chain of calls is
+        fine. Tarjan's algorithm finishes each component after every
+        component reachable from it, which is the bottom-up order.
+        """
+        callees = self.callees
+        count = len(callees)
+        order = [None] * count
+        lowLinks = [0] * count
+        onStack = [False] * count
+        stack = []
+        components = []
+        visited = 0
+        for root in range(count):
+            if order[root] is not None:
+                continue
+            # Each entry is a function and the number of its callees gone
+            # through so far
+            work = [(root, 0)]
+            while work:
+                v, i = work.pop()
+                if i == 0:
+                    order[v] = lowLinks[v] = visited
+                    visited += 1
+                    stack.append(v)
+                    onStack[v] = True
+                else:
+                    # Back from visiting the callee before callee i
+                    lowLinks[v] = min(lowLinks[v], lowLinks[callees[v][i - 1]])
+                edges = callees[v]
+                descended = False
+                while i < len(edges):
+                    w = edges[i]
+                    i += 1
+                    if order[w] is None:
+                        work.append((v, i))
+                        work.append((w, 0))
+                        descended = True
+                        break
+                    elif onStack[w]:
+                        lowLinks[v] = min(lowLinks[v], order[w])
+                if descended:
+                    continue
+                if lowLinks[v] == order[v]:
+                    component = []
+                    while True:
+                        w = stack.pop()
+                        onStack[w] = False
+                        component.append(w)
+                        if w == v:
+                            break
+                    component.reverse()
+                    components.append(component)
+        return components
+
+    def bottom_up(self):
+        """Return the function numbers, each after every function it calls,
+        but for calls within a recursion group."""
+        return [i for component in self.components for i in component]
+
+    def stack_usage(self, frameSizes):
+        """Return the most stack each function can use, including the
+        functions it calls.
+
+        Arguments:
+        frameSizes -- the NameResolver the Program was resolved by, or a
+            mapping from each FunctionDefinition to the size of its frame
+
+        A function that is only declared, such as print, is taken to use no
+        stack. The usage of a recursive function, or of any function that can
+        call one, has no bound, and is None.
+        """
+        if isinstance(frameSizes, NameResolver):
+            frame_size = frameSizes.frame_size
+        else:
+            frame_size = frameSizes.__getitem__
+        usage = [None] * len(self.declarations)
+        for component in self.components:
+            if self.is_recursive(component[0]):
+                continue
+            i = component[0]
+            deepest = 0
+            for callee in self.callees[i]:
+                if usage[callee] is None:
+                    deepest = None
+                    break
+                deepest = max(deepest, usage[callee])
+            if deepest is not None:
+                definition = self.definitions[i]
+                if definition is not None:
+                    deepest += frame_size(definition)
+                usage[i] = deepest
+        return usage
+
+    def dump(self):
+        """Return a listing of the graph, a line for each function in
+        bottom-up order."""
+        lines = []
+        for i in self.bottom_up():
+            line = self.name(i) + ":"
+            if self.definitions[i] is None:
+                line += " not defined"
+            else:
+                line += " calls %s" % (", ".join(
+                    "%s x%d" % (self.name(callee), self.callCounts[(i, callee)])
+                    for callee in self.callees[i]) or "nothing")
+            if self.callers[i]:
+                line += "; called by %s" % ", ".join(
+                    self.name(caller) for caller in self.callers[i])
+            if self.definitions[i] is not None and self.is_leaf(i):
+                line += "; leaf"
+            group = self.components[self.componentOf[i]]
+            if len(group) > 1:
+                line += "; recursive with %s" % ", ".join(
+                    self.name(j) for j in group if j != i)
+            elif self.is_recursive(i):
+                line += "; recursive"
+            lines.append(line)
+        return "\n".join(lines)
@@ -0,0 +1,26 @@
+"""Context shim module.
+
+The Lexer, RegexLexer and Parser used to keep all of their state as class
+attributes. Their state now lives in context objects, one per compilation,
+and the old class names are kept as shims over a default context so that
+code using the static interface, e.g. Lexer.set_source() or
+Parser.get_token(), keeps working.
+"""
+
+
+class ContextShim(type):
+
+    """Metaclass forwarding class attribute access to a default context.
+
+    Any attribute that the shim class does not define itself is read from
+    and written to the context object held in its 'default' attribute.
+    """
+
+    def __getattr__(cls, name):
+        return getattr(cls.default, name)
+
+    def __setattr__(cls, name, value):
+        if name in cls.__dict__:
+            type.__setattr__(cls, name, value)
+        else:
+            setattr(cls.default, name, value)
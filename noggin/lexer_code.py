@@ -1,270 +1,463 @@
 import sys
 from lexer_tokens import *
+from lexer_source import StringSource, MappedFileSource, universal_newlines
+from symbol_table import symbols
+from context_shim import ContextShim
+from noggin_trace import tracer, DEBUG, WARNING
 import string
 
-class Lexer:
+# Keyword and punctuation token classes, keyed by their source text
+
+wordTokens = {
+    'function': FunctionToken,
+    'if': IfToken,
+    'elif': ElifToken,
+    'else': ElseToken,
+    'do': DoToken,
+    'while': WhileToken,
+    'for': ForToken,
+    'return': ReturnToken,
+    'declare': DeclareToken,
+    'true': BoolToken,
+    'false': BoolToken,
+    'switch': SwitchToken,
+    'case': CaseToken,
+    'break': BreakToken,
+    'fallthrough': FallThroughToken,
+    'default': DefaultToken,
+    'asm': ASMToken
+}
+
+punctuationTokens = {
+    ';': SemiColonToken,
+    '=': AssignToken,
+    '(': LeftParenToken,
+    '{': LeftBraceToken,
+    '[': LeftSquareToken,
+    ')': RightParenToken,
+    '}': RightBraceToken,
+    ']': RightSquareToken,
+    ',': CommaToken,
+    ':': ColonToken,
+    '++': UnaryOperatorToken,
+    '--': UnaryOperatorToken
+}
+for binaryOperator in ['/', '*', '+', '-', '==', '!=', '>', '<', '>=', '<=',
+        '<<', '>>', '&', '|', '&&', '||']:
+    punctuationTokens[binaryOperator] = BinaryOperatorToken
+
+# The regex lexer matches a memory-mapped source as bytes, so it needs bytes
+# keys
+
+wordTokensBytes = dict(
+    (k.encode('ascii'), v) for k, v in wordTokens.items())
+punctuationTokensBytes = dict(
+    (k.encode('ascii'), v) for k, v in punctuationTokens.items())
+
+class LexerContext:
+
+    """State of the hand-written lexer for one source.
+
+    Each LexerContext lexes its own source, so several sources can be lexed
+    at once, e.g. on different threads. The Lexer class below keeps the old
+    static interface working over a default context.
+    """
 
     setUp = True
     currentLineNo = 1
-    currentCharNo = 1
     tokenStartCharNo = 0
     tokenEndCharNo = 0
 
-    printVerbose = True
+    # Where lexer events are reported, see noggin_trace
+    trace = tracer
+
+    # The LexerOverflowWarnings of the number literals lexed so far that do
+    # not fit in 32 bits
+    warnings = ()
 
     firstCharacterRead = False
     c = ''
-    string = ""
-
-    def get_char_stdin():
-        char = sys.stdin.read(1)
-        if len(char) > 0:
-            if ord(char) == 13:
-                # if we've just read a '\r' carriage return character
-                return get_char_stdin()
-            return char
+
+    # The source being lexed. source is the raw indexable data (a string or
+    # a memory map), sourceText is the source object handed to each token,
+    # and offset is the offset of the current character c in source.
+    source = None
+    sourceText = None
+    sourceLength = 0
+    offset = -1
+
+    # For a memory-mapped source, the offset just past the current character,
+    # which may be several bytes long, and the end offset and line start
+    # offset as they were just past the character before it. Carriage returns
+    # skipped after a token are then left out of its end.
+    nextOffset = 0
+    endOffset = 0
+    endLineStartOffset = 0
+
+    # Offset of the start of the current line, used to work out columns
+    lineStartOffset = 0
+
+    # Where the token currently being lexed started
+    tokenStartOffset = 0
+    tokenLineNo = 1
+    tokenLineStartOffset = 0
+
+    # The pool identifiers and literals are interned in
+    symbols = symbols
+
+    wordTokens = wordTokens
+    punctuationTokens = punctuationTokens
+
+    def reset(self, sourceText, source):
+        self.sourceText = sourceText
+        self.source = source
+        self.sourceLength = len(source)
+        self.offset = -1
+        self.nextOffset = 0
+        self.endOffset = 0
+        self.endLineStartOffset = 0
+        self.lineStartOffset = 0
+        self.currentLineNo = 1
+        self.tokenStartCharNo = 0
+        self.tokenEndCharNo = 0
+        self.tokenStartOffset = 0
+        self.tokenLineNo = 1
+        self.tokenLineStartOffset = 0
+        self.warnings = []
+        self.firstCharacterRead = False
+        self.c = ''
+
+    def set_source(self, text):
+        """Load a whole source text into the lexer buffer.
+
+        Arguments:
+        text -- the Noggin source code as a string
+
+        Newlines are made universal once here, a CRLF pair or a lone carriage
+        return each becoming one newline, so that lex() only has to advance
+        an integer cursor through the buffer. All of the line
+        and character bookkeeping is reset, so a new source can be lexed
+        after a previous one has been exhausted.
+        """
+        sourceText = StringSource(universal_newlines(text))
+        self.reset(sourceText, sourceText.data)
+        self.get_char = self.get_char_buffer
+        self.token_end = self.token_end_buffer
+
+    def set_source_file(self, path):
+        """Memory-map a source file and lex straight out of the mapping.
+
+        Arguments:
+        path -- the path of the Noggin source file
+
+        Tokens lexed from the file keep offsets into the mapping, so the
+        mapping is kept open for as long as those tokens are in use. The
+        returned MappedFileSource can be closed once they are no longer
+        needed.
+        """
+        sourceText = MappedFileSource(path)
+        self.reset(sourceText, sourceText.data)
+        self.get_char = self.get_char_mapped
+        self.token_end = self.token_end_mapped
+        return sourceText
+
+    def get_char_buffer(self):
+        """Advance the cursor and return the character under it."""
+        offset = self.offset + 1
+        if offset < self.sourceLength:
+            self.offset = offset
+            return self.source[offset]
+        self.offset = self.sourceLength
+        return None
+
+    def get_char_mapped(self):
+        """Advance the cursor through a memory map and return the character.
+
+        The mapping cannot be changed, so newlines are made universal here:
+        the carriage return of a CRLF pair is skipped over, and a lone one is
+        read as a newline. A character of several UTF-8 bytes is decoded
+        whole. Columns count characters, as they do in a string source, so
+        the line start offset is moved along by the bytes of each character
+        past its first and by each carriage return skipped.
+        """
+        offset = self.nextOffset
+        if offset > self.offset + 1:
+            self.lineStartOffset += offset - self.offset - 1
+        self.endOffset = offset
+        self.endLineStartOffset = self.lineStartOffset
+        while offset < self.sourceLength:
+            byte = self.source[offset]
+            if byte < 0x80:
+                if byte != 13:
+                    self.offset = offset
+                    self.nextOffset = offset + 1
+                    return chr(byte)
+                if offset + 1 == self.sourceLength \
+                        or self.source[offset + 1] != 10:
+                    self.offset = offset
+                    self.nextOffset = offset + 1
+                    return '\n'
+                self.lineStartOffset += 1
+                offset += 1
+            else:
+                (c, width) = self.decode_char(offset, byte)
+                self.offset = offset
+                self.nextOffset = offset + width
+                return c
+        self.offset = self.nextOffset = self.sourceLength
+        return None
+
+    def decode_char(self, offset, byte):
+        """Return the character of the UTF-8 sequence at an offset, and its
+        length in bytes.
+
+        A LexerException is raised for bytes that are not valid UTF-8.
+        """
+        if 0xC0 <= byte < 0xE0:
+            width = 2
+        elif 0xE0 <= byte < 0xF0:
+            width = 3
+        elif 0xF0 <= byte < 0xF8:
+            width = 4
         else:
-            return None
+            width = 1
+        try:
+            return (bytes(self.source[offset:offset + width]).decode('utf-8'),
+                width)
+        except UnicodeDecodeError:
+            raise LexerException("byte 0x%02X at offset %d" % (byte, offset),
+                "UTF-8 text")
 
-    get_char = get_char_stdin
+    get_char = get_char_buffer
 
-    @staticmethod
-    def check_for_new_line():
-        if Lexer.c == '\n':
-            if Lexer.printVerbose:
-                print("Newline at line: %d char: %d" % (Lexer.currentLineNo, Lexer.currentCharNo))
-            Lexer.advance_line()
+    def token_end_buffer(self):
+        """Return the end offset of the token lexed so far, and the offset of
+        the start of the line it ends on."""
+        return (self.offset, self.lineStartOffset)
+
+    def token_end_mapped(self):
+        return (self.endOffset, self.endLineStartOffset)
+
+    token_end = token_end_buffer
+
+    def check_for_new_line(self):
+        if self.c == '\n':
+            if self.trace.lexer <= DEBUG:
+                self.trace.event('lexer', DEBUG, 'newline',
+                    line=self.currentLineNo,
+                    column=self.offset - self.lineStartOffset + 1)
+            self.advance_line()
             return True
         return False
 
-    @staticmethod
-    def advance_line():
-        Lexer.currentLineNo += 1
-        Lexer.currentCharNo = 1
-        Lexer.c = Lexer.get_char()
+    def advance_line(self):
+        self.currentLineNo += 1
+        self.lineStartOffset = self.offset + 1
+        self.c = self.get_char()
 
-    @staticmethod
-    def continue_lexing_type():
-        Lexer.string += Lexer.c
-        Lexer.c = Lexer.get_char()
-        Lexer.tokenEndCharNo = Lexer.currentCharNo + 1
-        Lexer.currentCharNo += 1
+    def start_token(self):
+        """Mark the current character as the first one of a new token."""
+        self.tokenStartOffset = self.offset
+        self.tokenLineNo = self.currentLineNo
+        self.tokenLineStartOffset = self.lineStartOffset
 
-    @staticmethod
-    def lex():
-        Lexer.string = ""
+    def continue_lexing_type(self):
+        if self.c == '\n':
+            # Only string literals can run over more than one line
+            self.currentLineNo += 1
+            self.lineStartOffset = self.offset + 1
+        self.c = self.get_char()
+
+    def token_text(self):
+        """Return the text of the token lexed so far."""
+        return self.sourceText.text(self.tokenStartOffset, self.token_end()[0])
+
+    def make_token(self, tokenClass):
+        """Make a token of the given class from the token lexed so far.
+
+        The token only records its offsets into the source. Its columns are
+        worked out from the offset of the line it starts on. The text of
+        identifiers and literals is interned, so the token shares the one
+        copy of it held in the symbol table. Number literals are given their
+        value, and one that does not fit in 32 bits is added to the warnings
+        and traced. A LexerException is raised for a base prefix with no
+        digits after it, e.g. '0x'.
+        """
+        (endOffset, endLineStartOffset) = self.token_end()
+        self.tokenStartCharNo = \
+            self.tokenStartOffset - self.tokenLineStartOffset + 1
+        # A string literal can end on a later line than it starts on
+        self.tokenEndCharNo = endOffset - endLineStartOffset + 1
+        token = tokenClass.from_source(
+            self.sourceText,
+            self.tokenStartOffset,
+            endOffset,
+            self.tokenLineNo,
+            self.tokenStartCharNo,
+            self.tokenEndCharNo)
+        if tokenClass.interned:
+            symbol = self.symbols.intern(
+                self.sourceText.text(self.tokenStartOffset, endOffset))
+            token._symbol = symbol
+            token._original = self.symbols.names[symbol]
+            if tokenClass.kind in NumberToken.kinds:
+                token._value = number_value(self.symbols, symbol, tokenClass,
+                    self.c)
+                if token.overflows32:
+                    self.warnings.append(LexerOverflowWarning(token.original,
+                        token._value, token.lineNo, token.charStart))
+                    if self.trace.errors <= WARNING:
+                        self.trace.event('errors', WARNING, 'overflow',
+                            text=token.original,
+                            value=token._value,
+                            line=token.lineNo,
+                            column=token.charStart)
+        if self.trace.lexer <= DEBUG:
+            self.trace.event('lexer', DEBUG, 'token',
+                kind=tokenClass.__name__,
+                text=token.original,
+                line=token.lineNo,
+                column=token.charStart)
+        return token
 
-        if not Lexer.setUp:
+    def lex(self):
+        if not self.setUp:
             print("Error, lexer not set up!")
             sys.exit(1)
 
-        if not Lexer.firstCharacterRead:
-            Lexer.firstCharacterRead = True
-            Lexer.c = Lexer.get_char()
-
-        while Lexer.isCharWhitespace(Lexer.c) or Lexer.c == '#':
-            if Lexer.isCharWhitespace(Lexer.c):
-                if Lexer.printVerbose:
-                    print("Skipping over whitespace character")
-                if Lexer.check_for_new_line():
-                    pass
-                elif Lexer.c == ' ' or Lexer.c == '\t':
-                    Lexer.currentCharNo += 1
-                    Lexer.c = Lexer.get_char()
-            if Lexer.c == '#':
+        if not self.firstCharacterRead:
+            if self.source is None:
+                # No source has been given, so buffer the whole of stdin
+                self.set_source(sys.stdin.read())
+            self.firstCharacterRead = True
+            self.c = self.get_char()
+
+        while self.isCharWhitespace(self.c) or self.c == '#':
+            if self.isCharWhitespace(self.c):
+                if not self.check_for_new_line():
+                    self.c = self.get_char()
+            if self.c == '#':
                 # Then we have a comment for the rest of this line
-                if Lexer.printVerbose:
-                    print("Found a comment!")
-                Lexer.c = Lexer.get_char()
-                comment = ""
-                while Lexer.c != '\n':
-                    comment += Lexer.c
-                    Lexer.c = Lexer.get_char()
-                if Lexer.printVerbose:
-                    print("Complete comment: %s" % comment)
-                Lexer.advance_line()
-
-        if Lexer.c is None:
-            if Lexer.printVerbose:
-                print("Lexer.c is None, reached end")
+                commentStart = self.offset + 1
+                self.c = self.get_char()
+                while self.c is not None and self.c != '\n':
+                    self.c = self.get_char()
+                if self.trace.lexer <= DEBUG:
+                    self.trace.event('lexer', DEBUG, 'comment',
+                        line=self.currentLineNo,
+                        text=self.sourceText.text(commentStart,
+                            self.token_end()[0]))
+                if self.c is not None:
+                    self.advance_line()
+
+        if self.c is None:
+            if self.trace.lexer <= DEBUG:
+                self.trace.event('lexer', DEBUG, 'end',
+                    line=self.currentLineNo)
             return None
 
-        if Lexer.printVerbose:
-            print("Processing character: " + Lexer.c)
-        if Lexer.isCharIdentStarter(Lexer.c):
-            if Lexer.printVerbose:
-                print("Character is alphanumeric: " + Lexer.c)
-            Lexer.tokenStartCharNo = Lexer.currentCharNo
-            while Lexer.isCharIdentContinue(Lexer.c):
-                Lexer.continue_lexing_type()
-            return Lexer.makeWordToken(Lexer.string)
-        elif Lexer.c.isdigit():
-            if Lexer.printVerbose:
-                print("First character is number: " + Lexer.c)
+        self.start_token()
+        if self.isCharIdentStarter(self.c):
+            while self.isCharIdentContinue(self.c):
+                self.continue_lexing_type()
+            return self.makeWordToken(self.token_text())
+        elif self.c.isdigit():
             # Parse a number
-            Lexer.tokenStartCharNo = Lexer.currentCharNo
-            Lexer.string += Lexer.c
-            Lexer.c = Lexer.get_char()
+            self.c = self.get_char()
             # This is where a number can be base 2, 8, 10 or 16
-            if Lexer.printVerbose:
-                print("Second character is: " + Lexer.c)
-            if Lexer.c.isdigit():
-                if Lexer.printVerbose:
-                    print("Second character is digit: " + Lexer.c)
+            if self.isCharDigit(self.c):
                 # Standard base 10 uint literal
-                while Lexer.c.isdigit():
-                    Lexer.continue_lexing_type()
-                return UIntBase10Token(Lexer.string, Lexer.currentLineNo, Lexer.tokenStartCharNo, Lexer.tokenEndCharNo)
-            elif Lexer.c == 'b':
-                if Lexer.printVerbose:
-                    print("Second character is binary start: " + Lexer.c)
+                while self.isCharDigit(self.c):
+                    self.continue_lexing_type()
+                return self.make_token(UIntBase10Token)
+            elif self.c == 'b':
                 # Binary literal
-                Lexer.string += Lexer.c
-                Lexer.c = Lexer.get_char()
-                while Lexer.c == '0' or Lexer.c == '1':
-                    if Lexer.printVerbose:
-                        print("Next binary character is: " + Lexer.c)
-                    Lexer.continue_lexing_type()
-                return UIntBase2Token(Lexer.string, Lexer.currentLineNo, Lexer.tokenStartCharNo, Lexer.tokenEndCharNo)
-            elif Lexer.c == 'o':
-                if Lexer.printVerbose:
-                    print("Second character is octal start: " + Lexer.c)
+                self.c = self.get_char()
+                while self.c == '0' or self.c == '1':
+                    self.continue_lexing_type()
+                return self.make_token(UIntBase2Token)
+            elif self.c == 'o':
                 # Octal literal
-                Lexer.string += Lexer.c
-                Lexer.c = Lexer.get_char()
-                while ord('0') <= ord(Lexer.c) <= ord('7'):
-                    Lexer.continue_lexing_type()
-                return UIntBase8Token(Lexer.string, Lexer.currentLineNo, Lexer.tokenStartCharNo, Lexer.tokenEndCharNo)
-            elif Lexer.c == 'x':
-                if Lexer.printVerbose:
-                    print("Second character is hexadecimal start: " + Lexer.c)
+                self.c = self.get_char()
+                while self.c is not None and '0' <= self.c <= '7':
+                    self.continue_lexing_type()
+                return self.make_token(UIntBase8Token)
+            elif self.c == 'x':
                 # Hexadecimal literal
-                Lexer.string += Lexer.c
-                Lexer.c = Lexer.get_char()
-                while ord('0') <= ord(Lexer.c) <= ord('9') or ord('A') <= ord(Lexer.c) <= ord('F'):
-                    Lexer.continue_lexing_type()
-                return UIntBase16Token(Lexer.string, Lexer.currentLineNo, Lexer.tokenStartCharNo, Lexer.tokenEndCharNo)
+                self.c = self.get_char()
+                while self.c is not None and ('0' <= self.c <= '9'
+                        or 'A' <= self.c <= 'F' or 'a' <= self.c <= 'f'):
+                    self.continue_lexing_type()
+                return self.make_token(UIntBase16Token)
             else:
-                return UIntBase10Token(Lexer.string, Lexer.currentLineNo, Lexer.tokenStartCharNo, Lexer.tokenEndCharNo)
-        elif Lexer.isCharPunctuation(Lexer.c):
-            if Lexer.printVerbose:
-                print("Looking at punctuation character: " + Lexer.c)
-            Lexer.tokenStartCharNo = Lexer.currentCharNo
-            if Lexer.c == "-":
-                if Lexer.printVerbose:
-                    print("Found possible signed number character: " + Lexer.c)
+                return self.make_token(UIntBase10Token)
+        elif self.isCharPunctuation(self.c):
+            if self.c == "-":
                 # This could either be a signed number or an operator
-                Lexer.string += Lexer.c
-                Lexer.c = Lexer.get_char()
-                if Lexer.c.isdigit():
+                self.c = self.get_char()
+                if self.isCharDigit(self.c):
                     # This is a signed number
-                    if Lexer.printVerbose:
-                        print("This is a signed number")
-                    while Lexer.c.isdigit():
-                        Lexer.continue_lexing_type()
-                    return IntBase10Token(Lexer.string, Lexer.currentLineNo, Lexer.tokenStartCharNo, Lexer.tokenEndCharNo)
+                    while self.isCharDigit(self.c):
+                        self.continue_lexing_type()
+                    return self.make_token(IntBase10Token)
                 else:
-                    return Lexer.makePunctuationToken(Lexer.string)
+                    return self.makePunctuationToken(self.token_text())
 
-            elif Lexer.isCharSinglePunctuation(Lexer.c):
-                if Lexer.printVerbose:
-                    print("Punctuation is singleton")
-                Lexer.continue_lexing_type()
-            elif Lexer.c == '\'':
+            elif self.isCharSinglePunctuation(self.c):
+                self.continue_lexing_type()
+            elif self.c == '\'':
                 # Lex a character
-                Lexer.continue_lexing_type()
-                if Lexer.c == '\\':
+                self.continue_lexing_type()
+                if self.c == '\\':
                     # Lex an escaped character, so two chars must be read
-                    Lexer.continue_lexing_type()
-                Lexer.continue_lexing_type()
-                if Lexer.c == '\'':
+                    self.continue_lexing_type()
+                self.continue_lexing_type()
+                if self.c == '\'':
                     # The final character should be a single quote
-                    Lexer.continue_lexing_type()
-                    return CharToken(Lexer.string, Lexer.currentLineNo, Lexer.tokenStartCharNo, Lexer.tokenEndCharNo)
+                    self.continue_lexing_type()
+                    return self.make_token(CharToken)
                 else:
-                    raise LexerException(Lexer.c, '\'')
-            elif Lexer.c == '\"':
+                    raise LexerException(self.c, '\'')
+            elif self.c == '\"':
                 # Lex a string
-                Lexer.continue_lexing_type()
-                while Lexer.c != "\"":
+                self.continue_lexing_type()
+                while self.c != "\"":
+                    if self.c is None:
+                        raise LexerException(self.c, '\"')
                     # Lex the next character in the string
-                    Lexer.continue_lexing_type()
-                Lexer.continue_lexing_type()
-                return StringToken(Lexer.string, Lexer.currentLineNo, Lexer.tokenStartCharNo, Lexer.tokenEndCharNo)
+                    self.continue_lexing_type()
+                self.continue_lexing_type()
+                return self.make_token(StringToken)
             else:
-                Lexer.continue_lexing_type()
-                if Lexer.isCharSecondPunctuation(Lexer.c):
-                    Lexer.continue_lexing_type()
-            return Lexer.makePunctuationToken(Lexer.string)
+                self.continue_lexing_type()
+                if self.isCharSecondPunctuation(self.c):
+                    self.continue_lexing_type()
+            return self.makePunctuationToken(self.token_text())
         return None
 
-    @staticmethod
-    def makeWordToken(s):
-        if Lexer.printVerbose:
-            print("Making word token from \"%s\", length: %d" % (s, len(s)))
-        if s == 'function':
-            return FunctionToken(s, Lexer.currentLineNo, Lexer.tokenStartCharNo, Lexer.tokenEndCharNo)
-        elif s == 'if':
-            return IfToken(s, Lexer.currentLineNo, Lexer.tokenStartCharNo, Lexer.tokenEndCharNo)
-        elif s == 'elif':
-            return ElifToken(s, Lexer.currentLineNo, Lexer.tokenStartCharNo, Lexer.tokenEndCharNo)
-        elif s == 'else':
-            return ElseToken(s, Lexer.currentLineNo, Lexer.tokenStartCharNo, Lexer.tokenEndCharNo)
-        elif s == 'do':
-            return DoToken(s, Lexer.currentLineNo, Lexer.tokenStartCharNo, Lexer.tokenEndCharNo)
-        elif s == 'while':
-            return WhileToken(s, Lexer.currentLineNo, Lexer.tokenStartCharNo, Lexer.tokenEndCharNo)
-        elif s == 'for':
-            return ForToken(s, Lexer.currentLineNo, Lexer.tokenStartCharNo, Lexer.tokenEndCharNo)
-        elif s == 'return':
-            return ReturnToken(s, Lexer.currentLineNo, Lexer.tokenStartCharNo, Lexer.tokenEndCharNo)
-        elif s == 'declare':
-            return DeclareToken(s, Lexer.currentLineNo, Lexer.tokenStartCharNo, Lexer.tokenEndCharNo)
-        elif s == 'true' or s == 'false':
-            return BoolToken(s, Lexer.currentLineNo, Lexer.tokenStartCharNo, Lexer.tokenEndCharNo)
-        elif s == 'switch':
-            return SwitchToken(s, Lexer.currentLineNo, Lexer.tokenStartCharNo, Lexer.tokenEndCharNo)
-        elif s == 'case':
-            return CaseToken(s, Lexer.currentLineNo, Lexer.tokenStartCharNo, Lexer.tokenEndCharNo)
-        elif s == 'break':
-            return BreakToken(s, Lexer.currentLineNo, Lexer.tokenStartCharNo, Lexer.tokenEndCharNo)
-        elif s == 'fallthrough':
-            return FallThroughToken(s, Lexer.currentLineNo, Lexer.tokenStartCharNo, Lexer.tokenEndCharNo)
-        elif s == 'default':
-            return DefaultToken(s, Lexer.currentLineNo, Lexer.tokenStartCharNo, Lexer.tokenEndCharNo)
-        elif s == 'asm':
-            return ASMToken(s, Lexer.currentLineNo, Lexer.tokenStartCharNo, Lexer.tokenEndCharNo)
-        else:
-            return IdentToken(s, Lexer.currentLineNo, Lexer.tokenStartCharNo, Lexer.tokenEndCharNo)
+    def tokens(self):
+        """Generate the tokens of the source one at a time as they are lexed.
 
-    @staticmethod
-    def makePunctuationToken(s):
-        if s == ';':
-            return SemiColonToken(s, Lexer.currentLineNo, Lexer.tokenStartCharNo, Lexer.tokenEndCharNo)
-        elif s == '=':
-            return AssignToken(s, Lexer.currentLineNo, Lexer.tokenStartCharNo, Lexer.tokenEndCharNo)
-        elif s == '(':
-            return LeftParenToken(s, Lexer.currentLineNo, Lexer.tokenStartCharNo, Lexer.tokenEndCharNo)
-        elif s == '{':
-            return LeftBraceToken(s, Lexer.currentLineNo, Lexer.tokenStartCharNo, Lexer.tokenEndCharNo)
-        elif s == '[':
-            return LeftSquareToken(s, Lexer.currentLineNo, Lexer.tokenStartCharNo, Lexer.tokenEndCharNo)
-        elif s == ')':
-            return RightParenToken(s, Lexer.currentLineNo, Lexer.tokenStartCharNo, Lexer.tokenEndCharNo)
-        elif s == '}':
-            return RightBraceToken(s, Lexer.currentLineNo, Lexer.tokenStartCharNo, Lexer.tokenEndCharNo)
-        elif s == ']':
-            return RightSquareToken(s, Lexer.currentLineNo, Lexer.tokenStartCharNo, Lexer.tokenEndCharNo)
-        elif s == ',':
-            return CommaToken(s, Lexer.currentLineNo, Lexer.tokenStartCharNo, Lexer.tokenEndCharNo)
-        elif s == ':':
-            return ColonToken(s, Lexer.currentLineNo, Lexer.tokenStartCharNo, Lexer.tokenEndCharNo)
-        elif s == '/' or s == '*' or s == '+' or s == '-' or s == '==' or s == '!='\
-                or s == '>' or s == '<' or s == '>=' or s == '<=' or s == '<<' or s == '>>'\
-                or s == '&' or s == '|' or s == '&&' or s == '||':
-            return BinaryOperatorToken(s, Lexer.currentLineNo, Lexer.tokenStartCharNo, Lexer.tokenEndCharNo)
-        elif s == '++' or s == '--':
-            return UnaryOperatorToken(s, Lexer.currentLineNo, Lexer.tokenStartCharNo, Lexer.tokenEndCharNo)
+        This lets the Parser pull tokens lazily, so the whole token list
+        never has to be held in memory.
+        """
+        token = self.lex()
+        while token is not None:
+            yield token
+            token = self.lex()
+
+    def lex_buffer(self):
+        """Lex the rest of the source into a TokenBuffer."""
+        return TokenBuffer.from_tokens(self.tokens(), self.symbols)
+
+    def makeWordToken(self, s):
+        return self.make_token(self.wordTokens.get(s, IdentToken))
+
+    def makePunctuationToken(self, s):
+        tokenClass = self.punctuationTokens.get(s)
+        if tokenClass is None:
+            return None
+        return self.make_token(tokenClass)
 
     @staticmethod
     def isCharPunctuation(c):
@@ -283,7 +476,11 @@ class Lexer:
 
     @staticmethod
     def isCharWhitespace(c):
-        return str(c) in string.whitespace
+        return c is not None and c in string.whitespace
+
+    @staticmethod
+    def isCharDigit(c):
+        return c is not None and c.isdigit()
 
     @staticmethod
     def isCharIdentStarter(c):
@@ -291,7 +488,19 @@ class Lexer:
 
     @staticmethod
     def isCharIdentContinue(c):
-        return Lexer.isCharIdentStarter(c) or c.isdigit() or c == "-"
+        return c is not None \
+            and (LexerContext.isCharIdentStarter(c) or c.isdigit() or c == "-")
+
+class Lexer(metaclass=ContextShim):
+
+    """Static interface to the default LexerContext.
+
+    Lexer.set_source(), Lexer.lex() and every other attribute of a
+    LexerContext can still be used on the Lexer class itself, and act on
+    Lexer.default.
+    """
+
+    default = LexerContext()
 
 class LexerException(Exception):
     def __init__(self, string, expected):
@@ -299,5 +508,40 @@ class LexerException(Exception):
         self.expected = expected
 
     def __str__(self):
-        return "Lexer Exception: expected " + str(self.expected.__name__) \
+        return "Lexer Exception: expected " + str(self.expected) \
             + " but got " + str(self.string)
+
+class LexerOverflowWarning:
+
+    """A number literal whose value does not fit in a 32 bit word.
+
+    The source still lexes, so this is kept in the warnings of the lexer
+    rather than raised.
+    """
+
+    def __init__(self, text, value, lineNo, charStart):
+        self.text = text
+        self.value = value
+        self.lineNo = lineNo
+        self.charStart = charStart
+
+    def __str__(self):
+        return "Lexer Warning: " + self.text + " at line " \
+            + str(self.lineNo) + " column " + str(self.charStart) \
+            + " does not fit in 32 bits"
+
+def number_value(symbols, symbol, tokenClass, following):
+    """Return the value of a number literal symbol, or raise a
+    LexerException if it has no digits after its base prefix.
+
+    Arguments:
+    symbols -- the SymbolTable the literal is interned in
+    symbol -- the symbol id of the literal text
+    tokenClass -- the NumberToken class the literal was lexed as
+    following -- the character after the literal, or None at the end
+    """
+    try:
+        return symbols.number_value(symbol, tokenClass)
+    except ValueError:
+        raise LexerException(following,
+            "digits after " + symbols.names[symbol])
@@ -0,0 +1,129 @@
+"""Incremental lexer module.
+
+This module updates a TokenBuffer after an edit to its source, without
+lexing the whole source again. Only the tokens around the edit are relexed,
+from the last token that cannot have been changed by the edit, until a
+relexed token starts at the same place as an old token after the edit. From
+there on the old tokens are kept, with their offsets, lines and columns
+shifted to allow for the edit.
+
+Tokens hold no state between them, other than the line count, so once a new
+token starts at the shifted start of an old token beyond the edit, every token
+after it must be the same as before.
+"""
+
+from array import array
+
+from lexer_source import StringSource, universal_newlines
+from lexer_regex import RegexLexerContext
+
+
+def relex(buffer, offset, removedLength, insertedText):
+    """Relex a TokenBuffer after an edit to its source text.
+
+    Arguments:
+    buffer -- a TokenBuffer lexed from a StringSource, changed in place
+    offset -- the offset in the old source text at which the edit starts
+    removedLength -- the number of characters removed at the offset
+    insertedText -- the text inserted at the offset in their place
+
+    The buffer is given a new source holding the edited text. Returns a
+    tuple of the index of the first relexed token and the index just past
+    the last one, so a caller knows which tokens changed. A LexerException
+    is raised if the edited source cannot be lexed, as Lexer.lex() would.
+    """
+    if not isinstance(buffer.source, StringSource):
+        raise ValueError("Only a buffer lexed from a string can be relexed")
+
+    insertedText = universal_newlines(insertedText)
+    oldText = buffer.source.data
+    removedEnd = offset + removedLength
+    newText = oldText[:offset] + insertedText + oldText[removedEnd:]
+    delta = len(insertedText) - removedLength
+    insertedEnd = offset + len(insertedText)
+
+    starts = buffer.starts
+    ends = buffer.ends
+    lines = buffer.lines
+    columns = buffer.columns
+    count = len(buffer)
+
+    # The first token that could have been changed is the first one ending
+    # at or after the edit. The token before that one is relexed as well, as
+    # the lexer needs to restart at the start of a token to know its line.
+    first = 0
+    while first < count and ends[first] < offset:
+        first += 1
+    if first > 0:
+        first -= 1
+        restart = starts[first]
+        lineNo = lines[first]
+        lineStartOffset = restart - columns[first] + 1
+    else:
+        restart = 0
+        lineNo = 1
+        lineStartOffset = 0
+
+    lexer = RegexLexerContext()
+    lexer.symbols = buffer.symbolTable
+    lexer.set_source(newText)
+    lexer.start_at(restart, lineNo, lineStartOffset)
+
+    kinds = array('B')
+    newStarts = array('I')
+    newEnds = array('I')
+    newLines = array('I')
+    newColumns = array('I')
+    newSymbols = array('i')
+
+    # Index of the next old token a relexed token may resynchronise with
+    old = first
+    resync = None
+    for tokenClass, start, end, line, column, symbol in lexer.scanner:
+        if start >= insertedEnd:
+            while old < count and \
+                    (starts[old] < removedEnd or starts[old] + delta < start):
+                old += 1
+            if old < count and starts[old] + delta == start:
+                resync = (old, line, column)
+                break
+        kinds.append(tokenClass.kind)
+        newStarts.append(start)
+        newEnds.append(end)
+        newLines.append(line)
+        newColumns.append(column)
+        newSymbols.append(symbol)
+
+    if resync is None:
+        # The new tokens run to the end of the source
+        old = count
+        tailStarts = tailEnds = tailLines = tailColumns = array('I')
+    else:
+        old, line, column = resync
+        tailStarts = array('I', [start + delta for start in starts[old:]])
+        tailEnds = array('I', [end + delta for end in ends[old:]])
+        lineDelta = line - lines[old]
+        tailLines = lines[old:]
+        if lineDelta != 0:
+            tailLines = array('I', [l + lineDelta for l in tailLines])
+        # Only the columns of tokens on the line the edit ends on move
+        resyncLine = lines[old]
+        columnDelta = column - columns[old]
+        tailColumns = columns[old:]
+        if columnDelta != 0:
+            i = old
+            while i < count and lines[i] == resyncLine:
+                tailColumns[i - old] += columnDelta
+                i += 1
+
+    last = first + len(kinds)
+    buffer.kinds[first:] = kinds + buffer.kinds[old:]
+    buffer.starts[first:] = newStarts + tailStarts
+    buffer.ends[first:] = newEnds + tailEnds
+    buffer.lines[first:] = newLines + tailLines
+    buffer.columns[first:] = newColumns + tailColumns
+    buffer.symbols[first:] = newSymbols + buffer.symbols[old:]
+    buffer.source = lexer.sourceText
+    buffer.view = None
+    buffer.viewIndex = None
+    return (first, last)
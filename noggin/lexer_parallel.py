@@ -0,0 +1,164 @@
+"""Parallel lexer module.
+
+This module lexes one large source on several processes at once. The source
+is split into chunks at newlines that are outside of string literals, char
+literals and comments, so that no token can run across two chunks. Each chunk
+is lexed in a worker process, and the token arrays of the chunks are then
+stitched together in order into one TokenBuffer.
+
+Every chunk starts at the start of a line, so the columns worked out by the
+workers are already right. Only the offsets and line numbers are moved on by
+the offset and line of the start of the chunk.
+"""
+
+import re
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+from lexer_tokens import TokenBuffer
+from lexer_source import StringSource, universal_newlines
+from lexer_code import LexerContext
+from lexer_regex import RegexLexerContext
+from symbol_table import SymbolTable, symbols
+
+# The parts of a source in which a newline is not a safe split point. A char
+# literal may hold a newline, a string literal may run over several lines,
+# and a comment must be skipped so that quotes inside it are not taken as the
+# start of a literal. Unterminated literals run to the end of the source.
+
+hazardRegex = re.compile(r'"[^"]*"?|\'(?:\\[\s\S]|[\s\S])?\'?|\#[^\n]*')
+
+# Sources shorter than this are lexed in one chunk
+defaultChunkSize = 1 << 20
+
+
+def split_points(text, chunkSize):
+    """Return the offsets at which the source can be split into chunks.
+
+    Arguments:
+    text -- the source text, without carriage returns
+    chunkSize -- the smallest number of characters in a chunk
+
+    The offsets returned are the starts of the chunks after the first one.
+    Each one is just after a newline that is not inside a literal or comment.
+    """
+    points = []
+    position = 0
+    target = chunkSize
+    length = len(text)
+    while target < length:
+        hazard = hazardRegex.search(text, position)
+        newLine = text.find('\n', max(target, position))
+        if newLine == -1:
+            break
+        if hazard is None or newLine < hazard.start():
+            points.append(newLine + 1)
+            position = newLine + 1
+            target = position + chunkSize
+        else:
+            # Skip over the literal or comment, which may hold the newline
+            position = hazard.end()
+    return points
+
+
+def lex_chunk(text, offset, lineNo, engine):
+    """Lex one chunk of a source, normally in a worker process.
+
+    Arguments:
+    text -- the text of the chunk
+    offset -- the offset of the start of the chunk in the whole source
+    lineNo -- the line number of the first line of the chunk
+    engine -- 'regex' for the RegexLexer engine or 'hand' for the Lexer
+
+    Returns a tuple of the kinds, starts, ends, lines, columns and symbols
+    arrays of the tokens, the list of symbol names the symbol ids index,
+    whether lexing stopped before the end of the chunk, and the warnings of
+    the chunk. The symbols are interned in a table local to the chunk, as the
+    worker cannot share the symbol table of the main process.
+    """
+    if engine == 'hand':
+        lexer = LexerContext()
+    else:
+        lexer = RegexLexerContext()
+    lexer.symbols = SymbolTable()
+    lexer.set_source(text)
+    buffer = lexer.lex_buffer()
+    if engine == 'hand':
+        stopped = lexer.c is not None
+    else:
+        stopped = lexer.stopped
+
+    lineOffset = lineNo - 1
+    for warning in lexer.warnings:
+        warning.lineNo += lineOffset
+    return (
+        buffer.kinds,
+        array('I', [start + offset for start in buffer.starts]),
+        array('I', [end + offset for end in buffer.ends]),
+        array('I', [line + lineOffset for line in buffer.lines]),
+        buffer.columns,
+        buffer.symbols,
+        lexer.symbols.names,
+        stopped,
+        lexer.warnings)
+
+
+def lex_parallel(text, workers=None, chunkSize=defaultChunkSize,
+        engine='regex', symbolTable=symbols, warnings=None):
+    """Lex a whole source on a pool of worker processes.
+
+    Arguments:
+    text -- the Noggin source code as a string
+    workers -- the number of worker processes, or None for one per core
+    chunkSize -- the smallest number of characters given to one worker
+    engine -- 'regex' for the RegexLexer engine or 'hand' for the Lexer
+    symbolTable -- the pool the identifiers and literals are interned in
+    warnings -- a list the LexerOverflowWarnings of the chunks are added to, if given
+
+    Returns a TokenBuffer holding the same tokens as lexing the whole source
+    with one lexer. Lexing stops at the same token the serial lexers stop at,
+    and a LexerException from a chunk is raised as the serial lexers would.
+    """
+    text = universal_newlines(text)
+    buffer = TokenBuffer(StringSource(text), symbolTable)
+
+    starts = [0] + split_points(text, chunkSize)
+    ends = starts[1:] + [len(text)]
+    lineNos = [1]
+    for start, end in zip(starts, ends[:-1]):
+        lineNos.append(lineNos[-1] + text.count('\n', start, end))
+
+    if len(starts) == 1:
+        results = iter([lex_chunk(text, 0, 1, engine)])
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(workers)
+        results = executor.map(
+            lex_chunk,
+            [text[start:end] for start, end in zip(starts, ends)],
+            starts,
+            lineNos,
+            [engine] * len(starts))
+
+    try:
+        for (kinds, tokenStarts, tokenEnds, lines, columns, chunkSymbols,
+                names, stopped, chunkWarnings) in results:
+            # Map the symbol ids of the chunk onto the shared table, with the
+            # extra last entry mapping -1 to -1
+            mapping = [symbolTable.intern(name) for name in names]
+            mapping.append(-1)
+            buffer.kinds.extend(kinds)
+            buffer.starts.extend(tokenStarts)
+            buffer.ends.extend(tokenEnds)
+            buffer.lines.extend(lines)
+            buffer.columns.extend(columns)
+            buffer.symbols.extend(
+                array('i', map(mapping.__getitem__, chunkSymbols)))
+            if warnings is not None:
+                warnings.extend(chunkWarnings)
+            if stopped:
+                break
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+    return buffer
@@ -0,0 +1,346 @@
+"""Regex lexer module.
+
+This module contains a second lexer engine. Every token rule from grammar.md
+is compiled into one alternation regex with a named group per rule, so each
+token is found by a single match call instead of the character by character
+branching in Lexer.lex(). It produces the same Token classes, text and
+positions as the hand-written Lexer.
+"""
+
+import re
+import sys
+
+from lexer_tokens import IdentToken, NumberToken, UIntBase2Token,\
+    UIntBase8Token, UIntBase10Token, UIntBase16Token, IntBase10Token,\
+    CharToken, StringToken, TokenBuffer, end_column
+from lexer_source import StringSource, MappedFileSource, universal_newlines
+from lexer_code import LexerContext, wordTokens, punctuationTokens,\
+    wordTokensBytes, punctuationTokensBytes, LexerException,\
+    LexerOverflowWarning, number_value
+from symbol_table import symbols
+from context_shim import ContextShim
+from noggin_trace import tracer, DEBUG, WARNING
+
+# The token rules in the order they are tried. The order matters wherever two
+# rules can match at the same position, e.g. the number rules must be tried
+# before the bare minus operator and based numbers before base 10 ones.
+
+tokenRules = [
+    # A memory-mapped source still holds its carriage returns, which are
+    # newlines as they are in text mode
+    ('newline', r'\r\n?|\n'),
+    # Only ASCII whitespace, as in the hand-written Lexer
+    ('whitespace', r'[ \t\f\v]+'),
+    # '#' starts a comment running to the end of the line
+    ('comment', r'\#[^\n]*'),
+    # ident or keyword, where '-' may continue an ident
+    ('word', r'[^\W\d][\w\-]*'),
+    # A based number is any digit followed by the base letter
+    ('uint2', r'\db[01]*'),
+    ('uint8', r'\do[0-7]*'),
+    ('uint16', r'\dx[0-9A-Fa-f]*'),
+    ('uint10', r'\d+'),
+    ('int10', r'-\d+'),
+    # A char literal is one character, or a backslash and one character
+    ('char', r"'(?:\\[\s\S]|[\s\S])'"),
+    ('charerror', r"'(?:\\[\s\S]|[\s\S])?"),
+    # String literals have no escapes and may run over several lines
+    ('string', r'"[^"]*"'),
+    ('stringerror', r'"'),
+    # Punctuation that is never followed by a second character
+    ('single', r'[{},();*/\[\]%^]'),
+    ('minus', r'-'),
+    # Any other punctuation, optionally with a second character, e.g. '<='
+    ('punctuation', r'[!$&+.:<=>?@\\`|~][=&|<>+\-]?'),
+    ('other', r'[\s\S]'),
+]
+
+# Over bytes the word rule also takes the bytes of UTF-8 characters, and
+# scan() cuts the word down to what the hand-written Lexer takes as an ident
+bytesRules = {
+    'word': r'(?:[^\W\d]|[\x80-\xff])(?:[\w\-]|[\x80-\xff])*',
+}
+
+masterPattern = '|'.join(
+    '(?P<%s>%s)' % (name, rule) for name, rule in tokenRules)
+masterPatternBytes = '|'.join(
+    '(?P<%s>%s)' % (name, bytesRules.get(name, rule))
+    for name, rule in tokenRules)
+
+masterRegex = re.compile(masterPattern)
+masterRegexBytes = re.compile(masterPatternBytes.encode('ascii'))
+
+# The newlines inside a string or char literal
+newlineRegex = re.compile(r'\r\n?|\n')
+newlineRegexBytes = re.compile(newlineRegex.pattern.encode('ascii'))
+
+groupTokens = {
+    'uint2': UIntBase2Token,
+    'uint8': UIntBase8Token,
+    'uint16': UIntBase16Token,
+    'uint10': UIntBase10Token,
+    'int10': IntBase10Token,
+    'char': CharToken,
+    'string': StringToken
+}
+
+class RegexLexerContext:
+
+    """Master-pattern lexer engine, holding the state for one source.
+
+    RegexLexerContext has the same interface as LexerContext, so either one
+    can be used to lex a source: set_source() or set_source_file() followed
+    by repeated calls to lex() until it returns None.
+    """
+
+    source = None
+    sourceText = None
+    regex = None
+    scanner = None
+    newlines = newlineRegex
+    # Whether the source is bytes, so that a character can be several bytes
+    wide = False
+
+    currentLineNo = 1
+    lineStartOffset = 0
+
+    # Whether lexing stopped before the end of the source, at a character
+    # that cannot start a token
+    stopped = False
+
+    wordTokens = wordTokens
+    punctuationTokens = punctuationTokens
+
+    # The pool identifiers and literals are interned in
+    symbols = symbols
+
+    # Where lexer events are reported, see noggin_trace
+    trace = tracer
+
+    # The LexerOverflowWarnings of the number literals lexed so far that do
+    # not fit in 32 bits
+    warnings = ()
+
+    def reset(self, sourceText, source, regex):
+        self.sourceText = sourceText
+        self.source = source
+        self.regex = regex
+        self.scanner = self.scan(regex.finditer(source))
+        self.currentLineNo = 1
+        self.lineStartOffset = 0
+        self.stopped = False
+        self.warnings = []
+
+    def start_at(self, offset, lineNo, lineStartOffset):
+        """Carry on lexing the source from a token part way through it.
+
+        Arguments:
+        offset -- the offset of the start of a token in the source
+        lineNo -- the line number that token is on
+        lineStartOffset -- the offset of the start of that line
+        """
+        self.scanner = self.scan(self.regex.finditer(self.source, offset))
+        self.currentLineNo = lineNo
+        self.lineStartOffset = lineStartOffset
+        self.stopped = False
+
+    def set_source(self, text):
+        """Lex a whole source text held in a string.
+
+        Arguments:
+        text -- the Noggin source code as a string
+        """
+        sourceText = StringSource(universal_newlines(text))
+        self.reset(sourceText, sourceText.data, masterRegex)
+        self.newlines = newlineRegex
+        self.wide = False
+        self.wordTokens = wordTokens
+        self.punctuationTokens = punctuationTokens
+
+    def set_source_file(self, path):
+        """Memory-map a source file and match the pattern over the mapping.
+
+        Arguments:
+        path -- the path of the Noggin source file
+        """
+        sourceText = MappedFileSource(path)
+        self.reset(sourceText, sourceText.data, masterRegexBytes)
+        self.newlines = newlineRegexBytes
+        self.wide = True
+        self.wordTokens = wordTokensBytes
+        self.punctuationTokens = punctuationTokensBytes
+        return sourceText
+
+    def scan(self, matches):
+        """Generate the fields of each token found by the master regex.
+
+        Yields a tuple of (token class, start offset, end offset, line,
+        column, symbol) for each token, so that tokens can be made as objects
+        by lex() or stored straight into a TokenBuffer by lex_buffer(). The
+        symbol is the interned id of an identifier or literal, otherwise -1.
+        The value of a number literal is kept in the symbol table against its
+        symbol, and one that does not fit in 32 bits is added to the warnings
+        and traced. A LexerException is raised for a base prefix with no
+        digits after it, e.g. '0x'.
+        """
+        intern = self.symbols.intern
+        trace = self.trace
+        numberKinds = NumberToken.kinds
+        for match in matches:
+            kind = match.lastgroup
+            if kind == 'newline':
+                self.currentLineNo += 1
+                self.lineStartOffset = match.end()
+                continue
+            elif kind == 'whitespace' or kind == 'comment':
+                continue
+
+            start = match.start()
+            end = match.end()
+            lineNo = self.currentLineNo
+            column = start - self.lineStartOffset + 1
+
+            if kind == 'word':
+                if self.wide and not match.group().isascii():
+                    end = self.ident_end(start, end)
+                    if end == start:
+                        self.stopped = True
+                        return
+                    tokenClass = IdentToken
+                else:
+                    tokenClass = self.wordTokens.get(match.group(), IdentToken)
+            elif kind == 'single' or kind == 'minus' or kind == 'punctuation':
+                tokenClass = self.punctuationTokens.get(match.group())
+                if tokenClass is None:
+                    # The hand-written Lexer stops at unknown punctuation
+                    self.stopped = True
+                    return
+            elif kind == 'other':
+                self.stopped = True
+                return
+            elif kind == 'charerror':
+                raise LexerException(self.char_at(end), '\'')
+            elif kind == 'stringerror':
+                raise LexerException(None, '\"')
+            else:
+                tokenClass = groupTokens[kind]
+                if kind == 'string' or kind == 'char':
+                    self.count_new_lines(start, end)
+
+            if tokenClass.interned:
+                symbol = intern(self.sourceText.text(start, end))
+                if tokenClass.kind in numberKinds:
+                    value = number_value(self.symbols, symbol, tokenClass,
+                        self.char_at(end))
+                    if not tokenClass.minValue <= value <= tokenClass.maxValue:
+                        text = self.symbols.names[symbol]
+                        self.warnings.append(LexerOverflowWarning(text, value,
+                            lineNo, column))
+                        if trace.errors <= WARNING:
+                            trace.event('errors', WARNING, 'overflow',
+                                text=text,
+                                value=value,
+                                line=lineNo,
+                                column=column)
+            else:
+                symbol = -1
+
+            if trace.lexer <= DEBUG:
+                trace.event('lexer', DEBUG, 'token',
+                    kind=tokenClass.__name__,
+                    text=self.sourceText.text(start, end),
+                    line=lineNo,
+                    column=column)
+
+            if self.wide:
+                self.count_wide_chars(start, end)
+            yield (tokenClass, start, end, lineNo, column, symbol)
+            if end != match.end():
+                # The rest of the word cannot start a token
+                self.stopped = True
+                return
+
+    def lex(self):
+        """Return the next token, or None at the end of the source."""
+        if self.scanner is None:
+            # No source has been given, so buffer the whole of stdin
+            self.set_source(sys.stdin.read())
+
+        for tokenClass, start, end, lineNo, column, symbol in self.scanner:
+            original = self.symbols.names[symbol] if symbol != -1 else None
+            token = tokenClass.from_source(
+                self.sourceText,
+                start,
+                end,
+                lineNo,
+                column,
+                end_column(column, start, end, original))
+            if symbol != -1:
+                token._symbol = symbol
+                token._original = original
+                if tokenClass.kind in NumberToken.kinds:
+                    token._value = self.symbols.values[symbol]
+            return token
+        return None
+
+    def lex_buffer(self):
+        """Lex the rest of the source straight into a TokenBuffer.
+
+        No Token objects are made, only the arrays of the buffer are filled.
+        """
+        if self.scanner is None:
+            self.set_source(sys.stdin.read())
+
+        buffer = TokenBuffer(self.sourceText, self.symbols)
+        append = buffer.append
+        for tokenClass, start, end, lineNo, column, symbol in self.scanner:
+            append(tokenClass.kind, start, end, lineNo, column, symbol)
+        return buffer
+
+    def tokens(self):
+        """Generate the tokens of the source one at a time as they are lexed."""
+        token = self.lex()
+        while token is not None:
+            yield token
+            token = self.lex()
+
+    def count_new_lines(self, start, end):
+        """Advance the line count past any newlines inside a literal."""
+        for newLine in self.newlines.finditer(self.source, start, end):
+            self.currentLineNo += 1
+            self.lineStartOffset = newLine.end()
+
+    def count_wide_chars(self, start, end):
+        """Move the line start offset of a bytes source along by the bytes
+        past the first of each character of a token on its last line, so
+        that columns count characters as the hand-written Lexer's do."""
+        tail = self.source[max(start, self.lineStartOffset):end]
+        if not tail.isascii():
+            self.lineStartOffset += len(tail) - len(tail.decode('utf-8'))
+
+    def ident_end(self, start, end):
+        """Return the end of the ident at the start of a word of a bytes
+        source, which ends before the first character that the hand-written
+        Lexer does not take in an ident."""
+        try:
+            text = self.source[start:end].decode('utf-8')
+        except UnicodeDecodeError:
+            raise LexerException("bytes at offset %d" % start, "UTF-8 text")
+        length = 0
+        if LexerContext.isCharIdentStarter(text[0]):
+            length = 1
+            while length < len(text) \
+                    and LexerContext.isCharIdentContinue(text[length]):
+                length += 1
+        return start + len(text[:length].encode('utf-8'))
+
+    def char_at(self, offset):
+        if offset < len(self.source):
+            return self.sourceText.text(offset, offset + 1)
+        return None
+
+class RegexLexer(metaclass=ContextShim):
+
+    """Static interface to the default RegexLexerContext."""
+
+    default = RegexLexerContext()
@@ -0,0 +1,90 @@
+"""Lexer source module.
+
+This module contains the source classes the Lexer reads characters from. Each
+source can also return the text between two offsets, which lets tokens keep
+offsets into the source instead of their own copy of the text.
+"""
+
+import mmap
+
+
+def universal_newlines(text):
+    """Return text with each CRLF pair and each lone carriage return made a
+    newline, as reading a file in text mode does."""
+    return text.replace('\r\n', '\n').replace('\r', '\n')
+
+
+class StringSource(object):
+
+    """Source text held in memory as a string."""
+
+    def __init__(self, text):
+        """Construct a string source.
+
+        Arguments:
+        text -- the Noggin source code, with its newlines already made
+            universal, see universal_newlines()
+        """
+        self.data = text
+        self.length = len(text)
+
+    def text(self, start, end):
+        """Return the source text between the start and end offsets."""
+        return self.data[start:end]
+
+    def close(self):
+        pass
+
+
+class BytesSource(object):
+
+    """Source text held as the raw UTF-8 bytes of a file.
+
+    Offsets are byte offsets into the bytes, which may still hold carriage
+    returns. The text between two offsets has its newlines made universal.
+    """
+
+    def __init__(self, data):
+        """Construct a bytes source.
+
+        Arguments:
+        data -- the bytes of the Noggin source file
+        """
+        self.data = data
+        self.length = len(data)
+
+    def text(self, start, end):
+        """Return the source text between the start and end offsets."""
+        return universal_newlines(self.data[start:end].decode('utf-8'))
+
+    def close(self):
+        pass
+
+
+class MappedFileSource(BytesSource):
+
+    """Source text memory-mapped from a file.
+
+    Characters are read straight out of the mapping, so the file is never
+    copied into a Python string. Offsets are byte offsets into the file.
+    """
+
+    def __init__(self, path):
+        """Construct a memory-mapped file source.
+
+        Arguments:
+        path -- the path of the Noggin source file
+        """
+        self.path = path
+        self.file = open(path, 'rb')
+        try:
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # An empty file cannot be mapped
+            self.data = b""
+        self.length = len(self.data)
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.file.close()
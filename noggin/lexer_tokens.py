@@ -1,9 +1,14 @@
 """
 Module containing all Token classes.
 
-This module contains all the different token classes.
+This module contains all the different token classes, along with the
+TokenBuffer which stores a lexed token stream as parallel arrays.
 """
 
+from array import array
+
+from symbol_table import symbols
+
 StatementStartingTokens = []
 DefineArgumentContinueTokens = []
 
@@ -14,7 +19,26 @@ uce = "?"
 
 class Token(object):
 
-    """Common base class for all Tokens."""
+    """Common base class for all Tokens.
+
+    A Token made by the Lexer does not hold its own copy of the original text.
+    It keeps the source it was lexed from along with its start and end offsets
+    in that source, and the text is only sliced out the first time the
+    original property is read.
+    """
+
+    # Integer kind code of the token class, set at the bottom of this module
+    kind = 0
+    kinds = frozenset()
+
+    # Whether the text of tokens of this class is interned as a symbol
+    interned = False
+
+    _original = None
+    _symbol = None
+    source = None
+    offsetStart = None
+    offsetEnd = None
 
     def __init__(
             self,
@@ -27,6 +51,66 @@ class Token(object):
         self.charStart = charStart
         self.charEnd = charEnd
 
+    @classmethod
+    def from_source(
+            cls,
+            source,
+            offsetStart,
+            offsetEnd,
+            lineNo,
+            charStart,
+            charEnd):
+        """Construct a token whose text is a range of a lexer source.
+
+        Arguments:
+        source -- the source object the token was lexed from
+        offsetStart -- the offset of the first character of the token
+        offsetEnd -- the offset just past the last character of the token
+        lineNo -- the line the token starts on
+        charStart -- the column of the first character of the token
+        charEnd -- the column just past the last character of the token
+        """
+        token = cls.__new__(cls)
+        token.source = source
+        token.offsetStart = offsetStart
+        token.offsetEnd = offsetEnd
+        token.lineNo = lineNo
+        token.charStart = charStart
+        token.charEnd = charEnd
+        return token
+
+    @property
+    def original(self):
+        if self._original is None and self.source is not None:
+            self._original = self.source.text(self.offsetStart, self.offsetEnd)
+        return self._original
+
+    @original.setter
+    def original(self, value):
+        self._original = value
+
+    @property
+    def symbol(self):
+        """Return the interned symbol id of the text of this token.
+
+        The lexer interns identifiers and literals as it makes them. A token
+        made any other way has its text interned in the shared pool the first
+        time its symbol is asked for.
+        """
+        if self._symbol is None:
+            self._symbol = symbols.intern(self.original)
+        return self._symbol
+
+    def __getstate__(self):
+        # The source may be a memory-mapped file, so only the text is kept.
+        # Symbol ids are only meaningful in this process, so the symbol is
+        # interned again when it is next asked for.
+        state = self.__dict__.copy()
+        state['_original'] = self.original
+        state.pop('source', None)
+        state.pop('_symbol', None)
+        return state
+
     def get_precedence(self):
         return 0
 
@@ -53,6 +137,8 @@ class Token(object):
 # Primary expressions, where the content of the Token is actually important
 
 class BoolToken(Token):
+    interned = True
+
     def __init__(self, original, lineNo = uln, charStart = ucs, charEnd = uce):
         super(BoolToken, self).__init__(original, lineNo, charStart, charEnd)
 
@@ -60,14 +146,67 @@ class BoolToken(Token):
         return str(self.original)
 
 class NumberToken(Token):
+    interned = True
+
+    # How the digits of the literal are read, see value_of()
+    base = 10
+    prefixLength = 0
+
+    # The range of values a literal of this class can hold in 32 bits
+    minValue = 0
+    maxValue = 0xFFFFFFFF
+
+    _value = None
+
     def __init__(self, original, lineNo = uln, charStart = ucs, charEnd = uce):
         super(NumberToken, self).__init__(original, lineNo, charStart, charEnd)
 
+    @classmethod
+    def value_of(cls, text):
+        """Return the integer value of the source text of a literal.
+
+        A ValueError is raised for a base prefix with no digits after it,
+        e.g. '0x'.
+        """
+        return int(text[cls.prefixLength:], cls.base)
+
+    @property
+    def value(self):
+        """Return the integer value of the literal.
+
+        The lexer works the value out as it makes the token, so it is only
+        worked out here for a token made some other way.
+        """
+        if self._value is None:
+            self._value = self.value_of(self.original)
+        return self._value
+
+    @property
+    def fitsSigned16(self):
+        """Whether the value fits a signed 16 bit MIPS immediate, e.g. addi."""
+        return -0x8000 <= self.value <= 0x7FFF
+
+    @property
+    def fitsUnsigned16(self):
+        """Whether the value fits an unsigned 16 bit MIPS immediate, e.g. ori."""
+        return 0 <= self.value <= 0xFFFF
+
+    @property
+    def overflows32(self):
+        """Whether the value does not fit in a 32 bit word."""
+        return not self.minValue <= self.value <= self.maxValue
+
 class UIntBase2Token(NumberToken):
+    base = 2
+    prefixLength = 2
+
     def __init__(self, original, lineNo = uln, charStart = ucs, charEnd = uce):
         super(UIntBase2Token, self).__init__(original, lineNo, charStart, charEnd)
 
 class UIntBase8Token(NumberToken):
+    base = 8
+    prefixLength = 2
+
     def __init__(self, original, lineNo = uln, charStart = ucs, charEnd = uce):
         super(UIntBase8Token, self).__init__(original, lineNo, charStart, charEnd)
 
@@ -76,18 +215,28 @@ class UIntBase10Token(NumberToken):
         super(UIntBase10Token, self).__init__(original, lineNo, charStart, charEnd)
 
 class IntBase10Token(NumberToken):
+    minValue = -0x80000000
+    maxValue = 0x7FFFFFFF
+
     def __init__(self, original, lineNo = uln, charStart = ucs, charEnd = uce):
         super(IntBase10Token, self).__init__(original, lineNo, charStart, charEnd)
 
 class UIntBase16Token(NumberToken):
+    base = 16
+    prefixLength = 2
+
     def __init__(self, original, lineNo = uln, charStart = ucs, charEnd = uce):
         super(UIntBase16Token, self).__init__(original, lineNo, charStart, charEnd)
 
 class CharToken(Token):
+    interned = True
+
     def __init__(self, original, lineNo = uln, charStart = ucs, charEnd = uce):
         super(CharToken, self).__init__(original, lineNo, charStart, charEnd)
 
 class StringToken(Token):
+    interned = True
+
     def __init__(self, original, lineNo = uln, charStart = ucs, charEnd = uce):
         super(StringToken, self).__init__(original, lineNo, charStart, charEnd)
 # Other keywords and punctuation
@@ -153,12 +302,15 @@ StatementStartingTokens.append(FallThroughToken)
 class ForToken(Token):
     def __init__(self, original = "for", lineNo = uln, charStart = ucs, charEnd = uce):
         super(ForToken, self).__init__(original, lineNo, charStart, charEnd)
+StatementStartingTokens.append(ForToken)
 
 class FunctionToken(Token):
     def __init__(self, original = "function", lineNo = uln, charStart = ucs, charEnd = uce):
         super(FunctionToken, self).__init__(original, lineNo, charStart, charEnd)
 
 class IdentToken(Token):
+    interned = True
+
     def __init__(self, original, lineNo = uln, charStart = ucs, charEnd = uce):
         super(IdentToken, self).__init__(original, lineNo, charStart, charEnd)
 
@@ -185,31 +337,32 @@ class LeftSquareToken(Token):
         super(LeftSquareToken, self).__init__(original, lineNo, charStart, charEnd)
 
 class BinaryOperatorToken(Token):
+
+    # Binding power of each binary operator, higher binding tighter. Any text
+    # not in the table is not a binary operator, and has the precedence 0 of
+    # every other token.
+    precedences = {
+        '*': 10, '/': 10, '%': 10,
+        '+': 9, '-': 9,
+        '>>': 8, '<<': 8,
+        '>': 7, '<': 7, '>=': 7, '<=': 7,
+        '==': 6, '!=': 6,
+        '&': 5,
+        '^': 4,
+        '|': 3,
+        '&&': 2,
+        '||': 1,
+    }
+
+    # Operators that group from the right, so that a # b # c is a # (b # c).
+    # Every other operator groups from the left.
+    rightAssociative = frozenset()
+
     def __init__(self, original, lineNo = uln, charStart = ucs, charEnd = uce):
         super(BinaryOperatorToken, self).__init__(original, lineNo, charStart, charEnd)
 
     def get_precedence(self):
-        if self.original == "*" or self.original == "/" or self.original == '%':
-            return 10
-        elif self.original == "+" or self.original == "-":
-            return 9
-        elif self.original == '>>' or self.original == '<<':
-            return 8
-        elif self.original == ">" or self.original == "<"\
-                or self.original == ">=" or self.original == "<=":
-            return 7
-        elif self.original == "==" or self.original == "!=":
-            return 6
-        elif self.original == '&':
-            return 5
-        elif self.original == '^':
-            return 4
-        elif self.original == '|':
-            return 3
-        elif self.original == '&&':
-            return 2
-        elif self.original == '||':
-            return 1
+        return self.precedences.get(self.original, 0)
 
 class UnaryOperatorToken(Token):
     def __init__(self, original, lineNo=uln, charStart=ucs, charEnd=uce):
@@ -246,3 +399,153 @@ class WhileToken(Token):
     def __init__(self, original = ";", lineNo = uln, charStart = ucs, charEnd = uce):
         super(WhileToken, self).__init__(original, lineNo, charStart, charEnd)
 StatementStartingTokens.append(WhileToken)
+
+# Every Token class gets an integer kind code, so the parser can switch on an
+# int instead of calling isinstance. Kind 0 means there is no token, i.e. the
+# end of the token stream has been reached. Each class also gets the set of
+# kinds of itself and its subclasses, so that isinstance(t, NumberToken) can
+# be written as kind in NumberToken.kinds.
+
+tokenClasses = [
+    Token, BoolToken, NumberToken, UIntBase2Token, UIntBase8Token,
+    UIntBase10Token, IntBase10Token, UIntBase16Token, CharToken, StringToken,
+    ASMToken, AssignToken, BreakToken, CaseToken, ColonToken, CommaToken,
+    DeclareToken, DefaultToken, DoToken, ElifToken, ElseToken, EOIToken,
+    FallThroughToken, ForToken, FunctionToken, IdentToken, IfToken,
+    LeftBraceToken, LeftParenToken, LeftSquareToken, BinaryOperatorToken,
+    UnaryOperatorToken, ReturnToken, RightBraceToken, RightParenToken,
+    RightSquareToken, SemiColonToken, SwitchToken, WhileToken]
+
+for kind, tokenClass in enumerate(tokenClasses):
+    tokenClass.kind = kind
+for tokenClass in tokenClasses:
+    tokenClass.kinds = frozenset(
+        c.kind for c in tokenClasses if issubclass(c, tokenClass))
+del kind, tokenClass
+
+StatementStartingKinds = frozenset(t.kind for t in StatementStartingTokens)
+
+
+def end_column(column, start, end, original=None):
+    """Return the column just past the last character of a token.
+
+    Arguments:
+    column -- the column of the first character of the token
+    start -- the offset of the first character of the token
+    end -- the offset just past the last character of the token
+    original -- the text of the token, or None for a keyword or punctuation
+
+    Only the text of a literal or identifier gives its end column, as a
+    string literal can run over several lines, and the bytes of a
+    memory-mapped source are not one to one with the characters of a
+    non-ASCII identifier or literal. A keyword or punctuation token is always
+    ASCII, and as long as its offsets say.
+    """
+    if original is None:
+        return column + end - start
+    newLine = original.rfind('\n')
+    if newLine == -1:
+        return column + len(original)
+    return len(original) - newLine
+
+
+class TokenBuffer(object):
+
+    """Struct-of-arrays store for a lexed token stream.
+
+    Rather than one Python object per token, the kind code, start and end
+    offsets, line and column of each token are kept in compact arrays. The
+    parser can look at the kinds array directly, and a Token object is only
+    made, as a lightweight view onto the source, when one is really needed.
+    A TokenBuffer can be given to Parser.set_tokens() in place of a list.
+    """
+
+    def __init__(self, source=None, symbolTable=symbols):
+        """Construct an empty token buffer.
+
+        Arguments:
+        source -- the source object the tokens are lexed from
+        symbolTable -- the pool the symbol ids of the tokens are interned in
+        """
+        self.source = source
+        self.symbolTable = symbolTable
+        self.kinds = array('B')
+        self.starts = array('I')
+        self.ends = array('I')
+        self.lines = array('I')
+        self.columns = array('I')
+        # Symbol id of each interned token, or -1
+        self.symbols = array('i')
+        self.view = None
+        self.viewIndex = None
+
+    @staticmethod
+    def from_tokens(tokens, symbolTable=symbols):
+        """Construct a token buffer from an iterable of lexed tokens.
+
+        Arguments:
+        tokens -- the tokens to store
+        symbolTable -- the pool the symbol ids of the tokens are interned in
+
+        A ValueError is raised for a token that was not lexed from a source,
+        as it has no offsets to store.
+        """
+        buffer = TokenBuffer(None, symbolTable)
+        for token in tokens:
+            if token.offsetStart is None:
+                raise ValueError("token '%s' was not lexed from a source, so "
+                    "cannot be kept in a token buffer" % token)
+            if buffer.source is None:
+                buffer.source = token.source
+            buffer.append(
+                token.kind,
+                token.offsetStart,
+                token.offsetEnd,
+                token.lineNo,
+                token.charStart,
+                token.symbol if token.interned else -1)
+        return buffer
+
+    def append(self, kind, start, end, line, column, symbol=-1):
+        self.kinds.append(kind)
+        self.starts.append(start)
+        self.ends.append(end)
+        self.lines.append(line)
+        self.columns.append(column)
+        self.symbols.append(symbol)
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def __getitem__(self, i):
+        """Return a Token view of the token at index i.
+
+        The parser tends to ask for the same token several times in a row, so
+        the most recent view is kept and handed out again.
+        """
+        if i == self.viewIndex:
+            return self.view
+        tokenClass = tokenClasses[self.kinds[i]]
+        start = self.starts[i]
+        end = self.ends[i]
+        column = self.columns[i]
+        symbol = self.symbols[i]
+        original = self.symbolTable.names[symbol] if symbol != -1 else None
+        self.view = tokenClass.from_source(
+            self.source, start, end, self.lines[i], column,
+            end_column(column, start, end, original))
+        if symbol != -1:
+            self.view._symbol = symbol
+            self.view._original = original
+            if tokenClass.kind in NumberToken.kinds:
+                self.view._value = self.symbolTable.values.get(symbol)
+        self.viewIndex = i
+        return self.view
+
+    def __iter__(self):
+        for i in range(len(self.kinds)):
+            yield self[i]
+
+    def text(self, i):
+        """Return the original text of the token at index i."""
+        return self.source.text(self.starts[i], self.ends[i])
@@ -0,0 +1,219 @@
+"""Name resolution module.
+
+This module contains the NameResolver, a pass over a whole parsed Program
+that binds each use of a name to what it names. The declaration field of each
+VariableAccessExpression, ArrayAccessExpression and AssignmentExpression is
+set to the DeclareStatement, ForInitialisation or FunctionSignatureDeclare of
+its variable, and that of each FunctionCallExpression to the
+FunctionDeclaration of its function.
+
+Each variable is also given where it is kept: a global variable a label in
+the .data section, and an argument or local variable of a function a slot of
+the frame of the function. The arguments take the first slots, in order, and
+the locals the slots after them, in the order they are declared. The slots of
+the locals of a block are free again once the block ends, for the locals of
+the next block to reuse, so the frame of a function only needs as many slots
+as it has variables in scope at once.
+
+Once names are resolved, later passes, such as the TypeChecker and the
+CallGraph, follow the declaration of a use to its variable or function, and
+look its slot or label up by that node, rather than looking its name up
+through the scopes again.
+"""
+
+from ast_walker import AstWalker
+from parser_code import Environment
+from parser_elements import *
+
+
+def data_label(name):
+    """Return the .data label of the global variable of a name."""
+    return "global_%s" % name
+
+
+class NameResolveException(Exception):
+    pass
+
+class NameVariableUseWithoutDeclareException(NameResolveException):
+    def __init__(self, variableName):
+        self.variableName = variableName
+
+    def __str__(self):
+        return ("NameVariableUseWithoutDeclareException: variable %s is not "
+            "declared where it is used\n"
+            % self.variableName.token.source_ref())
+
+class NameFunctionUseWithoutDeclareException(NameResolveException):
+    def __init__(self, functionName):
+        self.functionName = functionName
+
+    def __str__(self):
+        return ("NameFunctionUseWithoutDeclareException: function %s is not "
+            "declared\n"
+            % self.functionName.token.source_ref())
+
+
+class NameResolver(AstWalker):
+
+    """Resolver of the names of a Program, keeping where each variable is.
+
+    After resolve(), slot_of() gives the frame slot of any argument or local
+    variable, label_of() the label of any global variable, and frame_size()
+    the number of slots in the frame of any function definition. Each is
+    looked up by the identity of the declaration or definition.
+    """
+
+    def __init__(self):
+        super(NameResolver, self).__init__()
+        # The frame slot of each argument and local variable, the label of
+        # each global variable, and the frame size of each function
+        # definition, by the id of the node
+        self.frameSlots = {}
+        self.dataLabels = {}
+        self.frameSizes = {}
+        # The FunctionDeclaration of each function, by symbol
+        self.functions = {}
+        # The declarations of the variables in scope, by symbol
+        self.scope = Environment()
+        # The next free slot of the frame being laid out, the number of slots
+        # it needs so far, and the next free slot as each open block began
+        self.nextSlot = 0
+        self.frameSize = 0
+        self.blockSlots = []
+
+    def resolve(self, program):
+        """Resolve every name of a whole Program.
+
+        A NameResolveException is raised at the first name used where it is
+        not declared.
+        """
+        globalScope = self.scope
+        for declaration in program.functionDeclarations:
+            self.functions[declaration.functionName.symbol] = declaration
+        for declaration in program.globalVariableDeclarations:
+            if declaration.value is not None:
+                self.walk_expression(declaration.value)
+            globalScope.set(declaration.variableName.symbol, declaration)
+            self.dataLabels[id(declaration)] = data_label(
+                declaration.variableName)
+
+        for definition in program.functionDefinitions:
+            self.scope = globalScope.child()
+            self.nextSlot = 0
+            for sigDeclare in definition.signatureArguments.signatureArguments:
+                self.scope.set(sigDeclare.sigVariableName.symbol, sigDeclare)
+                self.take_slot(sigDeclare)
+            self.frameSize = self.nextSlot
+            self.walk_statements(definition.statements)
+            self.frameSizes[id(definition)] = self.frameSize
+        self.scope = globalScope
+
+    def slot_of(self, declaration):
+        """Return the frame slot of an argument or local variable."""
+        return self.frameSlots[id(declaration)]
+
+    def label_of(self, declaration):
+        """Return the .data label of a global variable."""
+        return self.dataLabels[id(declaration)]
+
+    def frame_size(self, definition):
+        """Return the number of slots in the frame of a FunctionDefinition."""
+        return self.frameSizes[id(definition)]
+
+    def take_slot(self, declaration):
+        self.frameSlots[id(declaration)] = self.nextSlot
+        self.nextSlot += 1
+        if self.nextSlot > self.frameSize:
+            self.frameSize = self.nextSlot
+
+    def declaration_of(self, ident):
+        """Return the declaration in scope of the variable an Ident refers
+        to."""
+        try:
+            return self.scope.get(ident.symbol)
+        except KeyError:
+            raise NameVariableUseWithoutDeclareException(ident)
+
+    # The resolution of the expressions
+
+    def binary_expression(self, expression):
+        pass
+
+    def literal(self, expression):
+        pass
+
+    def variable_access(self, expression):
+        expression.declaration = self.declaration_of(
+            expression.variableName.ident)
+
+    def array_access(self, expression):
+        expression.declaration = self.declaration_of(expression.arrayName)
+
+    def assignment(self, expression):
+        expression.declaration = self.declaration_of(expression.ident)
+
+    def function_call(self, expression):
+        declaration = self.functions.get(expression.ident.symbol)
+        if declaration is None:
+            raise NameFunctionUseWithoutDeclareException(expression.ident)
+        expression.declaration = declaration
+
+    # The resolution of the statements
+
+    def open_scope(self, node):
+        self.scope = self.scope.child()
+        self.blockSlots.append(self.nextSlot)
+        return []
+
+    def close_scope(self, node):
+        self.scope = self.scope.parent
+        self.nextSlot = self.blockSlots.pop()
+        return []
+
+    def declare(self, statement):
+        """Resolve a DeclareStatement or ForInitialisation, and give the
+        local variable it declares a slot."""
+        if statement.value is not None:
+            self.walk_expression(statement.value)
+        self.scope.set(statement.variableName.symbol, statement)
+        self.take_slot(statement)
+        return []
+
+    def expression_statement(self, statement):
+        self.walk_expression(statement.expression)
+        return []
+
+    return_statement = expression_statement
+
+    def if_else_statement(self, statement):
+        resolutions = []
+        for ifThen in statement.ifThens:
+            self.walk_expression(ifThen.condition)
+            resolutions.append((self.block, ifThen.then))
+        if statement.elseStatements is not None:
+            resolutions.append((self.block, statement.elseStatements))
+        return resolutions
+
+    def while_statement(self, statement):
+        self.walk_expression(statement.whileExpression)
+        return [(self.block, statement.doStatements)]
+
+    def do_while_statement(self, statement):
+        self.walk_expression(statement.whileExpression)
+        return [(self.block, statement.doStatements)]
+
+    def for_loop_header(self, statement):
+        self.declare(statement.initialisation)
+        self.walk_expression(statement.condition)
+        self.walk_expression(statement.afterthought.expression)
+        return []
+
+    def switch_statement(self, statement):
+        self.walk_expression(statement.switchExpression)
+        resolutions = []
+        for case in statement.cases:
+            self.walk_expression(case.primaryExpression)
+            resolutions.append((self.block, case.statements))
+        if statement.default is not None:
+            resolutions.append((self.block, statement.default.statements))
+        return resolutions
@@ -2,42 +2,168 @@ import argparse
 import sys
 
 import lexer_code
+import lexer_regex
+import lexer_parallel
 import lexer_tokens
-from parser_code import Parser
+from noggin_cache import FrontEndCache, defaultMaxSize
+from parser_code import ParserContext
 from parser_elements import *
-
-printVerbose = True
+from noggin_trace import Tracer, levels, categories, ERROR
+from name_resolver import NameResolver, NameResolveException
+from type_checker import TypeChecker, TypeCheckException
+from call_graph import CallGraph
 
 def main():
     a_parser = argparse.ArgumentParser(
         description='Compile noggin language to SPIM assembly'
     )
+    a_parser.add_argument('source', nargs='?',
+        help='Noggin source file to compile, read from stdin if not given')
+    a_parser.add_argument('--mmap', action='store_true',
+        help='memory-map the source file and lex it without copying')
+    a_parser.add_argument('--lexer', choices=['hand', 'regex'], default='hand',
+        help='lexer engine to use (default: hand)')
+    a_parser.add_argument('--jobs', type=int, metavar='N',
+        help='lex the source file in chunks on N worker processes')
+    a_parser.add_argument('--trace-file', metavar='PATH',
+        help='write trace events to PATH as JSON lines')
+    a_parser.add_argument('--trace-level',
+        choices=['debug', 'info', 'warning', 'error'],
+        help='lowest level of event traced (default: debug if --trace-file '
+            'is given, otherwise nothing is traced)')
+    a_parser.add_argument('--trace-categories', default=','.join(categories),
+        help='comma separated categories of event traced, out of %s '
+            '(default: all)' % ', '.join(categories))
+    a_parser.add_argument('--iterative', action='store_true',
+        help='parse expressions and blocks with an explicit stack rather '
+            'than by recursion, for deeply nested sources')
+    a_parser.add_argument('--parse-jobs', type=int, metavar='N',
+        help='parse the function bodies on N worker processes')
+    a_parser.add_argument('--cache-dir', metavar='DIR',
+        help='keep the tokens and syntax tree of each source file in DIR, '
+            'and reuse them while the source is unchanged')
+    a_parser.add_argument('--cache-size', type=int, metavar='BYTES',
+        default=defaultMaxSize,
+        help='largest total size of the cache directory (default: %d)'
+            % defaultMaxSize)
+    a_parser.add_argument('--check-types', action='store_true',
+        help='check the types of every expression once the source is parsed')
+    a_parser.add_argument('--dump-call-graph', action='store_true',
+        help='print which functions each function calls and is called by, '
+            'callees first, and which are leaves or recursive')
     args = a_parser.parse_args()
+    if args.source is None:
+        if args.cache_dir is not None:
+            a_parser.error('--cache-dir needs a source file, not stdin')
+        if args.jobs is not None:
+            a_parser.error('--jobs needs a source file, not stdin')
+    if args.mmap:
+        if args.source is None:
+            a_parser.error('--mmap needs a source file, not stdin')
+        if args.cache_dir is not None:
+            a_parser.error('--mmap cannot be used with --cache-dir, which '
+                'reads the whole source to work out its key')
+        if args.jobs is not None:
+            a_parser.error('--mmap cannot be used with --jobs, which hands '
+                'each worker a copy of its chunk of the source')
+
+    if args.lexer == 'regex':
+        myLexer = lexer_regex.RegexLexerContext()
+    else:
+        myLexer = lexer_code.LexerContext()
+    parser = ParserContext()
+    parser.iterative = args.iterative
+    if args.parse_jobs is not None:
+        parser.workers = args.parse_jobs
 
-    myLexer = lexer_code.Lexer
+    traceFile = None
+    traceLevel = args.trace_level
+    if traceLevel is None and args.trace_file is not None:
+        traceLevel = 'debug'
+    if traceLevel is not None:
+        if args.trace_file is not None:
+            traceFile = open(args.trace_file, 'w')
+        tracer = Tracer(traceFile, levels[traceLevel],
+            args.trace_categories.split(','))
+        myLexer.trace = tracer
+        parser.trace = tracer
 
-    lexedTokens = []
-    newToken = myLexer.lex()
-    while newToken is not None:
-        if printVerbose:
-            print("Lexed new token: " + str(newToken))
-        lexedTokens.append(newToken)
-        newToken = myLexer.lex()
-    if printVerbose:
-        print("Reached end of tokens")
-        for t in lexedTokens:
-            print(t.get_info())
+    cache = None
+    p = None
+    # The warnings of a source lexed by lex_parallel(), as those of myLexer
+    # are only of what it lexed itself
+    lexerWarnings = []
+    if args.cache_dir is not None:
+        cache = FrontEndCache(args.cache_dir, args.cache_size)
+        with open(args.source, 'rb') as f:
+            sourceBytes = f.read()
+        cacheKey = FrontEndCache.key(sourceBytes, args.lexer)
+        text = sourceBytes.decode()
+        cached = cache.load(cacheKey)
+        if cached is not None:
+            # A hit skips both the lexer and the parser, so the warnings of
+            # the lexer come from the cache as well
+            buffer, p, cachedWarnings = cached
+            lexerWarnings.extend(cachedWarnings)
+        elif args.jobs is not None:
+            buffer = lexer_parallel.lex_parallel(text, args.jobs,
+                engine=args.lexer, warnings=lexerWarnings)
+        else:
+            myLexer.set_source(text)
+            buffer = myLexer.lex_buffer()
+        parser.set_tokens(buffer)
+    elif args.jobs is not None:
+        with open(args.source) as f:
+            parser.set_tokens(lexer_parallel.lex_parallel(
+                f.read(), args.jobs, engine=args.lexer,
+                warnings=lexerWarnings))
+    else:
+        if args.source is not None:
+            if args.mmap:
+                myLexer.set_source_file(args.source)
+            else:
+                with open(args.source) as f:
+                    myLexer.set_source(f.read())
+        elif args.parse_jobs is not None:
+            myLexer.set_source(sys.stdin.read())
 
-    Parser.set_tokens(lexedTokens)
+        if args.parse_jobs is not None:
+            # The function bodies are split apart in a token buffer, which
+            # a stream of tokens cannot be
+            parser.set_tokens(myLexer.lex_buffer())
+        else:
+            # The parser pulls each token from the lexer as it needs it
+            parser.set_token_stream(myLexer.tokens())
 
     try:
-        p = Program.parse()
-        if printVerbose:
-            print(p.info_str())
-            print(p)
+        if p is None:
+            p = Program.parse(parser=parser)
+            if cache is not None:
+                cache.store(cacheKey, buffer, p,
+                    list(myLexer.warnings) + lexerWarnings)
+        resolver = None
+        if args.check_types or args.dump_call_graph:
+            resolver = NameResolver()
+            resolver.resolve(p)
+        if args.check_types:
+            TypeChecker().check(p, resolver)
+        print(p.info_str())
+        print(p)
+        if args.dump_call_graph:
+            print(CallGraph(p, resolver).dump())
+    except (NameResolveException, TypeCheckException) as e:
+        print(e)
     except ParserException as e:
+        if parser.trace.errors <= ERROR:
+            parser.trace.event('errors', ERROR, 'parse failed',
+                exception=type(e).__name__,
+                message=str(e))
         print(e)
-
+    finally:
+        for warning in list(myLexer.warnings) + lexerWarnings:
+            print(warning, file=sys.stderr)
+        if traceFile is not None:
+            traceFile.close()
 
 
 if __name__ == "__main__":
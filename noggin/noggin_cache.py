@@ -0,0 +1,203 @@
+"""Front end cache module.
+
+This module contains the FrontEndCache, an on-disk cache of the tokens and
+the parsed Program of a source file, kept in the binary form of
+parser_binary, along with the warnings the lexer gave for it. Each entry is
+keyed by a hash of the source bytes, the lexer engine and the compiler
+sources, so an unchanged source skips the lexer and the parser entirely, and a
+change to the source, the engine or the compiler misses the cache.
+
+The entries are kept in one directory, one file per entry. When the directory
+grows past its size limit the least recently used entries are removed, using
+the modification time of each file, which is updated on every hit.
+"""
+
+import hashlib
+import os
+import struct
+import tempfile
+import zlib
+
+import parser_binary
+from lexer_code import LexerOverflowWarning
+from parser_binary import AstFormatException
+from symbol_table import symbols
+
+
+def source_version(directory=os.path.dirname(os.path.abspath(__file__))):
+    """Return a hash of the Python sources of the compiler, as a hex string.
+
+    Arguments:
+    directory -- the directory the compiler modules are kept in
+    """
+    h = hashlib.sha256()
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith('.py'):
+            continue
+        with open(os.path.join(directory, name), 'rb') as f:
+            h.update(name.encode() + b'\0')
+            h.update(f.read())
+    return h.hexdigest()[:16]
+
+# Any change to the lexer or parser, or to any other module, misses the cache
+compilerVersion = source_version()
+
+# Bump this whenever the layout of an entry file changes
+formatVersion = 5
+
+# The line, column and lengths of the text and value of a warning
+warningStruct = struct.Struct('<4I')
+countStruct = struct.Struct('<I')
+
+magic = b'NGC'
+entrySuffix = '.ngc'
+
+defaultMaxSize = 64 * 1024 * 1024
+
+
+class FrontEndCache(object):
+
+    """Size-bounded LRU cache of lexed tokens and parsed programs."""
+
+    def __init__(self, directory, maxSize=defaultMaxSize):
+        """Construct a cache over a directory, creating it if need be.
+
+        Arguments:
+        directory -- the directory the entries are kept in
+        maxSize -- the largest total size in bytes of all the entries
+        """
+        self.directory = directory
+        self.maxSize = maxSize
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(sourceBytes, engine='hand'):
+        """Return the cache key of a source, as a hex string.
+
+        Arguments:
+        sourceBytes -- the raw bytes of the source file
+        engine -- the name of the lexer engine the source is lexed with
+        """
+        h = hashlib.sha256()
+        h.update(('%s/%d/%s\0' % (compilerVersion, formatVersion, engine))
+            .encode())
+        h.update(sourceBytes)
+        return h.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + entrySuffix)
+
+    def load(self, key, symbolTable=symbols):
+        """Return the TokenBuffer, Program and list of LexerOverflowWarning
+        cached for a key, or None.
+
+        Arguments:
+        key -- the key of the source, from key()
+        symbolTable -- the pool the symbols of the tokens are interned in
+
+        A missing, unreadable or out of date entry is a miss.
+        """
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        header = magic + bytes([formatVersion])
+        if not data.startswith(header):
+            return None
+        try:
+            data = zlib.decompress(data[len(header):])
+            (warnings, offset) = decode_warnings(data)
+            (buffer, program) = parser_binary.loads(data[offset:], symbolTable)
+        except (zlib.error, struct.error, UnicodeDecodeError, ValueError,
+                AstFormatException):
+            # A corrupt entry is treated as a miss and written again
+            return None
+
+        # Mark the entry as the most recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return (buffer, program, warnings)
+
+    def store(self, key, buffer, program, warnings=()):
+        """Cache the TokenBuffer and Program of a source.
+
+        Arguments:
+        key -- the key of the source, from key()
+        buffer -- the TokenBuffer the source was lexed into
+        program -- the Program parsed from it
+        warnings -- the LexerOverflowWarning list of the lexer, given back
+            on a hit as the lexer does not run
+        """
+        data = zlib.compress(encode_warnings(warnings)
+            + parser_binary.dumps(program, buffer))
+
+        # Write to a temporary file first, so a reader never sees half an entry
+        fd, temporaryPath = tempfile.mkstemp(dir=self.directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(magic + bytes([formatVersion]))
+                f.write(data)
+            os.replace(temporaryPath, self.path(key))
+        except BaseException:
+            os.unlink(temporaryPath)
+            raise
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used entries until under the size limit."""
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith(entrySuffix):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, path))
+            total += stat.st_size
+
+        entries.sort()
+        for mtime, size, path in entries:
+            if total <= self.maxSize:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            total -= size
+
+
+def encode_warnings(warnings):
+    """Return the bytes of a list of LexerOverflowWarning."""
+    parts = [countStruct.pack(len(warnings))]
+    for warning in warnings:
+        text = warning.text.encode()
+        value = str(warning.value).encode()
+        parts.append(warningStruct.pack(warning.lineNo, warning.charStart,
+            len(text), len(value)))
+        parts.append(text)
+        parts.append(value)
+    return b''.join(parts)
+
+def decode_warnings(data):
+    """Return the list of LexerOverflowWarning at the start of some bytes,
+    and the offset of the bytes after them."""
+    (count,) = countStruct.unpack_from(data, 0)
+    offset = countStruct.size
+    warnings = []
+    for i in range(count):
+        (lineNo, charStart, textLength, valueLength) = \
+            warningStruct.unpack_from(data, offset)
+        offset += warningStruct.size
+        text = data[offset:offset + textLength].decode()
+        offset += textLength
+        value = int(data[offset:offset + valueLength])
+        offset += valueLength
+        warnings.append(LexerOverflowWarning(text, value, lineNo, charStart))
+    return (warnings, offset)
@@ -0,0 +1,92 @@
+"""Trace module.
+
+This module contains the Tracer, the structured event sink the lexers and the
+parser report what they are doing to. Every event has a category, a level and
+a name, along with any fields that describe it, and is written to the sink as
+one line of JSON.
+
+A Tracer keeps, for each category, the lowest level of event that is traced,
+or OFF. Code reporting an event checks that level before building the event:
+
+    if trace.lexer <= DEBUG:
+        trace.event('lexer', DEBUG, 'token', text=token.original)
+
+so while tracing is disabled an event costs no more than an attribute lookup
+and a comparison.
+"""
+
+import json
+import sys
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+OFF = 100
+
+levels = {
+    'debug': DEBUG,
+    'info': INFO,
+    'warning': WARNING,
+    'error': ERROR,
+    'off': OFF
+}
+
+levelNames = dict((v, k) for k, v in levels.items())
+
+categories = ['lexer', 'parser', 'env', 'errors']
+
+
+class Tracer(object):
+
+    """Structured event sink with levels and categories."""
+
+    lexer = OFF
+    parser = OFF
+    env = OFF
+    errors = OFF
+
+    def __init__(self, sink=None, level=OFF, traced=categories):
+        """Construct a tracer.
+
+        Arguments:
+        sink -- the file each event is written to as a line of JSON, stderr
+            if not given
+        level -- the lowest level of event traced
+        traced -- the categories of event traced
+        """
+        self.sink = sink
+        self.enable(level, traced)
+
+    def enable(self, level, traced=categories):
+        """Trace the given categories of event from the given level up."""
+        for category in categories:
+            if category in traced:
+                setattr(self, category, level)
+            else:
+                setattr(self, category, OFF)
+
+    def disable(self):
+        """Stop tracing any events."""
+        self.enable(OFF)
+
+    def event(self, category, level, eventName, **fields):
+        """Write an event to the sink.
+
+        Arguments:
+        category -- one of the names in categories
+        level -- the level of the event, e.g. DEBUG
+        eventName -- the name of the event
+        fields -- the values describing the event, anything not JSON
+            serializable is written as its str()
+        """
+        record = {'category': category, 'level': levelNames[level],
+            'event': eventName}
+        record.update(fields)
+        sink = self.sink if self.sink is not None else sys.stderr
+        sink.write(json.dumps(record, default=str) + '\n')
+
+
+# The tracer used by lexer and parser contexts unless given another one. It
+# traces nothing until it is enabled.
+tracer = Tracer()
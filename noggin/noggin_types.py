@@ -1,26 +1,60 @@
 class NogginType:
-	typeName = None
 
-	def __init__(self, typeName):
-		self.typeName = typeName
+	"""A type of a Noggin value: a base type, or an array of it.
+
+	Types are interned, with one object for each base type name and array
+	dimension, so two types are equal only when they are the same object and
+	are compared with "is", and can be kept in sets and dicts. Get them from
+	intern_type() rather than constructing them.
+	"""
 
-	def __eq__(self, other):
-		return self.typeName == other.typeName
+	def __init__(self, typeName, arrayDimension=0):
+		self.typeName = typeName
+		self.arrayDimension = arrayDimension
 
 	def to_key(self):
-		return typeName
+		"""Return the key the type is interned under."""
+		return (self.typeName, self.arrayDimension)
+
+	def __reduce__(self):
+		# An unpickled type is interned again, so that it is the same object
+		# as the type of this process, e.g. in a parser_parallel worker
+		return (intern_type, self.to_key())
+
+	def __str__(self):
+		return self.typeName + "[]" * self.arrayDimension
+
+	def __repr__(self):
+		return "NogginType(%r, %d)" % (self.typeName, self.arrayDimension)
+
+NT_interned = {}
+
+def intern_type(typeName, arrayDimension=0):
+	"""Return the type of a base type name and array dimension.
+
+	Arguments:
+	typeName -- the name of the base type, e.g. "int"
+	arrayDimension -- the number of array levels, 0 for the base type itself
+	"""
+	key = (typeName, arrayDimension)
+	nogginType = NT_interned.get(key)
+	if nogginType is None:
+		nogginType = NogginType(typeName, arrayDimension)
+		NT_interned[key] = nogginType
+	return nogginType
 
 NT_types_base = {}
 
-NT_void = NogginType("void")
+NT_void = intern_type("void")
 NT_types_base['void'] = NT_void
-NT_char = NogginType("char")
+NT_char = intern_type("char")
 NT_types_base['char'] = NT_char
-NT_uint = NogginType("uint")
+NT_uint = intern_type("uint")
 NT_types_base['uint'] = NT_uint
-NT_int = NogginType("int")
+NT_int = intern_type("int")
 NT_types_base['int'] = NT_int
-NT_bool = NogginType("bool")
+NT_bool = intern_type("bool")
 NT_types_base['bool'] = NT_bool
-NT_string = NogginType("string")
+NT_string = intern_type("string")
 NT_types_base['string'] = NT_string
+
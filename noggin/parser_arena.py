@@ -0,0 +1,306 @@
+"""Arena syntax tree module.
+
+This module contains the AstArena, a flat form of a parsed Program. Rather
+than one Python object per node, each node is a row of a few parallel arrays:
+its kind, the indices of its first and last tokens in the TokenBuffer it was
+parsed from, and the index and count of its children. An analysis can then
+scan a whole program with a loop over arrays, and the arrays can be handed to
+another process as they are, without pickling.
+
+The nodes are laid out in breadth first order, so the children of a node are
+the rows childStarts[n] to childStarts[n] + childCounts[n] - 1. A node has one
+child for each field of its class, in the order of the __slots__ of the class
+and its bases. A field that is not itself a node is stood in for by a pseudo
+node of one of these kinds:
+
+NONE -- a field set to None
+LIST -- a list, whose children are the items of the list
+TOKEN -- a token, whose index is both its first and last token index
+VALUE -- any other value, such as a NogginType, kept in the values side
+    table, or a token that is not one of the TokenBuffer, such as one made
+    without offsets
+LINK -- a node that is already the child of another node, such as the ident
+    held as both the firstToken and the ident of a FunctionCallExpression, or
+    the FunctionDeclaration of a FunctionDefinition
+
+The first and last token indices of a node cover all the tokens under it, and
+are -1 for a node with no tokens under it.
+"""
+
+import gc
+from array import array
+from bisect import bisect_left
+from collections import deque
+
+import parser_elements
+from lexer_tokens import Token, TokenBuffer
+
+# The kinds of the pseudo nodes standing in for fields that are not nodes
+
+NONE = 0
+LIST = 1
+TOKEN = 2
+VALUE = 3
+LINK = 4
+
+pseudoKindNames = ['NONE', 'LIST', 'TOKEN', 'VALUE', 'LINK']
+
+# The node classes, each with its kind being its index in this list
+nodeClasses = [None] * len(pseudoKindNames) + sorted(
+    (value for value in vars(parser_elements).values()
+        if isinstance(value, type)
+            and value.__module__ == parser_elements.__name__
+            and '__slots__' in value.__dict__),
+    key=lambda cls: cls.__name__)
+
+nodeKinds = dict((cls, kind) for kind, cls in enumerate(nodeClasses)
+    if cls is not None)
+
+
+def node_fields(cls):
+    """Return the names of the fields of a node class, bases first."""
+    names = []
+    for base in reversed(cls.__mro__):
+        names.extend(base.__dict__.get('__slots__', ()))
+    return names
+
+# The fields of each node class, by kind
+nodeFields = [None if cls is None else node_fields(cls)
+    for cls in nodeClasses]
+
+
+class AstArena(object):
+
+    """Parallel array form of a Program syntax tree."""
+
+    def __init__(self, tokens):
+        """Construct an empty arena.
+
+        Arguments:
+        tokens -- the TokenBuffer the token indices of the nodes refer to
+        """
+        self.tokens = tokens
+        self.kinds = array('B')
+        self.firstTokens = array('i')
+        self.lastTokens = array('i')
+        self.childStarts = array('I')
+        self.childCounts = array('I')
+        # For a VALUE node the index of its value in values, for a LINK node
+        # the index of the node linked to, and -1 for any other node
+        self.data = array('i')
+        # The side table of the values of VALUE nodes
+        self.values = []
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def append(self, kind, firstToken=-1, lastToken=-1, data=-1):
+        """Add a node with no children yet and return its index."""
+        self.kinds.append(kind)
+        self.firstTokens.append(firstToken)
+        self.lastTokens.append(lastToken)
+        self.childStarts.append(0)
+        self.childCounts.append(0)
+        self.data.append(data)
+        return len(self.kinds) - 1
+
+    def kind_name(self, n):
+        """Return the name of the kind of node n."""
+        kind = self.kinds[n]
+        if kind < len(pseudoKindNames):
+            return pseudoKindNames[kind]
+        return nodeClasses[kind].__name__
+
+    def children(self, n):
+        """Return the range of the indices of the children of node n."""
+        start = self.childStarts[n]
+        return range(start, start + self.childCounts[n])
+
+    def preorder(self, n=0):
+        """Yield the indices of node n and all the nodes under it, each
+        before the nodes under it.
+        """
+        childStarts = self.childStarts
+        childCounts = self.childCounts
+        stack = [n]
+        while stack:
+            n = stack.pop()
+            yield n
+            start = childStarts[n]
+            stack.extend(range(start + childCounts[n] - 1, start - 1, -1))
+
+    def postorder(self, n=0):
+        """Yield the indices of node n and all the nodes under it, each
+        after the nodes under it.
+        """
+        childStarts = self.childStarts
+        childCounts = self.childCounts
+        # Each entry is a node and whether its children have been pushed
+        stack = [(n, False)]
+        while stack:
+            n, expanded = stack.pop()
+            if expanded:
+                yield n
+            else:
+                stack.append((n, True))
+                start = childStarts[n]
+                stack.extend((child, False) for child in
+                    range(start + childCounts[n] - 1, start - 1, -1))
+
+    @staticmethod
+    def from_program(program, tokens):
+        """Construct the arena of a Program.
+
+        Arguments:
+        program -- the Program, or any other node, at the root of the tree
+        tokens -- the TokenBuffer or list of tokens the Program was parsed
+            from; a list is copied into a TokenBuffer
+        """
+        if not isinstance(tokens, TokenBuffer):
+            tokens = TokenBuffer.from_tokens(tokens)
+        arena = AstArena(tokens)
+        starts = tokens.starts
+        valueIndices = {}
+        # The index of each node already in the arena, by id
+        placed = {}
+
+        def add(value):
+            """Add the node or pseudo node for a value, and return it, with
+            the value if its children are still to be added."""
+            if value is None:
+                return (arena.append(NONE), None)
+            kind = nodeKinds.get(type(value))
+            if kind is not None:
+                n = placed.get(id(value))
+                if n is not None:
+                    return (arena.append(LINK, data=n), None)
+                n = arena.append(kind)
+                placed[id(value)] = n
+                return (n, value)
+            if isinstance(value, list):
+                return (arena.append(LIST), value)
+            if isinstance(value, Token) and value.offsetStart is not None:
+                i = bisect_left(starts, value.offsetStart)
+                if i < len(starts) and starts[i] == value.offsetStart:
+                    return (arena.append(TOKEN, i, i), None)
+            index = valueIndices.get(id(value))
+            if index is None:
+                index = len(arena.values)
+                valueIndices[id(value)] = index
+                arena.values.append(value)
+            return (arena.append(VALUE, data=index), None)
+
+        # Add the nodes level by level, so that the children of each node
+        # are added one after another
+        queue = deque([add(program)])
+        while queue:
+            n, value = queue.popleft()
+            if value is None:
+                continue
+            if isinstance(value, list):
+                items = value
+            else:
+                items = [getattr(value, name, None)
+                    for name in nodeFields[arena.kinds[n]]]
+            arena.childStarts[n] = len(arena.kinds)
+            arena.childCounts[n] = len(items)
+            for item in items:
+                queue.append(add(item))
+
+        # Every child comes after its parent, so going backwards the token
+        # range of each node is known before that of its parent
+        firstTokens = arena.firstTokens
+        lastTokens = arena.lastTokens
+        for n in range(len(arena.kinds) - 1, -1, -1):
+            first = firstTokens[n]
+            last = lastTokens[n]
+            for child in arena.children(n):
+                childFirst = firstTokens[child]
+                if childFirst != -1:
+                    if first == -1 or childFirst < first:
+                        first = childFirst
+                    if lastTokens[child] > last:
+                        last = lastTokens[child]
+            firstTokens[n] = first
+            lastTokens[n] = last
+        return arena
+
+    def to_program(self, n=0):
+        """Return the object tree of node n, by default the Program.
+
+        The tokens of the tree are views of the TokenBuffer of the arena. A
+        link from the tree to a node outside it, such as the declaration of
+        a FunctionDefinition, is made as the whole tree of that node too.
+        """
+        kinds = self.kinds
+        # Every node is under the root, so the whole arena can be gone
+        # through in order rather than walked
+        order = range(len(kinds)) if n == 0 else self.linked_preorder(n)
+        # Making this many objects would otherwise set off the cyclic garbage
+        # collector over and over, and the tree has no cycles to collect
+        gcEnabled = gc.isenabled()
+        gc.disable()
+        try:
+            return self.make_objects(n, order)
+        finally:
+            if gcEnabled:
+                gc.enable()
+
+    def linked_preorder(self, n):
+        """Return the indices of node n and all the nodes under it, in
+        preorder, then those of the trees of the nodes linked to from them
+        that are not under node n.
+        """
+        kinds = self.kinds
+        data = self.data
+        order = []
+        seen = set()
+        roots = [n]
+        while roots:
+            for i in self.preorder(roots.pop()):
+                if i in seen:
+                    continue
+                seen.add(i)
+                order.append(i)
+                if kinds[i] == LINK and data[i] not in seen:
+                    roots.append(data[i])
+        return order
+
+    def make_objects(self, n, order):
+        """Return the object tree of node n, making the nodes in order."""
+        kinds = self.kinds
+        childStarts = self.childStarts
+        childCounts = self.childCounts
+        # Make every node object first, so links can refer to any of them
+        objects = [None] * len(kinds)
+        for i in order:
+            kind = kinds[i]
+            if kind > LINK:
+                cls = nodeClasses[kind]
+                objects[i] = cls.__new__(cls)
+
+        def value_of(i):
+            kind = kinds[i]
+            if kind > LINK:
+                return objects[i]
+            elif kind == NONE:
+                return None
+            elif kind == LIST:
+                start = childStarts[i]
+                return [value_of(child)
+                    for child in range(start, start + childCounts[i])]
+            elif kind == TOKEN:
+                return self.tokens[self.firstTokens[i]]
+            elif kind == VALUE:
+                return self.values[self.data[i]]
+            return objects[self.data[i]]
+
+        for i in order:
+            kind = kinds[i]
+            if kind > LINK:
+                node = objects[i]
+                child = childStarts[i]
+                for name in nodeFields[kind]:
+                    setattr(node, name, value_of(child))
+                    child += 1
+        return value_of(n)
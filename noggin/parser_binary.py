@@ -0,0 +1,302 @@
+"""Binary syntax tree module.
+
+This module saves a parsed Program, together with the tokens and source text
+it was parsed from, in a compact binary form, and loads it back. Loading is
+only a matter of reading arrays straight into memory and making the node
+objects, so it is much quicker than lexing and parsing the source again, or
+unpickling the Program.
+
+A file holds, in order, all little-endian:
+
+- the magic bytes NGA and the format version, one byte
+- the numbers of token classes, node classes, tokens, nodes and values, and
+  the length of the source in bytes, each a uint32
+- the source kind, one byte: TEXT_SOURCE if the token offsets are character
+  offsets into the text of a StringSource, or BYTES_SOURCE if they are byte
+  offsets into the raw bytes of a file, as for a MappedFileSource
+- the token class table: for each token kind of the writer, the name of the
+  token class
+- the node class table: for each node kind of the writer, the name of the
+  class and the names of its fields
+- the source, as UTF-8 text or as the raw bytes of the file
+- the TokenBuffer arrays: kinds as uint8, then starts, ends, lines and
+  columns as uint32
+- the AstArena arrays: kinds as uint8, first and last token indices as int32,
+  child starts and counts as uint32, and data as int32
+- the values side table, each value a tag byte and its encoding
+
+The kinds of the tokens and nodes are mapped from those of the writer to
+those of the reader by the names in the class tables, so a reader whose token
+or node classes differ rejects the file rather than misreading it.
+
+Every string in the class tables and the values is a uint32 byte length
+followed by its UTF-8 bytes. A NogginType value is the string of its base type
+name followed by its array dimension, as a uint32. A Token that is not one of
+the TokenBuffer, such as one made by hand rather than lexed, is the string of
+its class name and its original text, then its line, start column and end
+column, each a value of its own.
+"""
+
+import struct
+import sys
+from array import array
+
+from lexer_source import StringSource, BytesSource
+from lexer_tokens import Token, TokenBuffer, tokenClasses
+from noggin_types import NogginType, intern_type
+from parser_arena import AstArena, nodeClasses, nodeFields, pseudoKindNames
+from symbol_table import symbols
+
+# Bump this whenever the layout of the file changes
+formatVersion = 4
+
+magic = b'NGA'
+
+header = struct.Struct('<6I')
+length = struct.Struct('<I')
+integer = struct.Struct('<q')
+
+# The tags of the values in the side table
+INT_TAG = b'i'
+TYPE_TAG = b't'
+STRING_TAG = b's'
+BOOL_TAG = b'b'
+TOKEN_TAG = b'k'
+NONE_TAG = b'n'
+
+# The kinds of source the token offsets can refer to
+TEXT_SOURCE = 0
+BYTES_SOURCE = 1
+
+
+class AstFormatException(Exception):
+    def __init__(self, problem):
+        self.problem = problem
+
+    def __str__(self):
+        return "AstFormatException: " + str(self.problem)
+
+
+def little_endian(values):
+    """Return the bytes of an array, in little-endian order."""
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def encode_string(text):
+    data = text.encode()
+    return length.pack(len(data)) + data
+
+
+def encode_value(value):
+    """Return the tag and encoding of a value of the side table."""
+    if isinstance(value, bool):
+        return BOOL_TAG + bytes([value])
+    elif isinstance(value, int):
+        return INT_TAG + integer.pack(value)
+    elif isinstance(value, NogginType):
+        return (TYPE_TAG + encode_string(value.typeName)
+            + length.pack(value.arrayDimension))
+    elif isinstance(value, str):
+        return STRING_TAG + encode_string(value)
+    elif isinstance(value, Token):
+        return (TOKEN_TAG + encode_string(type(value).__name__)
+            + encode_value(value.original) + encode_value(value.lineNo)
+            + encode_value(value.charStart) + encode_value(value.charEnd))
+    elif value is None:
+        return NONE_TAG
+    raise AstFormatException("cannot save a value of type %s"
+        % type(value).__name__)
+
+
+def dumps(program, tokens):
+    """Return the binary form of a Program.
+
+    Arguments:
+    program -- the Program
+    tokens -- the TokenBuffer or list of tokens the Program was parsed from,
+        with the source they were lexed from
+    """
+    for definition in program.functionDefinitions:
+        # Parses any function body skipped with ParserContext.lazyBodies
+        definition.statements
+    arena = AstArena.from_program(program, tokens)
+    tokens = arena.tokens
+    # The source is kept as the token offsets index it
+    if isinstance(tokens.source.data, str):
+        sourceKind = TEXT_SOURCE
+        source = tokens.source.data.encode()
+    else:
+        sourceKind = BYTES_SOURCE
+        source = bytes(tokens.source.data)
+
+    classes = nodeClasses[len(pseudoKindNames):]
+    parts = [
+        magic + bytes([formatVersion]),
+        header.pack(len(tokenClasses), len(classes), len(tokens), len(arena),
+            len(arena.values), len(source)),
+        bytes([sourceKind])]
+    parts.extend(encode_string(tokenClass.__name__)
+        for tokenClass in tokenClasses)
+    for cls, fields in zip(classes, nodeFields[len(pseudoKindNames):]):
+        parts.append(encode_string(cls.__name__))
+        parts.append(length.pack(len(fields)))
+        parts.extend(encode_string(name) for name in fields)
+    parts.append(source)
+    for values in (tokens.kinds, tokens.starts, tokens.ends, tokens.lines,
+            tokens.columns, arena.kinds, arena.firstTokens, arena.lastTokens,
+            arena.childStarts, arena.childCounts, arena.data):
+        parts.append(little_endian(values))
+    parts.extend(encode_value(value) for value in arena.values)
+    return b''.join(parts)
+
+
+class Reader(object):
+
+    """Position in the bytes of a binary Program being loaded."""
+
+    def __init__(self, data):
+        self.data = memoryview(data)
+        self.position = 0
+        self.tokenClassNames = dict((tokenClass.__name__, tokenClass)
+            for tokenClass in tokenClasses)
+
+    def take(self, size):
+        if self.position + size > len(self.data):
+            raise AstFormatException("file is cut short")
+        part = self.data[self.position:self.position + size]
+        self.position += size
+        return part
+
+    def unpack(self, fmt):
+        return fmt.unpack(self.take(fmt.size))
+
+    def string(self):
+        return str(self.take(self.unpack(length)[0]), 'utf-8')
+
+    def array(self, typecode, count):
+        values = array(typecode)
+        values.frombytes(self.take(count * values.itemsize))
+        if sys.byteorder == 'big':
+            values.byteswap()
+        return values
+
+    def value(self):
+        tag = bytes(self.take(1))
+        if tag == INT_TAG:
+            return self.unpack(integer)[0]
+        elif tag == BOOL_TAG:
+            return bool(self.take(1)[0])
+        elif tag == TYPE_TAG:
+            typeName = self.string()
+            return intern_type(typeName, self.unpack(length)[0])
+        elif tag == STRING_TAG:
+            return self.string()
+        elif tag == TOKEN_TAG:
+            name = self.string()
+            tokenClass = self.tokenClassNames.get(name)
+            if tokenClass is None:
+                raise AstFormatException("token class %s differs from this "
+                    "version" % name)
+            token = tokenClass.__new__(tokenClass)
+            token.original = self.value()
+            token.lineNo = self.value()
+            token.charStart = self.value()
+            token.charEnd = self.value()
+            return token
+        elif tag == NONE_TAG:
+            return None
+        raise AstFormatException("unknown value tag %r" % tag)
+
+
+def loads(data, symbolTable=symbols):
+    """Return the TokenBuffer and Program of the binary form of a Program.
+
+    Arguments:
+    data -- the bytes, from dumps()
+    symbolTable -- the pool the symbols of the tokens are interned in
+
+    An AstFormatException is raised if the data is not a binary Program, or
+    was written by a version with other token or node classes.
+    """
+    reader = Reader(data)
+    if bytes(reader.take(len(magic))) != magic:
+        raise AstFormatException("not a binary Noggin program")
+    version = reader.take(1)[0]
+    if version != formatVersion:
+        raise AstFormatException("format version %d, expected %d"
+            % (version, formatVersion))
+    (tokenClassCount, classCount, tokenCount, nodeCount, valueCount,
+        sourceLength) = reader.unpack(header)
+    sourceKind = reader.take(1)[0]
+    if sourceKind not in (TEXT_SOURCE, BYTES_SOURCE):
+        raise AstFormatException("unknown source kind %d" % sourceKind)
+
+    # The token kinds of the writer, mapped to those of this version
+    tokenKindNames = dict((tokenClass.__name__, kind)
+        for kind, tokenClass in enumerate(tokenClasses))
+    tokenMapping = []
+    for i in range(tokenClassCount):
+        name = reader.string()
+        kind = tokenKindNames.get(name)
+        if kind is None:
+            raise AstFormatException("token class %s differs from this version"
+                % name)
+        tokenMapping.append(kind)
+
+    # The node kinds of the writer, mapped to those of this version
+    kindNames = dict((cls.__name__, kind)
+        for kind, cls in enumerate(nodeClasses) if cls is not None)
+    mapping = list(range(len(pseudoKindNames)))
+    for i in range(classCount):
+        name = reader.string()
+        fields = [reader.string() for j in range(reader.unpack(length)[0])]
+        kind = kindNames.get(name)
+        if kind is None or nodeFields[kind] != fields:
+            raise AstFormatException("node class %s differs from this version"
+                % name)
+        mapping.append(kind)
+
+    if sourceKind == TEXT_SOURCE:
+        source = StringSource(str(reader.take(sourceLength), 'utf-8'))
+    else:
+        source = BytesSource(bytes(reader.take(sourceLength)))
+    tokens = TokenBuffer(source, symbolTable)
+    tokens.kinds = reader.array('B', tokenCount)
+    if tokenMapping != list(range(len(tokenMapping))):
+        tokens.kinds = array('B',
+            [tokenMapping[kind] for kind in tokens.kinds])
+    tokens.starts = reader.array('I', tokenCount)
+    tokens.ends = reader.array('I', tokenCount)
+    tokens.lines = reader.array('I', tokenCount)
+    tokens.columns = reader.array('I', tokenCount)
+    interned = [tokenClass.interned for tokenClass in tokenClasses]
+    tokens.symbols = array('i', [
+        symbolTable.intern(source.text(start, end)) if interned[kind] else -1
+        for kind, start, end in zip(tokens.kinds, tokens.starts, tokens.ends)])
+
+    arena = AstArena(tokens)
+    arena.kinds = reader.array('B', nodeCount)
+    arena.firstTokens = reader.array('i', nodeCount)
+    arena.lastTokens = reader.array('i', nodeCount)
+    arena.childStarts = reader.array('I', nodeCount)
+    arena.childCounts = reader.array('I', nodeCount)
+    arena.data = reader.array('i', nodeCount)
+    arena.values = [reader.value() for i in range(valueCount)]
+    if mapping != list(range(len(mapping))):
+        arena.kinds = array('B', [mapping[kind] for kind in arena.kinds])
+    return (tokens, arena.to_program())
+
+
+def save(program, tokens, path):
+    """Save a Program and its tokens to a file, see dumps()."""
+    with open(path, 'wb') as f:
+        f.write(dumps(program, tokens))
+
+
+def load(path, symbolTable=symbols):
+    """Load a TokenBuffer and Program from a file, see loads()."""
+    with open(path, 'rb') as f:
+        return loads(f.read(), symbolTable)
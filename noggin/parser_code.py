@@ -1,63 +1,253 @@
-from lexer_tokens import Token
+import copyreg
+from collections import deque
 
-from noggin_types import NT_types_base
+from lexer_tokens import Token, TokenBuffer
 
-class Parser:
+from noggin_types import NT_types_base
+from symbol_table import symbols
+from context_shim import ContextShim
+from noggin_trace import tracer
+
+class TokenStream:
+
+    """Lookahead buffer over an iterator of tokens.
+
+    Tokens are only pulled from the iterator when the parser looks at them,
+    and are dropped as soon as the parser has moved past them. The buffer
+    therefore only ever holds as many tokens as the deepest lookahead asked
+    for by get_relative_token(), which is what lets a file be parsed while it
+    is still being lexed.
+    """
+
+    def __init__(self, tokens):
+        """Construct a token stream.
+
+        Arguments:
+        tokens -- an iterable of tokens, e.g. the generator Lexer.tokens()
+        """
+        self.tokens = iter(tokens)
+        self.buffer = deque()
+        self.exhausted = False
+
+    def peek(self, n):
+        """Return the token n places ahead, or None past the end."""
+        buffer = self.buffer
+        while len(buffer) <= n:
+            if self.exhausted:
+                return None
+            try:
+                buffer.append(next(self.tokens))
+            except StopIteration:
+                self.exhausted = True
+                return None
+        return buffer[n]
+
+    def advance(self):
+        """Drop the current token."""
+        if self.buffer or self.peek(0) is not None:
+            self.buffer.popleft()
+
+class ParserContext:
+
+    """State of one parse.
+
+    A ParserContext holds the tokens being parsed and the position in them,
+    and is passed through every parse() method of the parser elements, so
+    several programs can be parsed at once. The Parser class below keeps the
+    old static interface working over a default context.
+    """
     tokenList = []
     tokenPosition = 0
-    printVerbose = True
-
-    @staticmethod
-    def has_another_token():
-        return len(Parser.tokenList) > Parser.tokenPosition\
-            and Parser.tokenList[Parser.tokenPosition] is not None
-
-    @staticmethod
-    def get_token():
+    tokenStream = None
+    # The kinds array of the token list, when it is a TokenBuffer
+    tokenKinds = None
+
+    # Where parser events are reported, see noggin_trace
+    trace = tracer
+
+    # Whether expressions and blocks are parsed with an explicit stack rather
+    # than by recursion, see parser_iterative
+    iterative = False
+
+    # Whether function bodies are skipped over by matching braces, and only
+    # parsed when the statements of a FunctionDefinition are first used
+    lazyBodies = False
+
+    # The number of worker processes function bodies are parsed on, see
+    # parser_parallel, or 0 to parse them in this process
+    workers = 0
+
+    def __init__(self, tokens=None):
+        """Construct a parser context.
+
+        Arguments:
+        tokens -- a list of tokens or a TokenBuffer to parse, if given
+        """
+        if tokens is not None:
+            self.set_tokens(tokens)
+
+    def has_another_token(self):
+        if self.tokenStream is not None:
+            return self.tokenStream.peek(0) is not None
+        if self.tokenKinds is not None:
+            return len(self.tokenKinds) > self.tokenPosition
+        return len(self.tokenList) > self.tokenPosition\
+            and self.tokenList[self.tokenPosition] is not None
+
+    def get_token(self):
+        if self.tokenStream is not None:
+            return self.tokenStream.peek(0)
         try:
-            return Parser.tokenList[Parser.tokenPosition]
+            return self.tokenList[self.tokenPosition]
         except IndexError as ie:
             return None
 
-    @staticmethod
-    def advance_token():
-        if Parser.has_another_token():
-            Parser.tokenPosition += 1
+    def advance_token(self):
+        if self.has_another_token():
+            self.tokenPosition += 1
+            if self.tokenStream is not None:
+                self.tokenStream.advance()
+
+    def set_tokens(self, ts):
+        self.tokenList = ts
+        self.tokenPosition = 0
+        self.tokenStream = None
+        if isinstance(ts, TokenBuffer):
+            self.tokenKinds = ts.kinds
+        else:
+            self.tokenKinds = None
+
+    def set_token_stream(self, tokens):
+        """Parse from an iterable of tokens rather than a list.
+
+        Arguments:
+        tokens -- an iterable of tokens, e.g. the generator Lexer.tokens()
+        """
+        self.tokenList = []
+        self.tokenPosition = 0
+        self.tokenStream = TokenStream(tokens)
+        self.tokenKinds = None
+
+    def get_kind(self):
+        """Return the integer kind of the current token, 0 past the end."""
+        if self.tokenKinds is not None:
+            if self.tokenPosition < len(self.tokenKinds):
+                return self.tokenKinds[self.tokenPosition]
+            return 0
+        token = self.get_token()
+        if token is None:
+            return 0
+        return token.kind
+
+    def get_relative_kind(self, n):
+        """Return the integer kind of the token n places ahead.
+
+        With a TokenBuffer this reads the kinds array directly, without
+        making a Token object.
+        """
+        if self.tokenKinds is not None:
+            position = self.tokenPosition + n
+            if position < len(self.tokenKinds):
+                return self.tokenKinds[position]
+            return 0
+        token = self.get_relative_token(n)
+        if token is None:
+            return 0
+        return token.kind
+
+    def get_relative_token(self, n):
+        if self.tokenStream is not None:
+            return self.tokenStream.peek(n)
+        newTokenPosition = self.tokenPosition + n
+        if len(self.tokenList) > newTokenPosition:
+            return self.tokenList[newTokenPosition]
+        else:
+            return None
 
-    @staticmethod
-    def set_tokens(ts):
-        Parser.tokenList = ts
-        Parser.tokenPosition = 0
+class Parser(metaclass=ContextShim):
+
+    """Static interface to the default ParserContext.
+
+    Parser.set_tokens(), Parser.get_token() and every other attribute of a
+    ParserContext can still be used on the Parser class itself, and act on
+    Parser.default. Every parse() method takes a parser context, falling
+    back to Parser.default when none is given.
+    """
+
+    default = ParserContext()
 
     @staticmethod
-    def get_relative_token(n):
-        newTokenPosition = Parser.tokenPosition + n
-        if len(Parser.tokenList) > newTokenPosition:
-            return Parser.tokenList[newTokenPosition]
-        else:
-            return None
+    def context(parser):
+        """Return the given parser context, or the default one if None."""
+        if parser is None:
+            return Parser.default
+        return parser
 
 class Environment:
-    d = {}
-    t = {}
 
-    def __init__(self, d={}):
-        self.d = d
+    """Mapping of the names in scope to their declarations.
+
+    Names are keyed by their interned symbol id rather than their text, see
+    SymbolTable.
+
+    Each Environment is one scope, holding only the names declared in it, and
+    chained to the scope it is nested in. A declaration is added to the
+    innermost scope without copying the outer ones, and a lookup walks out
+    along the chain, so declaring is O(1) and looking up is O(depth).
+    """
+
+    def __init__(self, parent=None, symbolTable=symbols):
+        """Construct a scope.
+
+        Arguments:
+        parent -- the Environment this scope is nested in, or None for the
+        global scope
+        symbolTable -- the pool the names are interned in, taken from the
+        parent if there is one
+        """
+        self.d = {}
+        self.parent = parent
+        if parent is not None:
+            symbolTable = parent.symbolTable
         self.t = NT_types_base
+        self.symbolTable = symbolTable
+
+    @staticmethod
+    def or_new(environment):
+        """Return the given environment, or a new global scope if None.
+
+        Used in place of a default argument, which would be one scope shared
+        by every call.
+        """
+        if environment is None:
+            return Environment()
+        return environment
+
+    def child(self):
+        """Return a new empty scope nested in this one."""
+        return Environment(self)
 
     def get(self, k):
-        return self.d[k]
+        scope = self
+        while scope is not None:
+            if k in scope.d:
+                return scope.d[k]
+            scope = scope.parent
+        raise KeyError(k)
 
     def set(self, k, v):
         self.d[k] = v
 
     def contains(self, k):
-        return k in self.d
-
-    def copy(self):
-        return Environment(self.d.copy())
+        scope = self
+        while scope is not None:
+            if k in scope.d:
+                return True
+            scope = scope.parent
+        return False
 
     def add(self, k, v):
+        # A name may not be declared again in a nested scope either
         if self.contains(k):
             raise ParserRepeatedDeclarationException(
                 self.get(k),
@@ -66,13 +256,38 @@ class Environment:
             self.set(k, v)
 
     def items(self):
+        """Return the names and declarations of this scope only."""
         return self.d.items()
 
     def types(self, name):
         return self.t[name]
 
+    def name(self, k):
+        """Return the text of the name with symbol id k."""
+        return self.symbolTable.name(k)
+
+    def __getstate__(self):
+        # Symbol ids are only meaningful in this process, so the names are
+        # kept instead, and interned again in the shared pool when loaded
+        state = self.__dict__.copy()
+        state['d'] = [(self.name(k), v) for k, v in self.d.items()]
+        del state['t']
+        del state['symbolTable']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.d = dict((symbols.intern(name), v) for name, v in state['d'])
+        self.t = NT_types_base
+        self.symbolTable = symbols
+
 class ParserException(Exception):
-    pass
+
+    def __reduce__(self):
+        # Each subclass has its own constructor arguments, so an exception is
+        # rebuilt from its attributes instead, to be passed back from a
+        # worker process
+        return (copyreg.__newobj__, (type(self),), self.__dict__)
 
 class ParserWrongTokenException(ParserException):
     def __init__(self, token, expected):
@@ -17,7 +17,7 @@ from lexer_tokens import Token,\
     SemiColonToken, SwitchToken, WhileToken, StatementStartingTokens, \
     DefineArgumentContinueTokens
 
-from parser_code import Parser, Environment, ParserException,\
+from parser_code import Parser, ParserContext, Environment, ParserException,\
     ParserWrongTokenException, ParserFunctionDefineWithoutDeclareException,\
     ParserFunctionUseWithoutDeclareException,\
     ParserVariableUseWithoutDeclareException,\
@@ -27,7 +27,9 @@ from parser_code import Parser, Environment, ParserException,\
 
 from noggin_types import NT_types_base, NT_char, NT_uint, NT_int, NT_bool, NT_string
 
-def expect_token(token):
+from noggin_trace import DEBUG, INFO
+
+def expect_token(token, parser=None):
     """Expect a token type.
 
     Keyword arguments:
@@ -38,52 +40,88 @@ def expect_token(token):
     the presence of a type of token (e.g. a keyword token) rather than
     needing to do anything special with it. If the correct token is found, it
     is returned.
+
+    The check is made on the integer kind of the current token, so no Token
+    object is made unless the right token is found.
     """
-    if isinstance(Parser.get_token(), token):
-        t = Parser.get_token()
-        Parser.advance_token()
+    parser = Parser.context(parser)
+    if parser.get_kind() in token.kinds:
+        t = parser.get_token()
+        parser.advance_token()
         return t
     else:
-        raise ParserWrongTokenException(Parser.get_token(), token)
+        raise ParserWrongTokenException(parser.get_token(), token)
+
+def trace_caught(parser, exception, context, *args):
+    """Trace an exception passing up through a parse() method.
+
+    Arguments:
+    parser -- the parser context
+    exception -- the ParserException caught
+    context -- what was being parsed, formatted with any further arguments
+    """
+    if parser.trace.errors <= INFO:
+        parser.trace.event('errors', INFO, 'caught',
+            exception=str(exception),
+            context=context % args if args else context)
 
 
 class Expression:
 
     """Expression parsing class.
 
-    Expression.parse() will use the Fraser-Hanson algorithm to parse complex
-    series of binary expressions according to the precedence of the operators.
+    Expression.parse() will use precedence climbing (a Pratt parser) to parse
+    complex series of binary expressions according to the precedence and
+    associativity of the operators, as given in the BinaryOperatorToken class.
 
     This class should never be instantiated. It 
     """
 
+    __slots__ = ()
+
     @staticmethod
-    def parse(environment=Environment()):
+    def parse(environment=None, parser=None):
         """Parse an expression."""
-        return Expression._fraser_hanson(1, environment)
+        parser = Parser.context(parser)
+        environment = Environment.or_new(environment)
+        if parser.iterative:
+            # Imported here, as parser_iterative is built on this module
+            from parser_iterative import parse_expression
+            return parse_expression(environment, parser)
+        return Expression._climb(1, environment, parser)
 
     @staticmethod
-    def _fraser_hanson(k, environment):
-        """Use the Fraser-Hanson method to parse binary expression trees.
+    def _climb(minPrecedence, environment, parser):
+        """Use precedence climbing to parse binary expression trees.
 
-        This method will parse the tree of binary expressions, expecting to find
-        operator tokens between each expression. It will then create the tree
-        based on the precedence value set in the BinaryOperatorToken class.
+        Arguments:
+        minPrecedence -- the lowest precedence of operator this call may take
+        environment -- the environment the expression is parsed in
+        parser -- the ParserContext to take the tokens from
+
+        This method parses a primary expression, then takes operators of at
+        least minPrecedence for as long as there are any, parsing the right
+        operand of each in a recursive call that only takes operators binding
+        tighter than it (or, for a right associative operator, as tight).
+        The precedence of each operator is looked up once, in the table in
+        the BinaryOperatorToken class.
         """
-        i = 0
-        left = None
-        operator = None
-        right = None
-        left = PrimaryExpression.parse(environment)
-
-        i = Parser.get_token().get_precedence()
-        while i >= k:
-            while Parser.get_token().get_precedence() == i:
-                operator = Parser.get_token()
-                Parser.advance_token()
-                right = Expression._fraser_hanson(i + 1, environment)
-                left = BinaryExpression(left, operator, right)
-            i -= 1
+        precedences = BinaryOperatorToken.precedences
+        rightAssociative = BinaryOperatorToken.rightAssociative
+        operatorKind = BinaryOperatorToken.kind
+
+        left = PrimaryExpression.parse(environment, parser)
+        while parser.get_kind() == operatorKind:
+            operator = parser.get_token()
+            precedence = precedences.get(operator.original, 0)
+            if precedence < minPrecedence:
+                break
+            parser.advance_token()
+            if operator.original in rightAssociative:
+                right = Expression._climb(precedence, environment, parser)
+            else:
+                right = Expression._climb(precedence + 1, environment, parser)
+            left = BinaryExpression(left, operator, right)
         return left
 
     @abstractmethod
@@ -99,38 +137,44 @@ class PrimaryExpression(Expression):
     variable.
     """
 
+    __slots__ = ()
+
     @staticmethod
-    def parse(environment=Environment()):
+    def parse(environment=None, parser=None):
         """Parse a primary expression."""
+        parser = Parser.context(parser)
+        environment = Environment.or_new(environment)
         staticPrimaryExpression = None
-        if isinstance(Parser.get_token(), NumberToken):
-            staticPrimaryExpression = Number(Parser.get_token())
-            Parser.advance_token()
-        elif isinstance(Parser.get_token(), IdentToken):
-            if isinstance(Parser.get_relative_token(1), LeftSquareToken):
+        kind = parser.get_kind()
+        if kind in NumberToken.kinds:
+            staticPrimaryExpression = Number(parser.get_token())
+            parser.advance_token()
+        elif kind == IdentToken.kind:
+            nextKind = parser.get_relative_kind(1)
+            if nextKind == LeftSquareToken.kind:
                 staticPrimaryExpression = ArrayAccessExpression.parse(
-                    environment)
-            elif isinstance(Parser.get_relative_token(1), LeftParenToken):
+                    environment, parser)
+            elif nextKind == LeftParenToken.kind:
                 staticPrimaryExpression = FunctionCallExpression.parse(
-                    environment)
-            elif isinstance(Parser.get_relative_token(1), AssignToken):
+                    environment, parser)
+            elif nextKind == AssignToken.kind:
                 staticPrimaryExpression = AssignmentExpression.parse(
-                    environment)
+                    environment, parser)
             else:
                 staticPrimaryExpression = VariableAccessExpression.parse(
-                    environment)
-        elif isinstance(Parser.get_token(), BoolToken):
-            staticPrimaryExpression = Bool(Parser.get_token())
-            Parser.advance_token()
-        elif isinstance(Parser.get_token(), CharToken):
-            staticPrimaryExpression = Char(Parser.get_token())
-            Parser.advance_token()
-        elif isinstance(Parser.get_token(), StringToken):
-            staticPrimaryExpression = String(Parser.get_token())
-            Parser.advance_token()
+                    environment, parser)
+        elif kind == BoolToken.kind:
+            staticPrimaryExpression = Bool(parser.get_token())
+            parser.advance_token()
+        elif kind == CharToken.kind:
+            staticPrimaryExpression = Char(parser.get_token())
+            parser.advance_token()
+        elif kind == StringToken.kind:
+            staticPrimaryExpression = String(parser.get_token())
+            parser.advance_token()
         else:
             raise ParserWrongTokenException(
-                Parser.get_token(),
+                parser.get_token(),
                 PrimaryExpression)
         return staticPrimaryExpression
 
@@ -148,14 +192,12 @@ class BinaryExpression(Expression):
 
     A binary expression is of the form: expression operator expression. This 
     class does not have its own parse() static method as parsing must be done in
-    the Expression class, which has the necessary Fraser-Hanson algorithm to
+    the Expression class, which has the precedence climbing algorithm to
     create the right parse tree based on the binary expression's operator
     precedence.
     """
 
-    left = None
-    operator = None
-    right = None
+    __slots__ = ('left', 'operator', 'right')
 
     def __init__(self, left, operator, right):
         """Construct a binary expression.
@@ -178,26 +220,34 @@ class VariableAccessExpression(PrimaryExpression):
 
     """A primary expression of a variable access"""
     
-    variableName = None
+    __slots__ = ('variableName', 'declaration')
     
     def __init__(self, variableName, declaration):
+        """Construct a variable access expression.
+
+        Arguments:
+        variableName -- the Name of the variable
+        declaration -- the declaration of the variable, or None until it is
+            set by name_resolver
+        """
         self.variableName = variableName
         self.declaration = declaration
     
     @staticmethod
-    def parse(environment=Environment()):
+    def parse(environment=None, parser=None):
+        parser = Parser.context(parser)
+        environment = Environment.or_new(environment)
         staticVariableName = None
         staticDeclaration = None
         
         try:
-            staticVariableName = Name.parse()
+            staticVariableName = Name.parse(parser=parser)
         except ParserException as e:
-            print("Caught %s while parsing variable access expression"
-                % str(e))
+            trace_caught(parser, e, "variable access expression")
             raise e
         
         # Look up environment to see if this function has been declared yet.
-        k = str(staticVariableName)
+        k = staticVariableName.symbol
         if not environment.contains(k):
             raise ParserVariableUseWithoutDeclareException(staticVariableName)
 
@@ -212,10 +262,9 @@ class ArrayAccessExpression(PrimaryExpression):
 
     """A primary expression of an array access."""
 
-    arrayName = None
-    levelExpression = []
+    __slots__ = ('arrayName', 'levelExpression', 'declaration')
 
-    def __init__(self, arrayName, levelExpression):
+    def __init__(self, arrayName, levelExpression, declaration=None):
         """Construct an array access expression.
 
         Arguments:
@@ -224,48 +273,53 @@ class ArrayAccessExpression(PrimaryExpression):
             of the array access. E.g. myArray[1] would have levelExpression
             of [Number] while otherArray[2][4*b] would have levelExpression
             of [Number, BinaryExpression]
+        declaration -- the declaration of the array variable, or None until
+            it is set by name_resolver
         """
         self.arrayName = arrayName
         self.levelExpression = levelExpression
+        self.declaration = declaration
 
     @staticmethod
-    def parse(environment=Environment()):
+    def parse(environment=None, parser=None):
         """Parse an array access expression."""
+        parser = Parser.context(parser)
+        environment = Environment.or_new(environment)
         staticArrayName = None
         staticLevelExpression = []
 
-        if isinstance(Parser.get_token(), IdentToken):
-            staticArrayName = Ident(Parser.get_token())
-            Parser.advance_token()
+        if parser.get_kind() == IdentToken.kind:
+            staticArrayName = Ident(parser.get_token())
+            parser.advance_token()
         else:
-            raise ParserWrongTokenException(Parser.get_token(), IdentToken)
+            raise ParserWrongTokenException(parser.get_token(), IdentToken)
 
-        if isinstance(Parser.get_token(), LeftSquareToken):
-            Parser.advance_token()
+        if parser.get_kind() == LeftSquareToken.kind:
+            parser.advance_token()
             try:
-                nextStaticLevelExpression = Expression.parse(environment)
+                nextStaticLevelExpression = Expression.parse(
+                    environment, parser)
                 staticLevelExpression.append(nextStaticLevelExpression)
             except ParserException as e:
-                print(("Caught %s while parsing ArrayAccessExpression level "
-                    "expression no: 1")
-                    % str(e))
+                trace_caught(parser, e,
+                    "ArrayAccessExpression level expression no: 1")
                 raise e
 
-            expect_token(RightSquareToken)
+            expect_token(RightSquareToken, parser)
 
-        while isinstance(Parser.get_token(), LeftSquareToken):
-            Parser.advance_token()
+        while parser.get_kind() == LeftSquareToken.kind:
+            parser.advance_token()
             try:
-                nextStaticLevelExpression = Expression.parse(environment)
+                nextStaticLevelExpression = Expression.parse(
+                    environment, parser)
                 staticLevelExpression.append(nextStaticLevelExpression)
             except ParserException as e:
-                print(("Caught %s while parsing ArrayAccessExpression level "
-                    "expression no: %d")
-                    % (str(e),
-                        1 + len(staticLevelExpression)))
+                trace_caught(parser, e,
+                    "ArrayAccessExpression level expression no: %d",
+                    1 + len(staticLevelExpression))
                 raise e
 
-            expect_token(RightSquareToken)
+            expect_token(RightSquareToken, parser)
 
         return ArrayAccessExpression(staticArrayName, staticLevelExpression)
 
@@ -284,53 +338,56 @@ class FunctionCallExpression(PrimaryExpression):
     A function call expression is used so the return value of that function can
     be used as an expression term.
     """
-    firstToken = None
-    lastToken = None
-    ident = None
-    callArguments = None
+    __slots__ = ('firstToken', 'lastToken', 'ident', 'callArguments',
+        'declaration')
 
     def __init__(
             self,
             firstToken,
             lastToken,
             ident,
-            callArguments):
+            callArguments,
+            declaration=None):
         """Construct a function call expression.
 
         Arguments:
         ident -- the name ident of the function
         callArguments -- the arguments of the function call
+        declaration -- the FunctionDeclaration of the function, or None until
+            it is set by name_resolver
         """
         self.firstToken = firstToken
         self.lastToken = lastToken
         self.ident = ident
         self.callArguments = callArguments
+        self.declaration = declaration
 
     @staticmethod
-    def parse(environment=Environment()):
+    def parse(environment=None, parser=None):
         """Parse a function call expression."""
+        parser = Parser.context(parser)
+        environment = Environment.or_new(environment)
         staticFirstToken = None
         staticLastToken = None
         staticIdent = None
         staticCallArguments = None
 
-        if isinstance(Parser.get_token(), IdentToken):
-            staticIdent = Ident(Parser.get_token())
+        if parser.get_kind() == IdentToken.kind:
+            staticIdent = Ident(parser.get_token())
             staticFirstToken = staticIdent
-            Parser.advance_token()
+            parser.advance_token()
         else:
-            raise ParserWrongTokenException(Parser.get_token(), IdentToken)
+            raise ParserWrongTokenException(parser.get_token(), IdentToken)
 
-        expect_token(LeftParenToken)
+        expect_token(LeftParenToken, parser)
 
         try:
-            staticCallArguments = CallArguments.parse(environment)
+            staticCallArguments = CallArguments.parse(environment, parser)
         except ParserException as e:
-            print("Caught %s while parsing FunctionCallExpression call arguments"
-                % str(e))
+            trace_caught(parser, e, "FunctionCallExpression call arguments")
             raise e
 
-        staticLastToken = expect_token(RightParenToken)
+        staticLastToken = expect_token(RightParenToken, parser)
 
         return FunctionCallExpression(
             staticFirstToken,
@@ -346,7 +403,7 @@ class Ident(PrimaryExpression):
 
     """Ident class."""
 
-    token = None
+    __slots__ = ('token',)
 
     def __init__(self, token):
         """Construct an ident.
@@ -356,6 +413,11 @@ class Ident(PrimaryExpression):
         """
         self.token = token
 
+    @property
+    def symbol(self):
+        """Return the interned symbol id of the ident."""
+        return self.token.symbol
+
     def __str__(self):
         """Return a noggin source code representation."""
         return str(self.token)
@@ -374,8 +436,6 @@ class Ident(PrimaryExpression):
 
 
 class LiteralExpression(PrimaryExpression):
-    token = None
-    nogginType = None
 
     """Literal expression class.
 
@@ -384,6 +444,8 @@ class LiteralExpression(PrimaryExpression):
     as it is not possible to instantiate a literal expression directly.
     """
 
+    __slots__ = ('token', 'nogginType')
+
     def __init__(self, token, nogginType):
         self.token = token
         self.nogginType = nogginType
@@ -399,7 +461,7 @@ class Bool(LiteralExpression):
 
     """Boolean literal class."""
 
-    token = None
+    __slots__ = ()
 
     def __init__(self, token):
         """Construct a boolean literal.
@@ -435,7 +497,7 @@ class Number(LiteralExpression):
 
     """Number literal class."""
 
-    token = None
+    __slots__ = ()
 
     def __init__(self, token):
         """Construct a number literal.
@@ -454,6 +516,10 @@ class Number(LiteralExpression):
 
         super(Number, self).__init__(token, nogginType)
 
+    def eval(self):
+        """Return the integer value worked out by the lexer."""
+        return self.token.value
+
     def __str__(self):
         """Return a noggin source code representation."""
         return str(self.token)
@@ -475,7 +541,7 @@ class Char(LiteralExpression):
 
     """Character literal class."""
 
-    token = None
+    __slots__ = ()
 
     def __init__(self, token):
         """Construct a char literal.
@@ -508,7 +574,7 @@ class String(LiteralExpression):
 
     """String literal class."""
 
-    token = None
+    __slots__ = ()
 
     def __init__(self, token):
         """Construct a string literal.
@@ -528,10 +594,34 @@ class String(LiteralExpression):
 
 class Statement:
 
-    """This abstract class is used to parse a statement."""
+    """This abstract class is used to parse a statement.
+
+    Each kind of statement is parsed by the Statement subclass registered for
+    the kind of token it starts with, see register(). There is one for every
+    token in StatementStartingTokens.
+    """
+
+    __slots__ = ()
+
+    # The Statement subclass parsing each statement, by the kind of its first
+    # token
+    parsers = {}
 
     @staticmethod
-    def parse(environment=Environment()):
+    def register(tokenClass, statementClass):
+        """Parse statements starting with a token class with a Statement class.
+
+        Arguments:
+        tokenClass -- the Token subclass the statement starts with
+        statementClass -- the Statement subclass, whose parse() method is
+            called at the token with the environment and parser context
+        """
+        if tokenClass not in StatementStartingTokens:
+            StatementStartingTokens.append(tokenClass)
+        Statement.parsers[tokenClass.kind] = statementClass
+
+    @staticmethod
+    def parse(environment=None, parser=None):
         """Returns tuple of the statement and environment after that statement.
 
         A statement, if parsed, could return a changed environment. As a result
@@ -543,113 +633,57 @@ class Statement:
         Environment is the environment representation, mapping names of
         variables and functions to their initial declaration.
         """
-        if isinstance(Parser.get_token(), IdentToken):
-            if isinstance(Parser.get_relative_token(1), LeftParenToken):
-                return ExpressionStatement.parse(environment)
-            elif isinstance(Parser.get_relative_token(1), AssignToken):
-                return ExpressionStatement.parse(environment)
-            else:
-                raise ParserWrongTokenException(Parser.get_token(),
-                    "2ndidentstatement")
-        elif isinstance(Parser.get_token(), IfToken):
-            try:
-                return IfElseStatement.parse(environment)
-            except ParserException as e:
-                print("Caught %s while parsing Statement, IfElseStatement"
-                    % str(e))
-                raise e
-        elif isinstance(Parser.get_token(), DoToken):
-            try:
-                return DoWhileStatement.parse(environment)
-            except ParserException as e:
-                print("Caught %s while parsing Statement, DoWhileStatement"
-                    % str(e))
-                raise e
-        elif isinstance(Parser.get_token(), WhileToken):
-            try:
-                return WhileStatement.parse(environment)
-            except ParserException as e:
-                print("Caught %s while parsing Statement, WhileStatement"
-                    % str(e))
-                raise e
-        elif isinstance(Parser.get_token(), ReturnToken):
-            try:
-                return ReturnStatement.parse(environment)
-            except ParserException as e:
-                print("Caught %s while parsing Statement, ReturnStatement"
-                    % str(e))
-                raise e
-        elif isinstance(Parser.get_token(), DeclareToken):
-            try:
-                return DeclareStatement.parse(environment)
-            except ParserException as e:
-                print("Caught %s while parsing Statement, ReturnStatement"
-                    % str(e))
-                raise e
-        elif isinstance(Parser.get_token(), SwitchToken):
-            try:
-                return SwitchStatement.parse(environment)
-            except ParserException as e:
-                print("Caught %s while parsing Statement, SwitchStatement"
-                    % str(e))
-                raise e
-        elif isinstance(Parser.get_token(), FallThroughToken):
-            try:
-                return FallThroughStatement.parse(environment)
-            except ParserException as e:
-                print("Caught %s while parsing Statement, FallThroughStatement"
-                    % str(e))
-                raise e
-        elif isinstance(Parser.get_token(), BreakToken):
-            try:
-                return BreakStatement.parse(environment)
-            except ParserException as e:
-                print("Caught %s while parsing Statement, BreakStatement"
-                    % str(e))
-                raise e
-        elif isinstance(Parser.get_token(), ASMToken):
-            try:
-                return ASMStatement.parse(environment)
-            except ParserException as e:
-                print("Caught %s while parsing Statement, ASMStatement"
-                    % str(e))
-                raise e
-        else:
-            raise ParserWrongTokenException(Parser.get_token(),
+        parser = Parser.context(parser)
+        environment = Environment.or_new(environment)
+        statementClass = Statement.parsers.get(parser.get_kind())
+        if statementClass is None:
+            raise ParserWrongTokenException(parser.get_token(),
                 "StatementStartingToken")
+        if parser.trace.parser <= DEBUG:
+            token = parser.get_token()
+            parser.trace.event('parser', DEBUG, 'statement',
+                token=type(token).__name__,
+                line=token.lineNo)
+        try:
+            return statementClass.parse(environment, parser)
+        except ParserException as e:
+            trace_caught(parser, e, "Statement, %s", statementClass.__name__)
+            raise e
 
     @staticmethod
-    def able_to_start():
-        return type(Parser.get_token()) in StatementStartingTokens
+    def able_to_start(parser=None):
+        parser = Parser.context(parser)
+        return parser.get_kind() in Statement.parsers
 
     @abstractmethod
     def source_ref(self): pass
 
 class ASMStatement(Statement):
-    firstToken = None
-    ASMLines = []
+    __slots__ = ('firstToken', 'lastToken', 'ASMLines')
 
     def __init__(self, firstToken, lastToken, ASMLines):
-        firstToken = firstToken
-        lastToken = lastToken
+        self.firstToken = firstToken
+        self.lastToken = lastToken
         self.ASMLines = ASMLines
 
     @staticmethod
-    def parse(environment=Environment()):
+    def parse(environment=None, parser=None):
+        parser = Parser.context(parser)
+        environment = Environment.or_new(environment)
         staticFirstToken = None
         staticLastToken = None
         staticASMLines = []
 
-        staticFirstToken = expect_token(ASMToken)
+        staticFirstToken = expect_token(ASMToken, parser)
 
-        expect_token(LeftBraceToken)
+        expect_token(LeftBraceToken, parser)
 
-        while isinstance(Parser.get_token(), StringToken):
-            nextString = String(Parser.get_token())
-            Parser.advance_token()
+        while parser.get_kind() == StringToken.kind:
+            nextString = String(parser.get_token())
+            parser.advance_token()
             staticASMLines.append(nextString)
 
-        staticLastToken = expect_token(RightBraceToken)
+        staticLastToken = expect_token(RightBraceToken, parser)
 
         newStatement = ASMStatement(
             staticFirstToken,
@@ -669,43 +703,45 @@ class ASMStatement(Statement):
         return s
 
 class AssignmentExpression(PrimaryExpression):
-    firstToken = None
-    lastToken = None
-    ident = None
-    expression = None
+    __slots__ = ('firstToken', 'lastToken', 'ident', 'expression',
+        'declaration')
 
     def __init__(
         self,
         firstToken,
         lastToken,
         ident,
-        expression):
+        expression,
+        declaration=None):
         self.firstToken = firstToken
         self.lastToken = lastToken
         self.ident = ident
         self.expression = expression
+        # The declaration of the variable assigned to, set by name_resolver
+        self.declaration = declaration
 
     @staticmethod
-    def parse(environment=Environment()):
+    def parse(environment=None, parser=None):
+        parser = Parser.context(parser)
+        environment = Environment.or_new(environment)
         staticFirstToken = None
         staticLastToken = None
         staticIdent = None
         staticExpression = None
 
-        if isinstance(Parser.get_token(), IdentToken):
-            staticIdent = Ident(Parser.get_token())
+        if parser.get_kind() == IdentToken.kind:
+            staticIdent = Ident(parser.get_token())
             staticFirstToken = staticIdent
-            Parser.advance_token()
+            parser.advance_token()
         else:
-            raise ParserWrongTokenException(Parser.get_token(), IdentToken)
+            raise ParserWrongTokenException(parser.get_token(), IdentToken)
 
-        expect_token(AssignToken)
+        expect_token(AssignToken, parser)
 
         try:
-            staticExpression = Expression.parse(environment)
+            staticExpression = Expression.parse(environment, parser)
         except ParserException as e:
-            print("Caught %s while parsing AssignmentExpression expression"
-                % str(e))
+            trace_caught(parser, e, "AssignmentExpression expression")
             raise e
 
         return AssignmentExpression(
@@ -720,30 +756,33 @@ class AssignmentExpression(PrimaryExpression):
 
 
 class CallArguments:
-    callExpressions = []
+    __slots__ = ('callExpressions',)
 
     def __init__(self, callExpressions):
         self.callExpressions = callExpressions
 
     @staticmethod
-    def parse(environment=Environment()):
+    def parse(environment=None, parser=None):
+        parser = Parser.context(parser)
+        environment = Environment.or_new(environment)
         staticCallExpressions = []
 
-        if isinstance(Parser.get_token(), RightParenToken):
+        if parser.get_kind() == RightParenToken.kind:
             pass
         else:
             try:
-                nextStaticCallExpression = Expression.parse(environment)
+                nextStaticCallExpression = Expression.parse(
+                    environment, parser)
             except ParserException as e:
-                print("Caught %s while parsing CallArguments expression no: %d"
-                    % (str(e),
-                        1 + len(staticCallExpressions)))
+                trace_caught(parser, e,
+                    "CallArguments expression no: %d",
+                    1 + len(staticCallExpressions))
                 raise e
             staticCallExpressions.append(nextStaticCallExpression)
 
-        while isinstance(Parser.get_token(), CommaToken):
-            Parser.advance_token()
-            staticCallExpressions.append(Expression.parse(environment))
+        while parser.get_kind() == CommaToken.kind:
+            parser.advance_token()
+            staticCallExpressions.append(Expression.parse(environment, parser))
 
         return CallArguments(staticCallExpressions)
 
@@ -760,11 +799,8 @@ class CallArguments:
 
 
 class DeclareStatement(Statement):
-    firstToken = None
-    lastToken = None
-    variableType = None
-    variableName = None
-    value = None
+    __slots__ = ('firstToken', 'lastToken', 'variableType', 'variableName',
+        'value')
     declarationType = 'variable'
 
     def __init__(
@@ -781,7 +817,7 @@ class DeclareStatement(Statement):
         self.value = value
 
     @staticmethod
-    def parse(environment=Environment()):
+    def parse(environment=None, parser=None):
         """Returns tuple of declaration statement and resulting environment.
 
         A statement, if parsed, could return a changed environment. As a result
@@ -794,38 +830,40 @@ class DeclareStatement(Statement):
         variables and functions to their initial declaration.
 
         A declaration statement will change the environment by adding a new
-        declaration, so the returned environment has this added. The changed
-        environment is copied before the new key-value pair is added.
+        declaration to its innermost scope, so the returned environment is
+        the same one with this added.
         """
+        parser = Parser.context(parser)
+        environment = Environment.or_new(environment)
         staticFirstToken = None
         staticLastToken = None
         staticVariableType = None
         staticVariableName = None
         staticValue = None
 
-        staticFirstToken = expect_token(DeclareToken)
+        staticFirstToken = expect_token(DeclareToken, parser)
 
         try:
-            staticVariableType = Type.parse(environment)
+            staticVariableType = Type.parse(environment, parser)
         except ParserException as e:
-            print("Caught %s while parsing DeclareStatement type" % str(e))
+            trace_caught(parser, e, "DeclareStatement type")
             raise e
         
         try:
-            staticVariableName = Name.parse(environment)
+            staticVariableName = Name.parse(environment, parser)
         except ParserException as e:
-            print("Caught %s while parsing DeclareStatement type" % str(e))
+            trace_caught(parser, e, "DeclareStatement type")
             raise e
 
-        if isinstance(Parser.get_token(), AssignToken):
-            Parser.advance_token()
+        if parser.get_kind() == AssignToken.kind:
+            parser.advance_token()
             try:
-                staticValue = PrimaryExpression.parse(environment)
+                staticValue = PrimaryExpression.parse(environment, parser)
             except ParserException as e:
-                print("Caught %s while parsing DeclareStatement value" % str(e))
+                trace_caught(parser, e, "DeclareStatement value")
                 raise e
 
-        staticLastToken = expect_token(SemiColonToken)
+        staticLastToken = expect_token(SemiColonToken, parser)
 
         newStatement = DeclareStatement(
             staticFirstToken,
@@ -836,10 +874,9 @@ class DeclareStatement(Statement):
 
         # The declare statement will change the environment.
 
-        newEnvironment = environment.copy()
-        newEnvironment.add(str(staticVariableName), newStatement)
+        environment.add(staticVariableName.symbol, newStatement)
 
-        return (newStatement, newEnvironment)
+        return (newStatement, environment)
 
     def __str__(self):
         """Return a noggin source code representation."""
@@ -865,9 +902,7 @@ class DeclareStatement(Statement):
                 self.lastToken.source_ref()))
             
 class Type:
-    ident = None
-    nogginType = None
-    arrayDimension = 0
+    __slots__ = ('ident', 'nogginType', 'arrayDimension')
 
     def __init__(self, ident, nogginType, arrayDimension):
         self.ident = ident
@@ -875,28 +910,30 @@ class Type:
         self.arrayDimension = arrayDimension
 
     @staticmethod
-    def parse(environment=Environment()):
+    def parse(environment=None, parser=None):
+        parser = Parser.context(parser)
+        environment = Environment.or_new(environment)
         staticIdent = None
         staticArrayDimension = 0
 
-        if isinstance(Parser.get_token(), IdentToken):
-            staticIdent = Ident(Parser.get_token())
-            Parser.advance_token()
+        if parser.get_kind() == IdentToken.kind:
+            staticIdent = Ident(parser.get_token())
+            parser.advance_token()
         else:
-            raise ParserWrongTokenException(Parser.get_token(), IdentToken)
+            raise ParserWrongTokenException(parser.get_token(), IdentToken)
 
         try:
             staticType = environment.types(str(staticIdent))
         except KeyError as e:
             raise ParserUnknownTypeException(staticIdent)
 
-        while isinstance(Parser.get_token(), LeftSquareToken):
-            Parser.advance_token()
-            if isinstance(Parser.get_token(), RightSquareToken):
-                Parser.advance_token()
+        while parser.get_kind() == LeftSquareToken.kind:
+            parser.advance_token()
+            if parser.get_kind() == RightSquareToken.kind:
+                parser.advance_token()
                 staticArrayDimension += 1
             else:
-                raise ParserWrongTokenException(Parser.get_token(),
+                raise ParserWrongTokenException(parser.get_token(),
                     RightSquareToken)
 
         return Type(staticIdent, staticType, staticArrayDimension)
@@ -924,22 +961,29 @@ class Type:
         return self.nogginType == other.nogginType
 
 class Name:
-    ident = None
+    __slots__ = ('ident',)
 
     def __init__(self, ident):
         self.ident = ident
 
     @staticmethod
-    def parse(environment=Environment()):
+    def parse(environment=None, parser=None):
+        parser = Parser.context(parser)
+        environment = Environment.or_new(environment)
         ident = None
 
-        if isinstance(Parser.get_token(), IdentToken):
-            ident = Ident(Parser.get_token())
-            Parser.advance_token()
+        if parser.get_kind() == IdentToken.kind:
+            ident = Ident(parser.get_token())
+            parser.advance_token()
         else:
-            raise ParserWrongTokenException(Parser.get_token(), IdentToken)
+            raise ParserWrongTokenException(parser.get_token(), IdentToken)
         
         return Name(ident)
+
+    @property
+    def symbol(self):
+        """Return the interned symbol id of the name."""
+        return self.ident.symbol
     
     def __str__(self):
         """Return a noggin source code representation"""
@@ -958,32 +1002,31 @@ class Name:
                 self.ident.source_ref()))
 
 class FunctionSignatureDeclare:
-    sigVariableType = None
-    sigVariableName = None
+    __slots__ = ('sigVariableType', 'sigVariableName')
 
     def __init__(self, sigVariableType, sigVariableName):
         self.sigVariableType = sigVariableType
         self.sigVariableName = sigVariableName
 
     @staticmethod
-    def parse(environment=Environment()):
+    def parse(environment=None, parser=None):
+        parser = Parser.context(parser)
+        environment = Environment.or_new(environment)
         staticSigVariableType = None
         staticSigVariableName = None
 
-        if isinstance(Parser.get_token(), IdentToken):
+        if parser.get_kind() == IdentToken.kind:
             try:
-                staticSigVariableType = Type.parse()
+                staticSigVariableType = Type.parse(parser=parser)
             except ParserException as e:
-                print(("Caught %s while parsing function signature "
-                    "declaration - type")
-                    % str(e))
+                trace_caught(parser, e,
+                    "function signature declaration - type")
                 raise e
             try:
-                staticSigVariableName = Name.parse()
+                staticSigVariableName = Name.parse(parser=parser)
             except ParserException as e:
-                print(("Caught %s while parsing function signature "
-                    "declaration - name")
-                    % str(e))
+                trace_caught(parser, e,
+                    "function signature declaration - name")
                 raise e
             return FunctionSignatureDeclare(
                 staticSigVariableType,
@@ -1008,16 +1051,18 @@ class FunctionSignatureDeclare:
                 self.sigVariableName.source_ref()))
 
 class FunctionSignatureArguments:
-    signatureArguments = []
+    __slots__ = ('signatureArguments',)
 
     def __init__(self, signatureArguments):
         self.signatureArguments = signatureArguments
 
     @staticmethod
-    def parse(environment=Environment()):
+    def parse(environment=None, parser=None):
+        parser = Parser.context(parser)
+        environment = Environment.or_new(environment)
         staticFunctionSignatureArguments = []
 
-        firstSignatureDeclare = FunctionSignatureDeclare.parse()
+        firstSignatureDeclare = FunctionSignatureDeclare.parse(parser=parser)
 
         if not firstSignatureDeclare:
             # If no signature declaration was parsed
@@ -1025,10 +1070,11 @@ class FunctionSignatureArguments:
 
         staticFunctionSignatureArguments.append(firstSignatureDeclare)
 
-        while isinstance(Parser.get_token(), CommaToken):
-            Parser.advance_token()
+        while parser.get_kind() == CommaToken.kind:
+            parser.advance_token()
 
-            nextSignatureDeclare = FunctionSignatureDeclare.parse()
+            nextSignatureDeclare = FunctionSignatureDeclare.parse(
+                parser=parser)
             staticFunctionSignatureArguments.append(nextSignatureDeclare)
 
         return FunctionSignatureArguments(staticFunctionSignatureArguments)
@@ -1059,13 +1105,13 @@ class FunctionSignatureArguments:
 
 
 class FallThroughStatement(Statement):
-    token = None
+    __slots__ = ('token',)
 
     def __init__(self, token):
         self.token = token
 
     @staticmethod
-    def parse(environment=Environment()):
+    def parse(environment=None, parser=None):
         """Returns tuple of fallthrough statement and resulting environment.
 
         A statement, if parsed, could return a changed environment. As a result
@@ -1080,11 +1126,13 @@ class FallThroughStatement(Statement):
         A fallthrough statement will not change the environment, so the original
         one is returned.
         """
+        parser = Parser.context(parser)
+        environment = Environment.or_new(environment)
         staticToken = None
 
-        staticToken = expect_token(FallThroughToken)
+        staticToken = expect_token(FallThroughToken, parser)
 
-        expect_token(SemiColonToken)
+        expect_token(SemiColonToken, parser)
 
         newStatement = FallThroughStatement(staticToken)
 
@@ -1110,13 +1158,13 @@ class FallThroughStatement(Statement):
 
 
 class BreakStatement(Statement):
-    token = None
+    __slots__ = ('token',)
 
     def __init__(self, token):
         self.token = token
 
     @staticmethod
-    def parse(environment=Environment()):
+    def parse(environment=None, parser=None):
         """Returns tuple of break statement and resulting environment.
 
         A statement, if parsed, could return a changed environment. As a result
@@ -1131,11 +1179,13 @@ class BreakStatement(Statement):
         A break statement will not change the environment, so the original
         one is returned.
         """
+        parser = Parser.context(parser)
+        environment = Environment.or_new(environment)
         staticToken = None
 
-        staticToken = expect_token(BreakToken)
+        staticToken = expect_token(BreakToken, parser)
 
-        expect_token(SemiColonToken)
+        expect_token(SemiColonToken, parser)
         
         newStatement = BreakStatement(staticToken)
 
@@ -1161,12 +1211,8 @@ class BreakStatement(Statement):
 
 
 class ForLoopStatement(Statement):
-    firstToken = None
-    lastToken = None
-    initialisation = None
-    condition = None
-    afterthought = None
-    statements = None
+    __slots__ = ('firstToken', 'lastToken', 'initialisation', 'condition',
+        'afterthought', 'statements')
 
     def __init__(
             self,
@@ -1184,7 +1230,7 @@ class ForLoopStatement(Statement):
         self.statements = statements
 
     @staticmethod
-    def parse(environment=Environment()):
+    def parse(environment=None, parser=None):
         """Returns tuple of for loop statement and resulting environment.
 
         A statement, if parsed, could return a changed environment. As a result
@@ -1199,6 +1245,8 @@ class ForLoopStatement(Statement):
         A for loop statement will not change the environment, so the original
         one is returned.
         """
+        parser = Parser.context(parser)
+        environment = Environment.or_new(environment)
         staticFirstToken = None
         staticLastToken = None
         staticInitialisation = None
@@ -1206,44 +1254,47 @@ class ForLoopStatement(Statement):
         staticAfterthought = None
         staticStatements = None
 
-        staticFirstToken = expect_token(ForToken)
+        staticFirstToken = expect_token(ForToken, parser)
+
+        expect_token(LeftParenToken, parser)
 
-        expect_token(LeftParenToken)
+        # The loop variable is only in scope within the loop
 
         try:
-            (staticInitialisation, forEnv) = ForInitialisation.parse(environment)
+            (staticInitialisation, forEnv) = ForInitialisation.parse(
+                environment.child(), parser)
         except ParserException as e:
-            print("Caught %s while parsing ForLoopStatement initialisation" % str(e))
+            trace_caught(parser, e, "ForLoopStatement initialisation")
             raise e
 
-        expect_token(SemiColonToken)
+        expect_token(SemiColonToken, parser)
 
         try:
-            staticCondition = Expression.parse(forEnv)
+            staticCondition = Expression.parse(forEnv, parser)
         except ParserException as e:
-            print("Caught %s while parsing ForLoopStatement condition" % str(e))
+            trace_caught(parser, e, "ForLoopStatement condition")
             raise e
 
-        expect_token(SemiColonToken)
+        expect_token(SemiColonToken, parser)
 
         try:
-            (staticAfterthought, newEnv) = ForAfterthought.parse(forEnv)
-            environment = newEnv
+            (staticAfterthought, forEnv) = ForAfterthought.parse(
+                forEnv, parser)
         except ParserException as e:
-            print("Caught %s while parsing ForLoopStatement afterthought" % str(e))
+            trace_caught(parser, e, "ForLoopStatement afterthought")
             raise e
 
-        expect_token(RightParenToken)
+        expect_token(RightParenToken, parser)
 
-        expect_token(LeftBraceToken)
+        expect_token(LeftBraceToken, parser)
 
         try:
-            staticStatements = Statements.parse(newEnv)
+            staticStatements = Statements.parse(forEnv, parser)
         except ParserException as e:
-            print("Caught %s while parsing ForLoopStatement statements" % str(e))
+            trace_caught(parser, e, "ForLoopStatement statements")
             raise e
 
-        expect_token(RightBraceToken)
+        staticLastToken = expect_token(RightBraceToken, parser)
 
         newStatement = ForLoopStatement(
             staticFirstToken,
@@ -1257,10 +1308,28 @@ class ForLoopStatement(Statement):
 
         return (newStatement, environment)
 
+    def __str__(self):
+        """Return a noggin source code representation."""
+        return ("for (%s %s; %s) {\n%s}"
+            % (self.initialisation, self.condition, self.afterthought,
+                self.statements))
+
+    def source_ref(self):
+        """Return a string referring to original source code.
+
+        This string will include the original line number and character start
+        and end numbers.
+        """
+        return ("For loop statement:\n"
+            "%s\n"
+            "between token: %s\n"
+            "and token: %s\n"
+            % (str(self),
+                self.firstToken.source_ref(),
+                self.lastToken.source_ref()))
+
 class ForInitialisation:
-    variableType = None
-    variableName = None
-    value = None
+    __slots__ = ('variableType', 'variableName', 'value')
 
     def __init__(
             self,
@@ -1272,7 +1341,7 @@ class ForInitialisation:
         self.value = value
 
     @staticmethod
-    def parse(environment=Environment()):
+    def parse(environment=None, parser=None):
         """Returns tuple of for loop initialisation and resulting environment.
 
         A statement, if parsed, could return a changed environment. As a result
@@ -1285,32 +1354,33 @@ class ForInitialisation:
         variables and functions to their initial declaration.
 
         A for loop initialisation statement will change the environment by
-        adding a new declaration, so the returned environment has this added.
-        The changed environment is copied before the new key-value pair is
-        added.
+        adding a new declaration to its innermost scope, so the returned
+        environment is the same one with this added.
         """
+        parser = Parser.context(parser)
+        environment = Environment.or_new(environment)
         staticVariableType = None
         staticVariableName = None
         staticValue = None
 
         try:
-            staticVariableType = Type.parse(environment)
+            staticVariableType = Type.parse(environment, parser)
         except ParserException as e:
-            print("Caught %s while parsing DeclareStatement type" % str(e))
+            trace_caught(parser, e, "DeclareStatement type")
             raise e
         
         try:
-            staticVariableName = Name.parse(environment)
+            staticVariableName = Name.parse(environment, parser)
         except ParserException as e:
-            print("Caught %s while parsing DeclareStatement type" % str(e))
+            trace_caught(parser, e, "DeclareStatement type")
             raise e
 
-        if isinstance(Parser.get_token(), AssignToken):
-            Parser.advance_token()
+        if parser.get_kind() == AssignToken.kind:
+            parser.advance_token()
             try:
-                staticValue = PrimaryExpression.parse(environment)
+                staticValue = PrimaryExpression.parse(environment, parser)
             except ParserException as e:
-                print("Caught %s while parsing DeclareStatement value" % str(e))
+                trace_caught(parser, e, "DeclareStatement value")
                 raise e
 
         newStatement = ForInitialisation(
@@ -1320,11 +1390,9 @@ class ForInitialisation:
 
         # The declare statement will change the environment.
 
-        newEnvironment = environment.copy()
+        environment.add(staticVariableName.symbol, newStatement)
 
-        newEnvironment.add(str(staticVariableName), newStatement)
-
-        return (newStatement, newEnvironment)
+        return (newStatement, environment)
 
     def __str__(self):
         """Return a noggin source code representation."""
@@ -1336,11 +1404,47 @@ class ForInitialisation:
                 % (self.variableType, self.variableName))
 
 
+class ForAfterthought:
+    __slots__ = ('expression',)
+
+    def __init__(self, expression):
+        self.expression = expression
+
+    @staticmethod
+    def parse(environment=None, parser=None):
+        """Returns tuple of for loop afterthought and resulting environment.
+
+        A statement, if parsed, could return a changed environment. As a result
+        this method will return a tuple of the type:
+
+        (ForAfterthought, Environment)
+
+        where Environment is the environment representation, mapping names of
+        variables and functions to their initial declaration.
+
+        A for loop afterthought is an expression, run after each time round
+        the loop, so will not change the environment and the original one is
+        returned.
+        """
+        parser = Parser.context(parser)
+        environment = Environment.or_new(environment)
+        staticExpression = None
+
+        try:
+            staticExpression = Expression.parse(environment, parser)
+        except ParserException as e:
+            trace_caught(parser, e, "ForAfterthought expression")
+            raise e
+
+        return (ForAfterthought(staticExpression), environment)
+
+    def __str__(self):
+        """Return a noggin source code representation."""
+        return str(self.expression)
+
+
 class DoWhileStatement(Statement):
-    firstToken = None
-    lastToken = None
-    doStatements = None
-    whileExpression = None
+    __slots__ = ('firstToken', 'lastToken', 'doStatements', 'whileExpression')
 
     def __init__(
             self,
@@ -1354,7 +1458,7 @@ class DoWhileStatement(Statement):
         self.whileExpression = whileExpression
 
     @staticmethod
-    def parse(environment=Environment()):
+    def parse(environment=None, parser=None):
         """Returns tuple of do-while statement and resulting environment.
 
         A statement, if parsed, could return a changed environment. As a result
@@ -1369,36 +1473,36 @@ class DoWhileStatement(Statement):
         A do-while statement will not change the environment, so the original
         one is returned.
         """
+        parser = Parser.context(parser)
+        environment = Environment.or_new(environment)
         staticFirstToken = None
         staticLastToken = None
         staticDoStatements = None
         staticWhileExpression = None
 
-        staticFirstToken = expect_token(DoToken)
+        staticFirstToken = expect_token(DoToken, parser)
 
-        expect_token(LeftBraceToken)
+        expect_token(LeftBraceToken, parser)
 
         try:
-            staticDoStatements = Statements.parse(environment)
+            staticDoStatements = Statements.parse(environment, parser)
         except ParserException as e:
-            print("Caught %s while parsing DoWhileStatment do statements"
-                % str(e))
+            trace_caught(parser, e, "DoWhileStatment do statements")
             raise e
 
-        expect_token(RightBraceToken)
+        expect_token(RightBraceToken, parser)
 
-        expect_token(WhileToken)
+        expect_token(WhileToken, parser)
 
-        expect_token(LeftParenToken)
+        expect_token(LeftParenToken, parser)
 
         try:
-            staticWhileExpression = Expression.parse(environment)
+            staticWhileExpression = Expression.parse(environment, parser)
         except ParserException as e:
-            print("Caught %s while parsing DoWhileStatement while expression"
-                % str(e))
+            trace_caught(parser, e, "DoWhileStatement while expression")
             raise e
 
-        staticLastToken = expect_token(RightParenToken)
+        staticLastToken = expect_token(RightParenToken, parser)
 
         newStatement = DoWhileStatement(
             staticFirstToken,
@@ -1430,15 +1534,11 @@ class DoWhileStatement(Statement):
                 self.lastToken.source_ref()))
 
 class FunctionDeclaration:
-    firstToken = None
-    lastToken = None
-    functionType = None
-    functionName = None
-    signatureArguments = None
+    __slots__ = ('firstToken', 'lastToken', 'functionName', 'functionType',
+        'signatureArguments')
     declarationType = 'function'
 
     # Link to the definition of this function
-    definition = None
 
     def __init__(
             self,
@@ -1454,41 +1554,43 @@ class FunctionDeclaration:
         self.signatureArguments = signatureArguments
 
     @staticmethod
-    def parse(environment=Environment()):
+    def parse(environment=None, parser=None):
+        parser = Parser.context(parser)
+        environment = Environment.or_new(environment)
         staticFirstToken = None
         staticLastToken = None
         staticFunctionType = None
         staticFunctionName = None
         staticFunctionSignatureArguments = None
 
-        staticFirstToken = expect_token(DeclareToken)
+        staticFirstToken = expect_token(DeclareToken, parser)
 
-        expect_token(FunctionToken)
+        expect_token(FunctionToken, parser)
 
         try:
-            staticFunctionType = Type.parse(environment)
+            staticFunctionType = Type.parse(environment, parser)
         except ParserException as e:
-            print("Caught %s while parsing Function declaration type" % str(e))
+            trace_caught(parser, e, "Function declaration type")
             raise e
         
         try:
-            staticFunctionName = Name.parse(environment)
+            staticFunctionName = Name.parse(environment, parser)
         except ParserException as e:
-            print("Caught %s while parsing function declaration name" % str(e))
+            trace_caught(parser, e, "function declaration name")
             raise e
 
-        expect_token(LeftParenToken)
+        expect_token(LeftParenToken, parser)
 
         try:
             staticFunctionSignatureArguments\
-                = FunctionSignatureArguments.parse(environment)
+                = FunctionSignatureArguments.parse(environment, parser)
         except ParserException as e:
-            print("Caught %s while parsing Function declare arguments" % str(e))
+            trace_caught(parser, e, "Function declare arguments")
             raise e
 
-        expect_token(RightParenToken)
+        expect_token(RightParenToken, parser)
 
-        staticLastToken = expect_token(SemiColonToken)
+        staticLastToken = expect_token(SemiColonToken, parser)
 
         return FunctionDeclaration(
             staticFirstToken,
@@ -1516,16 +1618,92 @@ class FunctionDeclaration:
                 self.firstToken.source_ref(),
                 self.lastToken.source_ref()))
 
+class FunctionBody:
+
+    """The unparsed statements of a function, kept until they are needed.
+
+    Made by FunctionDefinition.parse() when the parser context has lazyBodies
+    set, once the tokens of the body have been skipped over.
+    """
+    __slots__ = ('tokens', 'start', 'environment', 'trace', 'iterative')
+
+    def __init__(self, tokens, start, environment, parser):
+        """Construct an unparsed function body.
+
+        Arguments:
+        tokens -- the token list or TokenBuffer the body is in
+        start -- the index of the first token after the opening brace
+        environment -- the environment of the function arguments
+        parser -- the parser context the body was skipped in, whose settings
+            the body is parsed with
+        """
+        self.tokens = tokens
+        self.start = start
+        self.environment = environment
+        self.trace = parser.trace
+        self.iterative = parser.iterative
+
+    @staticmethod
+    def skip(environment, parser):
+        """Skip over a function body, up to and including its closing brace.
+
+        Arguments:
+        environment -- the environment of the function arguments
+        parser -- the parser context, just after the opening brace
+
+        Returns a tuple of the FunctionBody and the closing brace token. Only
+        the kinds of the tokens are looked at, so nothing inside the braces
+        is checked until the body is parsed.
+        """
+        if parser.tokenStream is not None:
+            # Streamed tokens are gone once read, so they are kept as they
+            # are skipped over
+            tokens = []
+            start = 0
+        else:
+            tokens = parser.tokenList
+            start = parser.tokenPosition
+        depth = 1
+        while True:
+            kind = parser.get_kind()
+            if kind == RightBraceToken.kind and depth == 1:
+                break
+            elif kind == 0:
+                # Out of tokens without finding the closing brace
+                raise ParserWrongTokenException(
+                    parser.get_token(), RightBraceToken)
+            elif kind == LeftBraceToken.kind:
+                depth += 1
+            elif kind == RightBraceToken.kind:
+                depth -= 1
+            if parser.tokenStream is not None:
+                tokens.append(parser.get_token())
+            parser.advance_token()
+        lastToken = expect_token(RightBraceToken, parser)
+        if parser.tokenStream is not None:
+            tokens.append(lastToken)
+        return (FunctionBody(tokens, start, environment, parser), lastToken)
+
+    def parse(self):
+        """Parse the statements of the body and return them."""
+        parser = ParserContext(self.tokens)
+        parser.tokenPosition = self.start
+        parser.trace = self.trace
+        parser.iterative = self.iterative
+        try:
+            statements = Statements.parse(self.environment, parser)
+        except ParserException as e:
+            trace_caught(parser, e, "Function statements")
+            raise e
+        expect_token(RightBraceToken, parser)
+        return statements
+
+
 class FunctionDefinition:
-    firstToken = None
-    lastToken = None
-    functionType = None
-    functionName = None
-    signatureArguments = None
-    statements = None
+    __slots__ = ('firstToken', 'lastToken', 'functionType', 'functionName',
+        'signatureArguments', '_statements', 'body', 'declaration')
 
     # Link to the declaration of this function
-    declaration = None
 
     def __init__(
             self,
@@ -1535,18 +1713,36 @@ class FunctionDefinition:
             functionName,
             signatureArguments,
             statements,
-            declaration):
+            declaration,
+            body=None):
         self.firstToken = firstToken
         self.lastToken = lastToken
         self.functionType = functionType
         self.functionName = functionName
         self.signatureArguments = signatureArguments
-        self.statements = statements
+        self._statements = statements
+        self.body = body
         self.declaration = declaration
 
+    @property
+    def statements(self):
+        """The Statements of the function, parsed now if they were skipped.
+
+        A syntax error in a skipped body is raised here, on first use.
+        """
+        if self.body is not None:
+            self._statements = self.body.parse()
+            self.body = None
+        return self._statements
+
+    @statements.setter
+    def statements(self, statements):
+        self._statements = statements
+        self.body = None
 
     @staticmethod
-    def parse(globalEnvironment):
+    def parse(globalEnvironment, parser=None):
+        parser = Parser.context(parser)
         staticFirstToken = None
         staticLastToken = None
         staticFunctionType = None
@@ -1554,15 +1750,16 @@ class FunctionDefinition:
         staticSignatureArguments = None
         staticStatements = None
         staticDeclaration = None
+        staticBody = None
 
-        staticFirstToken = expect_token(FunctionToken)
+        staticFirstToken = expect_token(FunctionToken, parser)
 
-        staticFunctionType = Type.parse(globalEnvironment)
+        staticFunctionType = Type.parse(globalEnvironment, parser)
         
-        staticFunctionName = Name.parse(globalEnvironment)
+        staticFunctionName = Name.parse(globalEnvironment, parser)
 
         # Look up environment to see if this function has been declared yet.
-        k = str(staticFunctionName)
+        k = staticFunctionName.symbol
         try:
             # Then this function type and name is already in the environment
             staticDeclaration = globalEnvironment.get(k)
@@ -1570,13 +1767,13 @@ class FunctionDefinition:
             raise ParserFunctionDefineWithoutDeclareException(
                 staticFunctionName)
 
-        expect_token(LeftParenToken)
+        expect_token(LeftParenToken, parser)
 
         try:
             staticSignatureArguments = \
-                FunctionSignatureArguments.parse(globalEnvironment)
+                FunctionSignatureArguments.parse(globalEnvironment, parser)
         except ParserException as e:
-            print("Caught %s while parsing Function declare arguments" % str(e))
+            trace_caught(parser, e, "Function declare arguments")
             raise e
 
 
@@ -1584,23 +1781,28 @@ class FunctionDefinition:
         # to include these arguments as well as the ones already in the global
         # one.
 
-        functionEnvironment = globalEnvironment.copy()
+        functionEnvironment = globalEnvironment.child()
         for sigDeclare in staticSignatureArguments.signatureArguments:
-            sigDeclareName = str(sigDeclare.sigVariableName)
-            functionEnvironment.add(sigDeclareName, sigDeclare)
+            sigDeclareSymbol = sigDeclare.sigVariableName.symbol
+            functionEnvironment.add(sigDeclareSymbol, sigDeclare)
 
 
-        expect_token(RightParenToken)
+        expect_token(RightParenToken, parser)
 
-        expect_token(LeftBraceToken)
+        expect_token(LeftBraceToken, parser)
 
-        try:
-            staticStatements = Statements.parse(functionEnvironment)
-        except ParserException as e:
-            print("Caught %s while parsing Function statements" % str(e))
-            raise e
+        if parser.lazyBodies:
+            (staticBody, staticLastToken) = FunctionBody.skip(
+                functionEnvironment, parser)
+        else:
+            try:
+                staticStatements = Statements.parse(
+                    functionEnvironment, parser)
+            except ParserException as e:
+                trace_caught(parser, e, "Function statements")
+                raise e
 
-        staticLastToken = expect_token(RightBraceToken)
+            staticLastToken = expect_token(RightBraceToken, parser)
 
         functionDefinition = FunctionDefinition(
             staticFirstToken,
@@ -1609,7 +1811,8 @@ class FunctionDefinition:
             staticFunctionName,
             staticSignatureArguments,
             staticStatements,
-            staticDeclaration)
+            staticDeclaration,
+            staticBody)
 
         # Check that it was actually a function that was originally declared
         try:
@@ -1633,8 +1836,12 @@ class FunctionDefinition:
                 staticDeclaration,
                 functionDefinition)
 
-        print(staticSignatureArguments)
-        print(staticDeclaration.signatureArguments)
+        if parser.trace.parser <= DEBUG:
+            parser.trace.event('parser', DEBUG, 'function definition',
+                name=str(staticFunctionName),
+                arguments=str(staticSignatureArguments),
+                declaredArguments=str(staticDeclaration.signatureArguments),
+                line=staticFirstToken.lineNo)
 
         return functionDefinition
 
@@ -1682,9 +1889,7 @@ class FunctionDefinition:
                 self.lastToken.source_ref_short()))
 
 class ExpressionStatement(Statement):
-    firstToken = None
-    lastToken = None
-    expression = None
+    __slots__ = ('firstToken', 'lastToken', 'expression')
 
     def __init__(self, firstToken, lastToken, expression):
         self.firstToken = firstToken
@@ -1692,7 +1897,7 @@ class ExpressionStatement(Statement):
         self.expression = expression
 
     @staticmethod
-    def parse(environment=Environment()):
+    def parse(environment=None, parser=None):
         """Returns a tuple of expression statement and resulting environment.
 
         A statement, if parsed, could return a changed environment. As a result
@@ -1707,17 +1912,25 @@ class ExpressionStatement(Statement):
         An expression statement will not change the environment, so the
         original one is returned.
         """
+        parser = Parser.context(parser)
+        environment = Environment.or_new(environment)
         staticFirstToken = None
         staticLastToken = None
         staticExpression = None
 
+        # Only a function call or an assignment can stand as a statement
+        nextKind = parser.get_relative_kind(1)
+        if nextKind != LeftParenToken.kind and nextKind != AssignToken.kind:
+            raise ParserWrongTokenException(parser.get_token(),
+                "2ndidentstatement")
+
         try:
-            staticExpression = Expression.parse(environment)
+            staticExpression = Expression.parse(environment, parser)
         except ParserException as e:
-            print("Caught %s while parsing ExpressionStatement" % str(e))
+            trace_caught(parser, e, "ExpressionStatement")
             raise e
 
-        staticLastToken = expect_token(SemiColonToken)
+        staticLastToken = expect_token(SemiColonToken, parser)
 
         newStatement = ExpressionStatement(
             staticFirstToken,
@@ -1733,15 +1946,14 @@ class ExpressionStatement(Statement):
         return str(self.expression) + ";"
 
 class IfElseStatement(Statement):
-    ifThens = []
-    elseStatements = None
+    __slots__ = ('ifThens', 'elseStatements')
 
     def __init__(self, ifThens, elseStatements):
         self.ifThens = ifThens
         self.elseStatements = elseStatements
 
     @staticmethod
-    def parse(environment=Environment()):
+    def parse(environment=None, parser=None):
         """Returns tuple of if-else statement and resulting environment.
 
         A statement, if parsed, could return a changed environment. As a result
@@ -1756,54 +1968,52 @@ class IfElseStatement(Statement):
         An if-else statement will not change the environment, so the original
         one is returned.
         """
+        parser = Parser.context(parser)
+        environment = Environment.or_new(environment)
         staticIfThens = []
         staticElseStatements = None
 
-        expect_token(IfToken)
+        expect_token(IfToken, parser)
 
         try:
-            staticFirstIf = IfThen.parse(environment)
+            staticFirstIf = IfThen.parse(environment, parser)
         except ParserException as e:
-            print(("Caught %s while parsing IfElseStatement if "
-                "condition-statements")
-                % str(e))
+            trace_caught(parser, e, "IfElseStatement if condition-statements")
             raise e
         staticIfThens.append(staticFirstIf)
 
-        while isinstance(Parser.get_token(), ElifToken):
-            Parser.advance_token()
+        while parser.get_kind() == ElifToken.kind:
+            parser.advance_token()
             try:
-                staticNextIf = IfThen.parse(environment)
+                staticNextIf = IfThen.parse(environment, parser)
             except ParserException as e:
-                print(("Caught %s while parsing IfElseStatement elif "
-                    "condition-statement no %d")
-                    % (str(e),
-                    2 + len(staticIfThens)))
+                trace_caught(parser, e,
+                    "IfElseStatement elif condition-statement no %d",
+                    2 + len(staticIfThens))
                 raise e
             staticIfThens.append(staticNextIf)
 
-        if isinstance(Parser.get_token(), ElseToken):
-            Parser.advance_token()
-        elif Statement.able_to_start()\
-                or isinstance(Parser.get_token(), RightBraceToken):
+        if parser.get_kind() == ElseToken.kind:
+            parser.advance_token()
+        elif Statement.able_to_start(parser)\
+                or parser.get_kind() == RightBraceToken.kind:
             # If this is just an 'if' with no 'else'
             newStatement = IfElseStatement(staticIfThens, staticElseStatements)
             # No change to the environment
 
             return (newStatement, environment)
         else:
-            raise ParserWrongTokenException(Parser.get_token(), ElseToken)
+            raise ParserWrongTokenException(parser.get_token(), ElseToken)
 
-        expect_token(LeftBraceToken)
+        expect_token(LeftBraceToken, parser)
 
         try:
-            staticElseStatements = Statements.parse(environment)
+            staticElseStatements = Statements.parse(environment, parser)
         except ParserException as e:
-            print("Caught %s while parsing IfElseStatement then statements"
-                % str(e))
+            trace_caught(parser, e, "IfElseStatement then statements")
             raise e
 
-        expect_token(RightBraceToken)
+        expect_token(RightBraceToken, parser)
 
         newStatement = IfElseStatement(staticIfThens, staticElseStatements)
 
@@ -1827,37 +2037,38 @@ class IfElseStatement(Statement):
 
 
 class IfThen:
-    condition = None
-    then = None
+    __slots__ = ('condition', 'then')
 
     def __init__(self, condition, then):
         self.condition = condition
         self.then = then
 
     @staticmethod
-    def parse(environment=Environment()):
+    def parse(environment=None, parser=None):
+        parser = Parser.context(parser)
+        environment = Environment.or_new(environment)
         staticCondition = None
         staticThen = None
 
-        expect_token(LeftParenToken)
+        expect_token(LeftParenToken, parser)
 
         try:
-            staticCondition = Expression.parse(environment)
+            staticCondition = Expression.parse(environment, parser)
         except ParserException as e:
-            print("Caught %s while parsing IfThen condition" % str(e))
+            trace_caught(parser, e, "IfThen condition")
             raise e
 
-        expect_token(RightParenToken)
+        expect_token(RightParenToken, parser)
 
-        expect_token(LeftBraceToken)
+        expect_token(LeftBraceToken, parser)
 
         try:
-            staticThen = Statements.parse(environment)
+            staticThen = Statements.parse(environment, parser)
         except ParserException as e:
-            print("Caught %s while parsing IfThen statements" % str(e))
+            trace_caught(parser, e, "IfThen statements")
             raise e
 
-        expect_token(RightBraceToken)
+        expect_token(RightBraceToken, parser)
 
         return IfThen(staticCondition, staticThen)
 
@@ -1870,9 +2081,8 @@ class IfThen:
 
 
 class Program:
-    functionDeclarations = []
-    globalVariableDeclarations = []
-    functionDefinitions = []
+    __slots__ = ('functionDeclarations', 'globalVariableDeclarations',
+        'functionDefinitions')
 
     def __init__(
             self, functionDeclarations, globalVariableDeclarations,
@@ -1882,72 +2092,82 @@ class Program:
         self.functionDefinitions = functionDefinitions
 
     @staticmethod
-    def parse(environment=Environment()):
+    def parse(environment=None, parser=None):
+        parser = Parser.context(parser)
         staticFunctionDeclarations = []
         staticGlobalVariableDeclarations = []
         staticFunctionDefinitions = []
 
         # As each declaration is made, add to the 'environment' object
 
-        environment = Environment()
+        environment = Environment.or_new(environment)
 
         # Parse all function and global variable declarations
-        while isinstance(Parser.get_token(), DeclareToken):
-            if isinstance(Parser.get_relative_token(1), FunctionToken):
+        while parser.get_kind() == DeclareToken.kind:
+            if parser.get_relative_kind(1) == FunctionToken.kind:
                 try:
                     nextFunctionDeclaration = FunctionDeclaration.parse(
-                        environment)
+                        environment, parser)
                     staticFunctionDeclarations.append(nextFunctionDeclaration)
                     functionName = nextFunctionDeclaration.functionName
-                    k = str(functionName)
+                    k = functionName.symbol
                     environment.add(k, nextFunctionDeclaration)
                 except ParserException as e:
-                    print(("Caught %s while parsing Program function "
-                        "declaration no %d")
-                        % (str(e),
-                        1 + len(staticFunctionDeclarations)))
+                    trace_caught(parser, e,
+                        "Program function declaration no %d",
+                        1 + len(staticFunctionDeclarations))
                     raise e
             else:
                 try:
                     (nextGblVarDeclare, newEnv) = DeclareStatement.parse(
-                        environment)
+                        environment, parser)
                     staticGlobalVariableDeclarations.append(nextGblVarDeclare)
                     # the newEnv is the new environment after parsing the
                     # declare statement
                     environment = newEnv
                 except ParserException as e:
-                    print(("Caught %s while parsing Program global variable "
-                        "declaration no %d")
-                        % (str(e),
-                        1 + len(staticGlobalVariableDeclarations)))
+                    trace_caught(parser, e,
+                        "Program global variable declaration no %d",
+                        1 + len(staticGlobalVariableDeclarations))
                     raise e
 
-        if Parser.printVerbose:
-            print("Current environment after declarations: ")
-            print(environment)
+        if parser.trace.env <= DEBUG:
             for k, v in environment.items():
-                print("Key: ", k)
-                print("Value: ", v.source_ref())
-                print("-----")
-
-        # Parser all function definitions
-        while Parser.has_another_token():
-            if isinstance(Parser.get_token(), FunctionToken):
+                parser.trace.event('env', DEBUG, 'declaration',
+                    name=environment.name(k),
+                    declaration=v.source_ref())
+
+        if parser.workers and not parser.lazyBodies \
+                and parser.tokenStream is None:
+            # Imported here, as parser_parallel is built on this module
+            from parser_parallel import parse_function_definitions
+            staticFunctionDefinitions = parse_function_definitions(
+                environment, parser)
+
+        # Parser all function definitions, or the rest of them after an error
+        # in parallel parsing
+        while parser.has_another_token():
+            if parser.get_kind() == FunctionToken.kind:
                 try:
                     nextFunctionDefinition\
-                        = FunctionDefinition.parse(environment)
+                        = FunctionDefinition.parse(environment, parser)
                     staticFunctionDefinitions.append(nextFunctionDefinition)
                 except ParserException as e:
-                    print(("Caught %s while parsing Program function "
-                        "definition no %d")
-                        % (str(e),
-                        1 + len(staticFunctionDefinitions)))
+                    trace_caught(parser, e,
+                        "Program function definition no %d",
+                        1 + len(staticFunctionDefinitions))
                     raise e
             else:
                 raise ParserWrongTokenException(
-                    Parser.get_token(),
+                    parser.get_token(),
                     FunctionToken)
 
+        if parser.trace.parser <= INFO:
+            parser.trace.event('parser', INFO, 'program',
+                functionDeclarations=len(staticFunctionDeclarations),
+                globalVariables=len(staticGlobalVariableDeclarations),
+                functionDefinitions=len(staticFunctionDefinitions))
+
         return Program(
             staticFunctionDeclarations,
             staticGlobalVariableDeclarations,
@@ -1981,24 +2201,26 @@ class ReturnStatement(Statement):
     """Class for a return statement.
 
     """
-    expression = None
+    __slots__ = ('expression',)
 
     def __init__(self, expression):
         self.expression = expression
 
     @staticmethod
-    def parse(environment=Environment()):
+    def parse(environment=None, parser=None):
+        parser = Parser.context(parser)
+        environment = Environment.or_new(environment)
         staticExpression = None
 
-        expect_token(ReturnToken)
+        expect_token(ReturnToken, parser)
 
         try:
-            staticExpression = Expression.parse(environment)
+            staticExpression = Expression.parse(environment, parser)
         except ParserException as e:
-            print("Caught %s while parsing Return expression" % str(e))
+            trace_caught(parser, e, "Return expression")
             raise e
 
-        expect_token(SemiColonToken)
+        expect_token(SemiColonToken, parser)
 
         newStatement = ReturnStatement(staticExpression)
 
@@ -2012,25 +2234,40 @@ class ReturnStatement(Statement):
 
 
 class Statements:
-    statements = []
+    __slots__ = ('statements',)
 
     def __init__(self, statements):
         self.statements = statements
 
     @staticmethod
-    def parse(environment=Environment()):
+    def parse(environment=None, parser=None):
+        parser = Parser.context(parser)
+        environment = Environment.or_new(environment)
+        if parser.iterative:
+            # Imported here, as parser_iterative is built on this module
+            from parser_iterative import parse_statements
+            return parse_statements(environment, parser)
         staticStatements = []
-        while Statement.able_to_start():
+
+        # Names declared in a block are only in scope until the end of it, so a
+        # scope is opened for them at the first declaration. A block without any
+        # adds nothing to the chain of scopes names are looked up through.
+
+        blockEnvironment = None
+        while Statement.able_to_start(parser):
+            if blockEnvironment is None \
+                    and parser.get_kind() == DeclareToken.kind:
+                blockEnvironment = environment = environment.child()
             try:
                 # Each statement could change the environment for the next 
                 # statements, so each Statement.parse() call returns a tuple
                 # of the parsed statement and the environment after that 
                 # statement, regardless of whether the environment did change.
-                (nextStaticStatement, newEnv) = Statement.parse(environment)
+                (nextStaticStatement, newEnv) = Statement.parse(
+                    environment, parser)
             except ParserException as e:
-                print("Caught %s while parsing Statements statement no %d" % (
-                    str(e),
-                    1 + len(staticStatements)))
+                trace_caught(parser, e,
+                    "Statements statement no %d", 1 + len(staticStatements))
                 raise e
             staticStatements.append(nextStaticStatement)
             environment = newEnv
@@ -2046,9 +2283,7 @@ class Statements:
 
 
 class SwitchStatement(Statement):
-    switchExpression = None
-    cases = []
-    default = None
+    __slots__ = ('switchExpression', 'cases', 'default')
 
     def __init__(self, switchExpression, cases, default):
         self.switchExpression = switchExpression
@@ -2056,47 +2291,46 @@ class SwitchStatement(Statement):
         self.default = default
 
     @staticmethod
-    def parse(environment=Environment()):
+    def parse(environment=None, parser=None):
+        parser = Parser.context(parser)
+        environment = Environment.or_new(environment)
         staticSwitchExpression = None
         staticCases = []
         staticDefault = None
 
-        expect_token(SwitchToken)
+        expect_token(SwitchToken, parser)
 
-        expect_token(LeftParenToken)
+        expect_token(LeftParenToken, parser)
 
         try:
-            staticSwitchExpression = Expression.parse(environment)
+            staticSwitchExpression = Expression.parse(environment, parser)
         except ParserException as e:
-            print("Caught %s while parsing SwitchStatement switch expression"
-                % str(e))
+            trace_caught(parser, e, "SwitchStatement switch expression")
             raise e
 
-        expect_token(RightParenToken)
+        expect_token(RightParenToken, parser)
 
-        expect_token(LeftBraceToken)
+        expect_token(LeftBraceToken, parser)
 
-        while isinstance(Parser.get_token(), CaseToken):
+        while parser.get_kind() == CaseToken.kind:
             try:
-                nextStaticCase = CaseNotAStatement.parse(environment)
+                nextStaticCase = CaseNotAStatement.parse(environment, parser)
                 staticCases.append(nextStaticCase)
             except ParserException as e:
-                print(("Caught %s while parsing SwitchStatement case "
-                    "not-a-statement no %d")
-                    % (str(e),
-                    1 + len(staticCases)))
+                trace_caught(parser, e,
+                    "SwitchStatement case not-a-statement no %d",
+                    1 + len(staticCases))
                 raise e
 
-        if isinstance(Parser.get_token(), DefaultToken):
+        if parser.get_kind() == DefaultToken.kind:
             try:
-                staticDefault = DefaultNotAStatement.parse(environment)
+                staticDefault = DefaultNotAStatement.parse(environment, parser)
             except ParserException as e:
-                print(("Caught %s while parsing SwitchStatement default "
-                    "not-a-statement")
-                    % str(e))
+                trace_caught(parser, e,
+                    "SwitchStatement default not-a-statement")
                 raise e
 
-        expect_token(RightBraceToken)
+        expect_token(RightBraceToken, parser)
 
         newStatement = SwitchStatement(
             staticSwitchExpression,
@@ -2118,34 +2352,34 @@ class SwitchStatement(Statement):
 
 
 class CaseNotAStatement:
-    primaryExpression = None
-    statements = None
+    __slots__ = ('primaryExpression', 'statements')
 
     def __init__(self, primaryExpression, statements):
         self.primaryExpression = primaryExpression
         self.statements = statements
 
     @staticmethod
-    def parse(environment=Environment()):
+    def parse(environment=None, parser=None):
+        parser = Parser.context(parser)
+        environment = Environment.or_new(environment)
         staticPrimaryExpression = None
         staticStatements = None
 
-        expect_token(CaseToken)
+        expect_token(CaseToken, parser)
 
         try:
-            staticPrimaryExpression = PrimaryExpression.parse(environment)
+            staticPrimaryExpression = PrimaryExpression.parse(
+                environment, parser)
         except ParserException as e:
-            print("Caught %s while parsing CaseNotAStatement case expression"
-                % str(e))
+            trace_caught(parser, e, "CaseNotAStatement case expression")
             raise e
 
-        expect_token(ColonToken)
+        expect_token(ColonToken, parser)
 
         try:
-            staticStatements = Statements.parse(environment)
+            staticStatements = Statements.parse(environment, parser)
         except ParserException as e:
-            print("Caught %s while parsing CaseNotAStatement case statements"
-                % str(e))
+            trace_caught(parser, e, "CaseNotAStatement case statements")
             raise e
 
         return CaseNotAStatement(staticPrimaryExpression, staticStatements)
@@ -2156,24 +2390,25 @@ class CaseNotAStatement:
 
 
 class DefaultNotAStatement:
-    statements = None
+    __slots__ = ('statements',)
 
     def __init__(self, statements):
         self.statements = statements
 
     @staticmethod
-    def parse(environment=Environment()):
+    def parse(environment=None, parser=None):
+        parser = Parser.context(parser)
+        environment = Environment.or_new(environment)
         staticStatements = None
 
-        expect_token(DefaultToken)
+        expect_token(DefaultToken, parser)
 
-        expect_token(ColonToken)
+        expect_token(ColonToken, parser)
 
         try:
-            staticStatements = Statements.parse(environment)
+            staticStatements = Statements.parse(environment, parser)
         except ParserException as e:
-            print("Caught %s while parsing CaseNotAStatement case statements"
-                % str(e))
+            trace_caught(parser, e, "CaseNotAStatement case statements")
             raise e
 
         return DefaultNotAStatement(staticStatements)
@@ -2184,40 +2419,40 @@ class DefaultNotAStatement:
 
 
 class WhileStatement(Statement):
-    whileExpression = None
-    doStatements = None
+    __slots__ = ('whileExpression', 'doStatements')
 
     def __init__(self, whileExpression, doStatements):
         self.whileExpression = whileExpression
         self.doStatements = doStatements
 
     @staticmethod
-    def parse(environment=Environment()):
+    def parse(environment=None, parser=None):
+        parser = Parser.context(parser)
+        environment = Environment.or_new(environment)
         staticWhileExpression = None
         staticDoStatements = None
 
-        expect_token(WhileToken)
+        expect_token(WhileToken, parser)
 
-        expect_token(LeftParenToken)
+        expect_token(LeftParenToken, parser)
 
         try:
-            staticWhileExpression = Expression.parse(environment)
+            staticWhileExpression = Expression.parse(environment, parser)
         except ParserException as e:
-            print("Caught %s while parsing WhileStatement while expression"
-                % str(e))
+            trace_caught(parser, e, "WhileStatement while expression")
             raise e
 
-        expect_token(RightParenToken)
+        expect_token(RightParenToken, parser)
 
-        expect_token(LeftBraceToken)
+        expect_token(LeftBraceToken, parser)
 
         try:
-            staticDoStatements = Statements.parse(environment)
+            staticDoStatements = Statements.parse(environment, parser)
         except ParserException as e:
-            print("Caught %s while parsing WhileStatement statements" % str(e))
+            trace_caught(parser, e, "WhileStatement statements")
             raise e
 
-        expect_token(RightBraceToken)
+        expect_token(RightBraceToken, parser)
 
         newStatement = WhileStatement(staticWhileExpression, staticDoStatements)
 
@@ -2229,3 +2464,18 @@ class WhileStatement(Statement):
         """Return a noggin source code representation."""
         return "while (" + str(self.whileExpression) + ") do {\n"\
             + str(self.doStatements) + "}"
+
+
+# The statement parsed after each statement starting token
+
+Statement.register(ASMToken, ASMStatement)
+Statement.register(BreakToken, BreakStatement)
+Statement.register(DeclareToken, DeclareStatement)
+Statement.register(DoToken, DoWhileStatement)
+Statement.register(FallThroughToken, FallThroughStatement)
+Statement.register(ForToken, ForLoopStatement)
+Statement.register(IdentToken, ExpressionStatement)
+Statement.register(IfToken, IfElseStatement)
+Statement.register(ReturnToken, ReturnStatement)
+Statement.register(SwitchToken, SwitchStatement)
+Statement.register(WhileToken, WhileStatement)
@@ -0,0 +1,274 @@
+"""Incremental parser module.
+
+This module contains the IncrementalParser, which parses a source again after
+an edit while reusing as much of the Program it parsed last time as it can.
+
+The tokens are split into sections: the declaration section, holding every
+declare up to the first function definition, and one section for each
+function definition. Each section is keyed by a hash of its source text. A
+function definition whose text is unchanged is taken from the last Program,
+and only the changed ones are parsed again, against the global environment of
+the last parse. The declarations are only parsed again when the text of the
+declaration section changes, and then the whole Program is parsed again, as
+every function body was checked against the old declarations.
+
+A section that is reused may have moved in the source, so the tokens in it
+are moved along with it: their offsets and line numbers by the distance the
+section moved, and the columns of those on the first line of the section by
+the distance its first token moved along that line. Any other change to the
+layout of a section changes its text, and so its hash.
+"""
+
+import hashlib
+
+from lexer_tokens import Token, TokenBuffer, DeclareToken, FunctionToken,\
+    LeftBraceToken, RightBraceToken
+from parser_arena import nodeKinds, nodeFields
+from parser_code import Environment, ParserException, ParserWrongTokenException
+from parser_elements import FunctionDefinition, Program, trace_caught
+
+from noggin_trace import INFO
+
+
+def section_key(source, start, end):
+    """Return the hash of the source text between two offsets."""
+    return hashlib.blake2b(source.text(start, end).encode(),
+        digest_size=16).digest()
+
+
+def tokens_under(nodes, outside=()):
+    """Return every Token held by the given nodes or the nodes under them.
+
+    Arguments:
+    nodes -- the nodes to look under
+    outside -- nodes of another section linked to, whose tokens are left out
+
+    A token held in two places, as by the ident of a function call, is only
+    returned once.
+    """
+    tokens = []
+    seen = set(id(node) for node in outside)
+    stack = list(nodes)
+    while stack:
+        value = stack.pop()
+        if isinstance(value, Token):
+            if id(value) not in seen:
+                seen.add(id(value))
+                tokens.append(value)
+        elif isinstance(value, list):
+            stack.extend(value)
+        elif type(value) in nodeKinds:
+            if id(value) in seen:
+                continue
+            seen.add(id(value))
+            for name in nodeFields[nodeKinds[type(value)]]:
+                stack.append(getattr(value, name, None))
+    return tokens
+
+
+class Section(object):
+
+    """What was parsed from one section of the source, kept for reuse."""
+
+    __slots__ = ('nodes', 'tokens', 'offset', 'lineNo', 'charStart')
+
+    def __init__(self, nodes, firstToken, outside=()):
+        """Construct a section.
+
+        Arguments:
+        nodes -- the nodes parsed from the section
+        firstToken -- the first token of the section
+        outside -- nodes of other sections the nodes link to, such as the
+            declaration of a function definition
+        """
+        self.nodes = nodes
+        self.tokens = tokens_under(nodes, outside)
+        self.offset = firstToken.offsetStart
+        self.lineNo = firstToken.lineNo
+        self.charStart = firstToken.charStart
+
+    def move(self, source, offset, lineNo, charStart):
+        """Move the tokens of the section to where it now starts.
+
+        Arguments:
+        source -- the source the section is now in
+        offset -- the offset of the first token of the section
+        lineNo -- the line of the first token of the section
+        charStart -- the column of the first token of the section
+        """
+        offsetMove = offset - self.offset
+        lineMove = lineNo - self.lineNo
+        charMove = charStart - self.charStart
+        for token in self.tokens:
+            token.source = source
+            if token.offsetStart is not None:
+                token.offsetStart += offsetMove
+                token.offsetEnd += offsetMove
+            if token.lineNo == self.lineNo:
+                token.charStart += charMove
+                token.charEnd += charMove
+            token.lineNo += lineMove
+        self.offset = offset
+        self.lineNo = lineNo
+        self.charStart = charStart
+
+
+class IncrementalParser(object):
+
+    """Parser of one source, reusing the unchanged parts of its last parse."""
+
+    def __init__(self):
+        self.program = None
+        # The key of the declaration section, its Section and the global
+        # environment made from it
+        self.declarationsKey = None
+        self.declarations = None
+        self.environment = None
+        # Lists of the Sections of the function definitions, by key
+        self.definitions = {}
+        # How many function definitions the last parse reused and parsed
+        self.reused = 0
+        self.reparsed = 0
+
+    @staticmethod
+    def split(kinds):
+        """Return the index of the first token of each function definition.
+
+        Arguments:
+        kinds -- the kinds of the tokens
+
+        A function definition starts at each function token that is outside
+        of any braces and is not part of a function declaration.
+        """
+        starts = []
+        depth = 0
+        previous = 0
+        for i, kind in enumerate(kinds):
+            if kind == LeftBraceToken.kind:
+                depth += 1
+            elif kind == RightBraceToken.kind:
+                depth -= 1
+            elif kind == FunctionToken.kind and depth == 0 \
+                    and previous != DeclareToken.kind:
+                starts.append(i)
+            previous = kind
+        return starts
+
+    def parse(self, parser):
+        """Parse the tokens of a parser context, and return the Program.
+
+        Arguments:
+        parser -- the parser context, over a TokenBuffer or a list of tokens
+            lexed from a source, at its first token
+
+        A ParserException is raised as Program.parse() would raise it, and
+        leaves the last Program to be reused by the next parse.
+        """
+        tokens = parser.tokenList
+        if isinstance(tokens, TokenBuffer):
+            kinds = tokens.kinds
+            starts = tokens.starts
+            ends = tokens.ends
+            source = tokens.source
+        else:
+            kinds = [t.kind for t in tokens]
+            starts = [t.offsetStart for t in tokens]
+            ends = [t.offsetEnd for t in tokens]
+            source = tokens[0].source if tokens else None
+        sectionStarts = IncrementalParser.split(kinds)
+        sectionEnds = sectionStarts[1:] + [len(kinds)]
+        declarationsEnd = sectionStarts[0] if sectionStarts else len(kinds)
+
+        if declarationsEnd == 0:
+            declarationsKey = b''
+        else:
+            declarationsKey = section_key(source, starts[0],
+                ends[declarationsEnd - 1])
+        keys = [section_key(source, starts[start], ends[end - 1])
+            for start, end in zip(sectionStarts, sectionEnds)]
+
+        if declarationsKey != self.declarationsKey:
+            # Every function body depends on the declarations
+            environment = Environment()
+            program = Program.parse(environment, parser)
+            self.declarations = Section(
+                program.functionDeclarations
+                    + program.globalVariableDeclarations,
+                tokens[0]) if declarationsEnd > 0 else None
+            self.declarationsKey = declarationsKey
+            self.environment = environment
+            self.keep(program, keys, [None] * len(keys))
+            self.reused = 0
+            self.reparsed = len(program.functionDefinitions)
+            return program
+
+        if declarationsEnd > 0:
+            first = tokens[0]
+            self.declarations.move(source, first.offsetStart, first.lineNo,
+                first.charStart)
+
+        definitions = []
+        # The reused Section of each definition, or None if it was parsed
+        sections = []
+        # How many of the Sections with each key have been reused so far
+        used = {}
+        self.reused = 0
+        self.reparsed = 0
+        for number, (start, end, key) in enumerate(
+                zip(sectionStarts, sectionEnds, keys), 1):
+            reusable = self.definitions.get(key, ())
+            if used.get(key, 0) < len(reusable):
+                section = reusable[used.get(key, 0)]
+                used[key] = used.get(key, 0) + 1
+                first = tokens[start]
+                section.move(source, first.offsetStart, first.lineNo,
+                    first.charStart)
+                definitions.append(section.nodes[0])
+                sections.append(section)
+                self.reused += 1
+                continue
+            parser.tokenPosition = start
+            try:
+                definitions.append(
+                    FunctionDefinition.parse(self.environment, parser))
+            except ParserException as e:
+                trace_caught(parser, e,
+                    "Program function definition no %d", number)
+                raise e
+            if parser.tokenPosition != end:
+                raise ParserWrongTokenException(
+                    parser.get_token(),
+                    FunctionToken)
+            sections.append(None)
+            self.reparsed += 1
+        parser.tokenPosition = len(kinds)
+
+        program = Program(
+            self.program.functionDeclarations,
+            self.program.globalVariableDeclarations,
+            definitions)
+        if parser.trace.parser <= INFO:
+            parser.trace.event('parser', INFO, 'program',
+                functionDeclarations=len(program.functionDeclarations),
+                globalVariables=len(program.globalVariableDeclarations),
+                functionDefinitions=len(program.functionDefinitions))
+        self.keep(program, keys, sections)
+        return program
+
+    def keep(self, program, keys, sections):
+        """Keep the Program of a parse, for the next parse to reuse.
+
+        Arguments:
+        program -- the Program
+        keys -- the key of each function definition
+        sections -- the Section each function definition was reused from,
+            or None for those that were parsed
+        """
+        self.definitions = {}
+        for definition, key, section in zip(program.functionDefinitions,
+                keys, sections):
+            if section is None:
+                section = Section([definition], definition.firstToken,
+                    [definition.declaration])
+            self.definitions.setdefault(key, []).append(section)
+        self.program = program
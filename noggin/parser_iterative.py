@@ -0,0 +1,532 @@
+"""Iterative parser module.
+
+This module parses expressions and blocks of statements without recursion,
+for sources nested deeper than the Python call stack allows, such as those
+written by code generators. It is used in place of the recursive parse()
+methods when a ParserContext has iterative set.
+
+Each element that can hold another element of any depth is parsed by a
+generator function below, laid out like the parse() method it stands in for.
+Where that parse() method would call another one, the generator yields the
+generator of the element it needs instead, and is sent back the element once
+it is parsed. run() keeps the generators waiting on an element on an explicit
+stack, so only the stack grows with the depth of the source, not the Python
+call stack. A ParserException is thrown back into each generator on the
+stack in turn, so it is traced in the same contexts as by the parse()
+methods.
+
+Elements that cannot hold a nested expression or block, such as a number or
+a declaration, are parsed by their own parse() methods as usual.
+"""
+
+from lexer_tokens import *
+from parser_code import Parser, Environment, ParserException,\
+    ParserWrongTokenException
+from parser_elements import *
+from noggin_trace import DEBUG
+
+
+def run(steps):
+    """Drive a parsing generator and the ones it yields to completion.
+
+    Arguments:
+    steps -- a generator from one of the *_steps() functions below
+
+    Returns the element parsed by the generator, or raises the
+    ParserException that it did not catch.
+    """
+    stack = [steps]
+    value = None
+    exception = None
+    while stack:
+        top = stack[-1]
+        try:
+            if exception is None:
+                nested = top.send(value)
+            else:
+                nested = top.throw(exception)
+                exception = None
+        except StopIteration as stop:
+            stack.pop()
+            value = stop.value
+            continue
+        except ParserException as e:
+            stack.pop()
+            if not stack:
+                raise
+            exception = e
+            continue
+        stack.append(nested)
+        value = None
+    return value
+
+
+def parse_expression(environment=None, parser=None):
+    """Parse an expression, as Expression.parse() does, without recursion."""
+    parser = Parser.context(parser)
+    environment = Environment.or_new(environment)
+    return run(expression_steps(1, environment, parser))
+
+
+def parse_statements(environment=None, parser=None):
+    """Parse statements, as Statements.parse() does, without recursion."""
+    parser = Parser.context(parser)
+    environment = Environment.or_new(environment)
+    return run(statements_steps(environment, parser))
+
+
+# Expressions
+
+def expression_steps(minPrecedence, environment, parser):
+    """Steps of Expression._climb()."""
+    precedences = BinaryOperatorToken.precedences
+    rightAssociative = BinaryOperatorToken.rightAssociative
+    operatorKind = BinaryOperatorToken.kind
+
+    left = yield primary_expression_steps(environment, parser)
+    while parser.get_kind() == operatorKind:
+        operator = parser.get_token()
+        precedence = precedences.get(operator.original, 0)
+        if precedence < minPrecedence:
+            break
+        parser.advance_token()
+        if operator.original in rightAssociative:
+            right = yield expression_steps(precedence, environment, parser)
+        else:
+            right = yield expression_steps(precedence + 1, environment, parser)
+        left = BinaryExpression(left, operator, right)
+    return left
+
+
+def primary_expression_steps(environment, parser):
+    """Steps of PrimaryExpression.parse()."""
+    if parser.get_kind() == IdentToken.kind:
+        nextKind = parser.get_relative_kind(1)
+        if nextKind == LeftSquareToken.kind:
+            return (yield array_access_steps(environment, parser))
+        elif nextKind == LeftParenToken.kind:
+            return (yield function_call_steps(environment, parser))
+        elif nextKind == AssignToken.kind:
+            return (yield assignment_steps(environment, parser))
+    return PrimaryExpression.parse(environment, parser)
+
+
+def array_access_steps(environment, parser):
+    """Steps of ArrayAccessExpression.parse()."""
+    staticArrayName = None
+    staticLevelExpression = []
+
+    if parser.get_kind() == IdentToken.kind:
+        staticArrayName = Ident(parser.get_token())
+        parser.advance_token()
+    else:
+        raise ParserWrongTokenException(parser.get_token(), IdentToken)
+
+    while parser.get_kind() == LeftSquareToken.kind:
+        parser.advance_token()
+        try:
+            nextStaticLevelExpression = yield expression_steps(
+                1, environment, parser)
+            staticLevelExpression.append(nextStaticLevelExpression)
+        except ParserException as e:
+            trace_caught(parser, e,
+                "ArrayAccessExpression level expression no: %d",
+                1 + len(staticLevelExpression))
+            raise e
+
+        expect_token(RightSquareToken, parser)
+
+    return ArrayAccessExpression(staticArrayName, staticLevelExpression)
+
+
+def function_call_steps(environment, parser):
+    """Steps of FunctionCallExpression.parse() and CallArguments.parse()."""
+    staticIdent = None
+    staticCallExpressions = []
+
+    if parser.get_kind() == IdentToken.kind:
+        staticIdent = Ident(parser.get_token())
+        parser.advance_token()
+    else:
+        raise ParserWrongTokenException(parser.get_token(), IdentToken)
+
+    expect_token(LeftParenToken, parser)
+
+    try:
+        if parser.get_kind() != RightParenToken.kind:
+            try:
+                nextStaticCallExpression = yield expression_steps(
+                    1, environment, parser)
+            except ParserException as e:
+                trace_caught(parser, e,
+                    "CallArguments expression no: %d",
+                    1 + len(staticCallExpressions))
+                raise e
+            staticCallExpressions.append(nextStaticCallExpression)
+
+        while parser.get_kind() == CommaToken.kind:
+            parser.advance_token()
+            staticCallExpressions.append(
+                (yield expression_steps(1, environment, parser)))
+    except ParserException as e:
+        trace_caught(parser, e, "FunctionCallExpression call arguments")
+        raise e
+
+    staticLastToken = expect_token(RightParenToken, parser)
+
+    return FunctionCallExpression(
+        staticIdent,
+        staticLastToken,
+        staticIdent,
+        CallArguments(staticCallExpressions))
+
+
+def assignment_steps(environment, parser):
+    """Steps of AssignmentExpression.parse()."""
+    staticIdent = None
+    staticExpression = None
+
+    if parser.get_kind() == IdentToken.kind:
+        staticIdent = Ident(parser.get_token())
+        parser.advance_token()
+    else:
+        raise ParserWrongTokenException(parser.get_token(), IdentToken)
+
+    expect_token(AssignToken, parser)
+
+    try:
+        staticExpression = yield expression_steps(1, environment, parser)
+    except ParserException as e:
+        trace_caught(parser, e, "AssignmentExpression expression")
+        raise e
+
+    return AssignmentExpression(
+        staticIdent,
+        None,
+        staticIdent,
+        staticExpression)
+
+
+# Blocks
+
+def statements_steps(environment, parser):
+    """Steps of Statements.parse()."""
+    staticStatements = []
+
+    # Names declared in a block are only in scope until the end of it, so a
+    # scope is opened for them at the first declaration. A block without any
+    # adds nothing to the chain of scopes names are looked up through.
+
+    blockEnvironment = None
+    while Statement.able_to_start(parser):
+        if blockEnvironment is None and parser.get_kind() == DeclareToken.kind:
+            blockEnvironment = environment = environment.child()
+        try:
+            (nextStaticStatement, newEnv) = yield statement_steps(
+                environment, parser)
+        except ParserException as e:
+            trace_caught(parser, e,
+                "Statements statement no %d", 1 + len(staticStatements))
+            raise e
+        staticStatements.append(nextStaticStatement)
+        environment = newEnv
+    return Statements(staticStatements)
+
+
+def statement_steps(environment, parser):
+    """Steps of Statement.parse() for the statements that hold blocks."""
+    kind = parser.get_kind()
+    steps = blockSteps.get(kind)
+    if steps is None:
+        # A statement without a block cannot nest, so is parsed as usual
+        return Statement.parse(environment, parser)
+
+    if parser.trace.parser <= DEBUG:
+        token = parser.get_token()
+        parser.trace.event('parser', DEBUG, 'statement',
+            token=type(token).__name__,
+            line=token.lineNo)
+    try:
+        return (yield steps(environment, parser))
+    except ParserException as e:
+        trace_caught(parser, e, "Statement, %s",
+            Statement.parsers[kind].__name__)
+        raise e
+
+
+def if_else_steps(environment, parser):
+    """Steps of IfElseStatement.parse()."""
+    staticIfThens = []
+    staticElseStatements = None
+
+    expect_token(IfToken, parser)
+
+    try:
+        staticFirstIf = yield if_then_steps(environment, parser)
+    except ParserException as e:
+        trace_caught(parser, e, "IfElseStatement if condition-statements")
+        raise e
+    staticIfThens.append(staticFirstIf)
+
+    while parser.get_kind() == ElifToken.kind:
+        parser.advance_token()
+        try:
+            staticNextIf = yield if_then_steps(environment, parser)
+        except ParserException as e:
+            trace_caught(parser, e,
+                "IfElseStatement elif condition-statement no %d",
+                2 + len(staticIfThens))
+            raise e
+        staticIfThens.append(staticNextIf)
+
+    if parser.get_kind() == ElseToken.kind:
+        parser.advance_token()
+    elif Statement.able_to_start(parser)\
+            or parser.get_kind() == RightBraceToken.kind:
+        # If this is just an 'if' with no 'else'
+        return (IfElseStatement(staticIfThens, staticElseStatements),
+            environment)
+    else:
+        raise ParserWrongTokenException(parser.get_token(), ElseToken)
+
+    expect_token(LeftBraceToken, parser)
+
+    try:
+        staticElseStatements = yield statements_steps(environment, parser)
+    except ParserException as e:
+        trace_caught(parser, e, "IfElseStatement then statements")
+        raise e
+
+    expect_token(RightBraceToken, parser)
+
+    return (IfElseStatement(staticIfThens, staticElseStatements), environment)
+
+
+def if_then_steps(environment, parser):
+    """Steps of IfThen.parse()."""
+    expect_token(LeftParenToken, parser)
+
+    try:
+        staticCondition = Expression.parse(environment, parser)
+    except ParserException as e:
+        trace_caught(parser, e, "IfThen condition")
+        raise e
+
+    expect_token(RightParenToken, parser)
+
+    expect_token(LeftBraceToken, parser)
+
+    try:
+        staticThen = yield statements_steps(environment, parser)
+    except ParserException as e:
+        trace_caught(parser, e, "IfThen statements")
+        raise e
+
+    expect_token(RightBraceToken, parser)
+
+    return IfThen(staticCondition, staticThen)
+
+
+def while_steps(environment, parser):
+    """Steps of WhileStatement.parse()."""
+    expect_token(WhileToken, parser)
+
+    expect_token(LeftParenToken, parser)
+
+    try:
+        staticWhileExpression = Expression.parse(environment, parser)
+    except ParserException as e:
+        trace_caught(parser, e, "WhileStatement while expression")
+        raise e
+
+    expect_token(RightParenToken, parser)
+
+    expect_token(LeftBraceToken, parser)
+
+    try:
+        staticDoStatements = yield statements_steps(environment, parser)
+    except ParserException as e:
+        trace_caught(parser, e, "WhileStatement statements")
+        raise e
+
+    expect_token(RightBraceToken, parser)
+
+    return (WhileStatement(staticWhileExpression, staticDoStatements),
+        environment)
+
+
+def for_loop_steps(environment, parser):
+    """Steps of ForLoopStatement.parse()."""
+    staticFirstToken = expect_token(ForToken, parser)
+
+    expect_token(LeftParenToken, parser)
+
+    # The loop variable is only in scope within the loop
+
+    try:
+        (staticInitialisation, forEnv) = ForInitialisation.parse(
+            environment.child(), parser)
+    except ParserException as e:
+        trace_caught(parser, e, "ForLoopStatement initialisation")
+        raise e
+
+    expect_token(SemiColonToken, parser)
+
+    try:
+        staticCondition = Expression.parse(forEnv, parser)
+    except ParserException as e:
+        trace_caught(parser, e, "ForLoopStatement condition")
+        raise e
+
+    expect_token(SemiColonToken, parser)
+
+    try:
+        (staticAfterthought, forEnv) = ForAfterthought.parse(forEnv, parser)
+    except ParserException as e:
+        trace_caught(parser, e, "ForLoopStatement afterthought")
+        raise e
+
+    expect_token(RightParenToken, parser)
+
+    expect_token(LeftBraceToken, parser)
+
+    try:
+        staticStatements = yield statements_steps(forEnv, parser)
+    except ParserException as e:
+        trace_caught(parser, e, "ForLoopStatement statements")
+        raise e
+
+    staticLastToken = expect_token(RightBraceToken, parser)
+
+    return (ForLoopStatement(
+            staticFirstToken,
+            staticLastToken,
+            staticInitialisation,
+            staticCondition,
+            staticAfterthought,
+            staticStatements),
+        environment)
+
+
+def do_while_steps(environment, parser):
+    """Steps of DoWhileStatement.parse()."""
+    staticFirstToken = expect_token(DoToken, parser)
+
+    expect_token(LeftBraceToken, parser)
+
+    try:
+        staticDoStatements = yield statements_steps(environment, parser)
+    except ParserException as e:
+        trace_caught(parser, e, "DoWhileStatment do statements")
+        raise e
+
+    expect_token(RightBraceToken, parser)
+
+    expect_token(WhileToken, parser)
+
+    expect_token(LeftParenToken, parser)
+
+    try:
+        staticWhileExpression = Expression.parse(environment, parser)
+    except ParserException as e:
+        trace_caught(parser, e, "DoWhileStatement while expression")
+        raise e
+
+    staticLastToken = expect_token(RightParenToken, parser)
+
+    return (DoWhileStatement(
+            staticFirstToken,
+            staticLastToken,
+            staticDoStatements,
+            staticWhileExpression),
+        environment)
+
+
+def switch_steps(environment, parser):
+    """Steps of SwitchStatement.parse() and of its cases."""
+    staticCases = []
+    staticDefault = None
+
+    expect_token(SwitchToken, parser)
+
+    expect_token(LeftParenToken, parser)
+
+    try:
+        staticSwitchExpression = Expression.parse(environment, parser)
+    except ParserException as e:
+        trace_caught(parser, e, "SwitchStatement switch expression")
+        raise e
+
+    expect_token(RightParenToken, parser)
+
+    expect_token(LeftBraceToken, parser)
+
+    while parser.get_kind() == CaseToken.kind:
+        try:
+            staticCases.append((yield case_steps(environment, parser)))
+        except ParserException as e:
+            trace_caught(parser, e,
+                "SwitchStatement case not-a-statement no %d",
+                1 + len(staticCases))
+            raise e
+
+    if parser.get_kind() == DefaultToken.kind:
+        try:
+            staticDefault = yield default_steps(environment, parser)
+        except ParserException as e:
+            trace_caught(parser, e,
+                "SwitchStatement default not-a-statement")
+            raise e
+
+    expect_token(RightBraceToken, parser)
+
+    return (SwitchStatement(staticSwitchExpression, staticCases, staticDefault),
+        environment)
+
+
+def case_steps(environment, parser):
+    """Steps of CaseNotAStatement.parse()."""
+    expect_token(CaseToken, parser)
+
+    try:
+        staticPrimaryExpression = PrimaryExpression.parse(environment, parser)
+    except ParserException as e:
+        trace_caught(parser, e, "CaseNotAStatement case expression")
+        raise e
+
+    expect_token(ColonToken, parser)
+
+    try:
+        staticStatements = yield statements_steps(environment, parser)
+    except ParserException as e:
+        trace_caught(parser, e, "CaseNotAStatement case statements")
+        raise e
+
+    return CaseNotAStatement(staticPrimaryExpression, staticStatements)
+
+
+def default_steps(environment, parser):
+    """Steps of DefaultNotAStatement.parse()."""
+    expect_token(DefaultToken, parser)
+
+    expect_token(ColonToken, parser)
+
+    try:
+        staticStatements = yield statements_steps(environment, parser)
+    except ParserException as e:
+        trace_caught(parser, e, "CaseNotAStatement case statements")
+        raise e
+
+    return DefaultNotAStatement(staticStatements)
+
+
+# The steps of each statement that holds a block, by the kind of the token it
+# starts with
+
+blockSteps = {
+    DoToken.kind: do_while_steps,
+    ForToken.kind: for_loop_steps,
+    IfToken.kind: if_else_steps,
+    SwitchToken.kind: switch_steps,
+    WhileToken.kind: while_steps,
+}
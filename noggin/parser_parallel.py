@@ -0,0 +1,168 @@
+"""Parallel parser module.
+
+This module parses the function bodies of one program on several processes at
+once. Every declare comes before the first function definition, so once the
+global Environment is built nothing in one function body can change how
+another is parsed. The function definitions are first split apart by matching
+the braces of their bodies, as with ParserContext.lazyBodies, then each body
+is parsed in a worker process against a copy of the global environment, and
+the statements are put back into the definitions in source order.
+
+Only the kinds and texts of the tokens of a body are sent to a worker, and
+its statements are sent back as an AstArena, whose token indices are then
+looked up in the tokens of the main process. This is much less to pickle than
+the Token and node objects themselves.
+
+A parse error is raised just as a parse in one process would raise it. A body
+a worker fails to parse is parsed again in the main process, so its exception
+and trace events are the same, and the error of the first function in the
+source wins, whether it is found while splitting or in a worker.
+"""
+
+import pickle
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+from lexer_source import StringSource
+from lexer_tokens import FunctionToken, TokenBuffer
+from parser_arena import AstArena
+from parser_code import ParserContext, ParserException
+from parser_elements import FunctionBody, FunctionDefinition, trace_caught
+from noggin_trace import Tracer
+
+# Bodies of fewer functions than this are parsed in this process
+minimumFunctions = 2
+
+# The global environment of a worker process, set by set_global_environment()
+globalEnvironment = None
+
+
+def set_global_environment(pickledEnvironment):
+    """Keep the global environment in a worker process, as it starts.
+
+    The environment is always given pickled, even to a forked worker, so its
+    names are interned again in the symbol table the worker's tokens use.
+    """
+    global globalEnvironment
+    globalEnvironment = pickle.loads(pickledEnvironment)
+
+
+def parse_body(kinds, texts, start, signatureArguments, iterative):
+    """Parse one function body in a worker process.
+
+    Arguments:
+    kinds -- the kinds of the tokens of the body, from just after its opening
+        brace up to and including its closing brace
+    texts -- the original texts of the same tokens
+    start -- the index of the first of the tokens in the whole program
+    signatureArguments -- the FunctionSignatureArguments of the function
+    iterative -- whether to parse with an explicit stack, see parser_iterative
+
+    Returns the AstArena of the Statements of the body, with the token
+    indices of the whole program but without its tokens, or None if the body
+    could not be parsed.
+    """
+    # The tokens are laid out one after another, a space apart, in a source
+    # made just for them
+    tokens = TokenBuffer(StringSource(' '.join(texts)))
+    offset = 0
+    for kind, text in zip(kinds, texts):
+        tokens.append(kind, offset, offset + len(text), 0, 0)
+        offset += len(text) + 1
+
+    functionEnvironment = globalEnvironment.child()
+    for sigDeclare in signatureArguments.signatureArguments:
+        functionEnvironment.add(sigDeclare.sigVariableName.symbol, sigDeclare)
+    parser = ParserContext()
+    parser.iterative = iterative
+    # The body is parsed again in the main process if it fails, and traced
+    # there
+    parser.trace = Tracer()
+    try:
+        statements = FunctionBody(
+            tokens, 0, functionEnvironment, parser).parse()
+    except ParserException:
+        return None
+    arena = AstArena.from_program(statements, tokens)
+    arena.tokens = None
+    arena.firstTokens = array('i', [i + start if i != -1 else i
+        for i in arena.firstTokens])
+    arena.lastTokens = array('i', [i + start if i != -1 else i
+        for i in arena.lastTokens])
+    return arena
+
+
+def parse_function_definitions(environment, parser):
+    """Parse the function definitions of a program, bodies in parallel.
+
+    Arguments:
+    environment -- the global environment, complete with every declaration
+    parser -- the parser context, at the first function definition, over a
+        token list or TokenBuffer; parser.workers is the number of worker
+        processes
+
+    Returns the FunctionDefinitions, in source order. Splitting stops at the
+    first function whose signature or braces are wrong, and the parser is
+    left at the start of that function, for the caller to parse it again in
+    this process and raise its error.
+    """
+    tokens = parser.tokenList
+    definitions = []
+    ends = []
+    lazyBodies = parser.lazyBodies
+    parser.lazyBodies = True
+    try:
+        while parser.get_kind() == FunctionToken.kind:
+            start = parser.tokenPosition
+            try:
+                definition = FunctionDefinition.parse(environment, parser)
+            except ParserException:
+                parser.tokenPosition = start
+                break
+            definitions.append(definition)
+            ends.append(parser.tokenPosition)
+    finally:
+        parser.lazyBodies = lazyBodies
+
+    if len(definitions) < minimumFunctions:
+        # Not worth starting the workers, so the bodies are parsed here
+        results = [None] * len(definitions)
+        executor = None
+    else:
+        kinds = []
+        texts = []
+        starts = [d.body.start for d in definitions]
+        for definition, end in zip(definitions, ends):
+            start = definition.body.start
+            if isinstance(tokens, TokenBuffer):
+                kinds.append(tokens.kinds[start:end])
+                texts.append([tokens.text(i) for i in range(start, end)])
+            else:
+                kinds.append([t.kind for t in tokens[start:end]])
+                texts.append([t.original for t in tokens[start:end]])
+        executor = ProcessPoolExecutor(parser.workers,
+            initializer=set_global_environment,
+            initargs=(pickle.dumps(environment, pickle.HIGHEST_PROTOCOL),))
+        results = executor.map(parse_body, kinds, texts, starts,
+            [d.signatureArguments for d in definitions],
+            [parser.iterative] * len(definitions),
+            chunksize=max(1, len(definitions) // (4 * parser.workers)))
+
+    try:
+        for number, (definition, end, arena) in enumerate(
+                zip(definitions, ends, results), 1):
+            if arena is None:
+                # Parsed here, to raise the same exception as a serial parse
+                try:
+                    definition.statements
+                except ParserException as e:
+                    trace_caught(parser, e,
+                        "Program function definition no %d", number)
+                    raise e
+            else:
+                arena.tokens = tokens
+                definition.statements = arena.to_program()
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+    return definitions
@@ -0,0 +1,67 @@
+"""Symbol table module.
+
+This module contains the SymbolTable, an interning pool shared by the lexers
+and the parser. Identifier and literal text is stored once in the pool and
+handed out as an integer symbol id, so environments can be keyed on small
+integers and every repeated name shares the same string. The value of each
+number literal is also kept against its symbol.
+"""
+
+from threading import Lock
+
+
+class SymbolTable(object):
+
+    """Interning pool mapping text to integer symbol ids."""
+
+    def __init__(self):
+        self.ids = {}
+        self.names = []
+        # Integer value of each number literal symbol, see number_value()
+        self.values = {}
+        self.lock = Lock()
+
+    def intern(self, text):
+        """Return the symbol id of text, adding it to the pool if needed.
+
+        Text already in the pool is found without taking the lock, so only
+        new symbols are serialised between lexers running on other threads.
+        """
+        symbol = self.ids.get(text)
+        if symbol is None:
+            with self.lock:
+                symbol = self.ids.get(text)
+                if symbol is None:
+                    symbol = len(self.names)
+                    self.names.append(text)
+                    self.ids[text] = symbol
+        return symbol
+
+    def number_value(self, symbol, tokenClass):
+        """Return the integer value of a number literal symbol.
+
+        The value of each distinct literal is only worked out once.
+
+        Arguments:
+        symbol -- the symbol id of the literal text
+        tokenClass -- the NumberToken class the literal was lexed as
+        """
+        value = self.values.get(symbol)
+        if value is None:
+            value = tokenClass.value_of(self.names[symbol])
+            self.values[symbol] = value
+        return value
+
+    def name(self, symbol):
+        """Return the text of a symbol id."""
+        return self.names[symbol]
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, text):
+        return text in self.ids
+
+
+# The pool used when no other one is given
+symbols = SymbolTable()
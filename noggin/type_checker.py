@@ -0,0 +1,325 @@
+"""Type checker module.
+
+This module contains the TypeChecker, a pass over a whole parsed Program that
+works out the NogginType of every expression in it and checks that each is
+used where a value of its type is allowed. The types are kept, by node, for
+code generation to pick its instructions by: signed or unsigned comparison
+and division, and loads and stores of a byte or a word.
+
+The rules are:
+
+- char, int and uint are the integer types. An arithmetic, bitwise, shift or
+  comparison operator takes two integers, and works in the one of higher
+  rank, char below int below uint, as in C. That type is kept as the operand
+  type of the BinaryExpression. An arithmetic, bitwise or shift operator
+  gives a value of that type, and a comparison a bool.
+- A number literal beside a value of another integer type, or assigned or
+  passed to one, takes on that type, so that 2 * x is done in the type of x.
+- == and != also compare two values of the same type, and && and || take
+  and give bools. Every condition is a bool.
+- An integer can be assigned, passed or returned as any other integer type,
+  and any other value only as its own type.
+- Indexing an array lowers its dimension by one for each index, and each
+  index is an integer.
+
+The checker is a separate pass, run after parsing, so that a program can
+still be parsed without its types being right. It looks the type of each name
+up from the declaration the NameResolver gave the use of the name.
+"""
+
+from ast_walker import AstWalker
+from lexer_tokens import Token
+from name_resolver import NameResolver
+from noggin_types import intern_type, NT_bool, NT_char, NT_int, NT_uint,\
+    NT_void
+from parser_elements import *
+
+# The integer types, by rank
+integerRanks = {NT_char: 0, NT_int: 1, NT_uint: 2}
+
+comparisonOperators = frozenset(['<', '>', '<=', '>='])
+equalityOperators = frozenset(['==', '!='])
+logicalOperators = frozenset(['&&', '||'])
+
+
+def declared_type(variableType):
+    """Return the NogginType of a Type node, with its array dimension."""
+    return intern_type(variableType.nogginType.typeName,
+        variableType.arrayDimension)
+
+
+def first_token(node):
+    """Return the first token of an expression, or None if it has none."""
+    while not isinstance(node, Token):
+        if isinstance(node, BinaryExpression):
+            node = node.left
+        elif isinstance(node, (LiteralExpression, Ident)):
+            node = node.token
+        elif isinstance(node, VariableAccessExpression):
+            node = node.variableName.ident
+        elif isinstance(node, ArrayAccessExpression):
+            node = node.arrayName
+        elif isinstance(node, (FunctionCallExpression, AssignmentExpression)):
+            node = node.ident
+        else:
+            return None
+    return node
+
+
+def where(node):
+    """Return a string referring to the source code of an expression."""
+    token = first_token(node)
+    if token is None:
+        return str(node)
+    return "%s\nat token: %s" % (node, token.source_ref())
+
+
+class TypeCheckException(Exception):
+    pass
+
+class TypeMismatchException(TypeCheckException):
+    def __init__(self, expression, expected, found):
+        self.expression = expression
+        self.expected = expected
+        self.found = found
+
+    def __str__(self):
+        return ("TypeMismatchException: expected %s but got %s in expression\n"
+            "%s\n"
+            % (self.expected, self.found, where(self.expression)))
+
+class TypeArgumentCountException(TypeCheckException):
+    def __init__(self, call, declaration):
+        self.call = call
+        self.declaration = declaration
+
+    def __str__(self):
+        return ("TypeArgumentCountException: function %s takes %d "
+            "arguments but is called with %d in\n"
+            "%s\n"
+            % (self.declaration.functionName,
+                len(self.declaration.signatureArguments.signatureArguments),
+                len(self.call.callArguments.callExpressions),
+                where(self.call)))
+
+class TypeArrayDimensionException(TypeCheckException):
+    def __init__(self, access, arrayType):
+        self.access = access
+        self.arrayType = arrayType
+
+    def __str__(self):
+        return ("TypeArrayDimensionException: %d indices given to a value of "
+            "type %s in\n"
+            "%s\n"
+            % (len(self.access.levelExpression), self.arrayType,
+                where(self.access)))
+
+
+class TypeChecker(AstWalker):
+
+    """Type checker of a Program, keeping the type of every expression.
+
+    After check(), type_of() gives the type of any expression of the Program,
+    and operand_type() the type a BinaryExpression works in. Both are looked
+    up by the identity of the node, so the Program must not be changed after
+    it is checked.
+    """
+
+    def __init__(self):
+        super(TypeChecker, self).__init__()
+        # The type of each expression and the operand type of each
+        # BinaryExpression, by the id of the node
+        self.types = {}
+        self.operandTypes = {}
+        # The definition whose body is being checked
+        self.function = None
+
+    def check(self, program, resolver=None):
+        """Check the types of a whole Program.
+
+        Arguments:
+        program -- the Program
+        resolver -- the NameResolver the names of the Program have been
+            resolved by, or None to resolve them here first
+
+        A TypeCheckException is raised at the first expression used where
+        its type is not allowed.
+        """
+        if resolver is None:
+            NameResolver().resolve(program)
+        for declaration in program.globalVariableDeclarations:
+            self.declare(declaration)
+
+        for definition in program.functionDefinitions:
+            self.function = definition
+            self.walk_statements(definition.statements)
+        self.function = None
+
+    def type_of(self, expression):
+        """Return the type of an expression, working it out the first time.
+
+        The expressions under it are typed first, with an explicit stack
+        rather than by recursion, so deeply nested expressions are fine.
+        """
+        nogginType = self.types.get(id(expression))
+        if nogginType is None:
+            self.walk_expression(expression)
+            nogginType = self.types[id(expression)]
+        return nogginType
+
+    def walked(self, expression):
+        return id(expression) in self.types
+
+    def visit_expression(self, expression):
+        self.types[id(expression)] = \
+            self.expressionRules[type(expression)](expression)
+
+    def operand_type(self, expression):
+        """Return the type a checked BinaryExpression works in."""
+        return self.operandTypes[id(expression)]
+
+    def expect(self, expression, expected):
+        """Check an expression can be used as a value of the expected type.
+
+        An integer can be used as any other integer type, and a number
+        literal then takes on that type.
+        """
+        found = self.type_of(expression)
+        if found is expected:
+            return
+        if found in integerRanks and expected in integerRanks:
+            if isinstance(expression, Number):
+                self.types[id(expression)] = expected
+            return
+        raise TypeMismatchException(expression, expected, found)
+
+    def expect_integer(self, expression):
+        found = self.type_of(expression)
+        if found not in integerRanks:
+            raise TypeMismatchException(expression, "an integer type", found)
+        return found
+
+    def variable_type(self, expression):
+        """Return the declared type of the variable an expression uses."""
+        declaration = expression.declaration
+        if isinstance(declaration, FunctionSignatureDeclare):
+            return declared_type(declaration.sigVariableType)
+        return declared_type(declaration.variableType)
+
+    # The types of the expressions, each worked out once the expressions
+    # under it have theirs
+
+    def literal(self, expression):
+        return expression.nogginType
+
+    def variable_access(self, expression):
+        return self.variable_type(expression)
+
+    def array_access(self, expression):
+        arrayType = self.variable_type(expression)
+        levels = len(expression.levelExpression)
+        if levels > arrayType.arrayDimension:
+            raise TypeArrayDimensionException(expression, arrayType)
+        for index in expression.levelExpression:
+            self.expect_integer(index)
+        return intern_type(arrayType.typeName,
+            arrayType.arrayDimension - levels)
+
+    def function_call(self, expression):
+        declaration = expression.declaration
+        arguments = expression.callArguments.callExpressions
+        parameters = declaration.signatureArguments.signatureArguments
+        if len(arguments) != len(parameters):
+            raise TypeArgumentCountException(expression, declaration)
+        for argument, sigDeclare in zip(arguments, parameters):
+            self.expect(argument, declared_type(sigDeclare.sigVariableType))
+        return declared_type(declaration.functionType)
+
+    def assignment(self, expression):
+        variableType = self.variable_type(expression)
+        self.expect(expression.expression, variableType)
+        return variableType
+
+    def binary_expression(self, expression):
+        operator = expression.operator.original
+        if operator in logicalOperators:
+            self.expect(expression.left, NT_bool)
+            self.expect(expression.right, NT_bool)
+            self.operandTypes[id(expression)] = NT_bool
+            return NT_bool
+        leftType = self.types[id(expression.left)]
+        if operator in equalityOperators and leftType not in integerRanks:
+            self.expect(expression.right, leftType)
+            self.operandTypes[id(expression)] = leftType
+            return NT_bool
+
+        leftType = self.expect_integer(expression.left)
+        rightType = self.expect_integer(expression.right)
+        leftLiteral = isinstance(expression.left, Number)
+        rightLiteral = isinstance(expression.right, Number)
+        if leftLiteral and not rightLiteral:
+            leftType = self.types[id(expression.left)] = rightType
+        elif rightLiteral and not leftLiteral:
+            rightType = self.types[id(expression.right)] = leftType
+        if integerRanks[leftType] >= integerRanks[rightType]:
+            operandType = leftType
+        else:
+            operandType = rightType
+        self.operandTypes[id(expression)] = operandType
+        if operator in comparisonOperators or operator in equalityOperators:
+            return NT_bool
+        return operandType
+
+    # The checks of the statements
+
+    def declare(self, statement):
+        """Check a DeclareStatement or ForInitialisation."""
+        if statement.value is not None:
+            self.expect(statement.value, declared_type(statement.variableType))
+        return []
+
+    def expression_statement(self, statement):
+        self.type_of(statement.expression)
+        return []
+
+    def if_else_statement(self, statement):
+        checks = []
+        for ifThen in statement.ifThens:
+            self.expect(ifThen.condition, NT_bool)
+            checks.append((self.block, ifThen.then))
+        if statement.elseStatements is not None:
+            checks.append((self.block, statement.elseStatements))
+        return checks
+
+    def while_statement(self, statement):
+        self.expect(statement.whileExpression, NT_bool)
+        return [(self.block, statement.doStatements)]
+
+    def do_while_statement(self, statement):
+        self.expect(statement.whileExpression, NT_bool)
+        return [(self.block, statement.doStatements)]
+
+    def for_loop_header(self, statement):
+        self.declare(statement.initialisation)
+        self.expect(statement.condition, NT_bool)
+        self.type_of(statement.afterthought.expression)
+        return []
+
+    def switch_statement(self, statement):
+        switchType = self.type_of(statement.switchExpression)
+        checks = []
+        for case in statement.cases:
+            self.expect(case.primaryExpression, switchType)
+            checks.append((self.block, case.statements))
+        if statement.default is not None:
+            checks.append((self.block, statement.default.statements))
+        return checks
+
+    def return_statement(self, statement):
+        functionType = declared_type(self.function.functionType)
+        if functionType is NT_void:
+            raise TypeMismatchException(statement.expression, NT_void,
+                self.type_of(statement.expression))
+        self.expect(statement.expression, functionType)
+        return []
+
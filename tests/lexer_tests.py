@@ -1,10 +1,22 @@
 from nose.tools import *
+import io
+import json
+import os
 import sys
+import tempfile
 
 print("lexer_tests: current path is:")
 print(sys.path)
 
 from lexer_tokens import *
+from lexer_code import Lexer, LexerContext, LexerException
+from lexer_regex import RegexLexer, RegexLexerContext
+from noggin_trace import Tracer, WARNING
+from lexer_parallel import lex_parallel
+from lexer_incremental import relex
+
+sourceTestsDir = os.path.join(
+    os.path.dirname(__file__), "..", "noggin_source_tests")
 
 def setup():
     print("Setting up lexer tests")
@@ -71,3 +83,284 @@ def test_tokens():
 
     whileToken = WhileToken("while", 19, 10, 15)
     print(whileToken.get_info())
+
+def lex_all():
+    tokens = []
+    t = Lexer.lex()
+    while t is not None:
+        tokens.append(t)
+        t = Lexer.lex()
+    return tokens
+
+def test_buffered_source():
+    Lexer.set_source("declare int a = 10;\r\nfunction void f() {\n  a = a + 1;\n}\n")
+    tokens = lex_all()
+    assert_equal(
+        [str(t) for t in tokens],
+        ["declare", "int", "a", "=", "10", ";", "function", "void", "f", "(",
+            ")", "{", "a", "=", "a", "+", "1", ";", "}"])
+    assert_equal(type(tokens[6]), FunctionToken)
+    assert_equal((tokens[6].lineNo, tokens[6].charStart, tokens[6].charEnd),
+        (2, 1, 9))
+    assert_equal((tokens[12].lineNo, tokens[12].charStart), (3, 3))
+
+def test_mapped_crlf_source():
+    source = ("declare int a = 10;\r\nfunction void f() {\r\n  a = (a);\r\n"
+        "}\r\nbreak\r\n\"two\r\nlines\" \u00e9t\u00e9 = 1;\r\n")
+    Lexer.set_source(source)
+    bufferedTokens = lex_all()
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "crlf.ngs")
+        with open(path, "wb") as f:
+            f.write(source.encode("utf-8"))
+        mappedSource = Lexer.set_source_file(path)
+        mappedTokens = lex_all()
+        # No token takes in the carriage return after it
+        assert_equal(
+            [(type(t), t.original, t.lineNo, t.charStart, t.charEnd)
+                for t in mappedTokens],
+            [(type(t), t.original, t.lineNo, t.charStart, t.charEnd)
+                for t in bufferedTokens])
+        assert_equal(type(mappedTokens[-6]), BreakToken)
+        assert_equal(mappedTokens[-6].charEnd, 6)
+        mappedSource.close()
+
+        # A lone carriage return is a newline, as it is in text mode
+        source = "declare int a;\ra = a\r--1 < \r<\r\"x\ry\";\r"
+        with open(path, "wb") as f:
+            f.write(source.encode("utf-8"))
+        with open(path) as f:
+            Lexer.set_source(f.read())
+        textModeTokens = token_positions(Lexer)
+        Lexer.set_source(source)
+        assert_equal(token_positions(Lexer), textModeTokens)
+        mappedSource = Lexer.set_source_file(path)
+        assert_equal(token_positions(Lexer), textModeTokens)
+        mappedSource.close()
+        assert_equal([t[1] for t in textModeTokens][-4:],
+            ["<", "<", "\"x\ny\"", ";"])
+
+        with open(path, "wb") as f:
+            f.write(b"declare int \xff;\n")
+        mappedSource = Lexer.set_source_file(path)
+        assert_raises(LexerException, lex_all)
+        mappedSource.close()
+
+def test_mapped_source():
+    path = os.path.join(sourceTestsDir, "test7.ngs")
+    with open(path) as f:
+        Lexer.set_source(f.read())
+    bufferedTokens = lex_all()
+
+    mappedSource = Lexer.set_source_file(path)
+    mappedTokens = lex_all()
+    # Token text is only sliced out of the mapping when it is asked for
+    assert_equal(mappedTokens[0]._original, None)
+    assert_equal(
+        [(type(t), t.original, t.lineNo, t.charStart, t.charEnd)
+            for t in bufferedTokens],
+        [(type(t), t.original, t.lineNo, t.charStart, t.charEnd)
+            for t in mappedTokens])
+    mappedSource.close()
+
+def token_positions(lexer):
+    tokens = []
+    t = lexer.lex()
+    while t is not None:
+        tokens.append((type(t), t.original, t.lineNo, t.charStart, t.charEnd))
+        t = lexer.lex()
+    return tokens
+
+def test_regex_lexer_equivalence():
+    for name in sorted(os.listdir(sourceTestsDir)):
+        with open(os.path.join(sourceTestsDir, name)) as f:
+            source = f.read()
+        Lexer.set_source(source)
+        RegexLexer.set_source(source)
+        assert_equal(token_positions(Lexer), token_positions(RegexLexer))
+
+def test_engines_non_ascii_and_carriage_returns():
+    sources = [
+        "declare int x\u00a0= 1;",
+        "declare int caf\u00e9 = 1; caf\u00e9 = 2;\n\"\u00e9\u00e9\" x",
+        "ab\u00a0cd",
+        "\u00e9t\u00e9-x2 \"\u00e9\n\u00e9\" y",
+        "a\r--1 < \r<\r\"x\ry\" z",
+        "a\r\nb \"p\r\nq\" c\r\n"]
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "source.ngs")
+        for source in sources:
+            with open(path, "wb") as f:
+                f.write(source.encode("utf-8"))
+            Lexer.set_source(source)
+            expected = token_positions(Lexer)
+            RegexLexer.set_source(source)
+            assert_equal(token_positions(RegexLexer), expected)
+            # Memory-mapped, with characters of several bytes and carriage
+            # returns still in the source
+            for lexer in [Lexer, RegexLexer]:
+                mappedSource = lexer.set_source_file(path)
+                assert_equal(token_positions(lexer), expected)
+                mappedSource.close()
+
+def test_regex_lexer_edge_cases():
+    source = ("x-y = -12 - 3;\n0b101 0o17 0xFF 7b1 0 a<=b a!=b c&&d 'a' '\\n'\n"
+        "\"two\nlines\" a << 2;# comment\n$")
+    Lexer.set_source(source)
+    RegexLexer.set_source(source)
+    positions = token_positions(Lexer)
+    assert_equal(positions, token_positions(RegexLexer))
+    # A string over two lines ends on the second of them
+    assert_equal([p[2:] for p in positions if p[1] == "\"two\nlines\""],
+        [(3, 1, 7)])
+
+    # Views of a TokenBuffer have the same positions as the tokens
+    for lexer in [Lexer, RegexLexer]:
+        lexer.set_source(source)
+        assert_equal(
+            [(type(t), t.original, t.lineNo, t.charStart, t.charEnd)
+                for t in lexer.lex_buffer()],
+            positions)
+
+def test_symbol_interning():
+    path = os.path.join(sourceTestsDir, "test7.ngs")
+    Lexer.set_source("declare int count; count = count + 1;")
+    tokens = lex_all()
+    counts = [t for t in tokens if t.original == "count"]
+    assert_equal(len(counts), 3)
+    # Every use of a name shares one symbol id and one copy of its text
+    assert_equal(len(set(t.symbol for t in counts)), 1)
+    assert counts[0].original is counts[2].original
+    assert_equal(Lexer.symbols.name(counts[0].symbol), "count")
+    assert_equal(tokens[0]._symbol, None)
+
+    RegexLexer.set_source_file(path)
+    mappedBuffer = RegexLexer.lex_buffer()
+    with open(path) as f:
+        Lexer.set_source(f.read())
+    assert_equal(
+        [t.symbol if t.interned else -1 for t in lex_all()],
+        list(mappedBuffer.symbols))
+    mappedBuffer.source.close()
+
+def test_parallel_lexing():
+    sources = []
+    for name in sorted(os.listdir(sourceTestsDir)):
+        with open(os.path.join(sourceTestsDir, name)) as f:
+            sources.append(f.read())
+    source = "\n".join(sources) * 3
+    # Newlines inside literals and quotes inside comments must not be split,
+    # which a chunk size of 1 would otherwise do at every newline
+    edgeSource = ("declare string s = \"one\n# two\nthree\";\n"
+        "declare char c = '\n';\n# it's \"quoted\"\ndeclare char d = '#';\n"
+        "declare int e;\n")
+
+    for source, chunkSize in [(source, 200), (edgeSource, 1)]:
+        Lexer.set_source(source)
+        serialTokens = lex_all()
+        for engine in ['regex', 'hand']:
+            buffer = lex_parallel(source, 2, chunkSize, engine)
+            assert_equal(
+                [(type(t), t.original, t.lineNo, t.charStart, t.charEnd,
+                    t.symbol) for t in buffer],
+                [(type(t), t.original, t.lineNo, t.charStart, t.charEnd,
+                    t.symbol) for t in serialTokens])
+
+    # Lexing stops at the same unknown character as the serial lexer
+    source = "declare int a;\n" * 50 + "$ declare int b;\n" * 50
+    Lexer.set_source(source)
+    assert_equal(len(lex_parallel(source, 2, 64)), len(lex_all()))
+
+def test_incremental_relexing():
+    path = os.path.join(sourceTestsDir, "test13.ngs")
+    with open(path) as f:
+        source = f.read()
+    RegexLexer.set_source(source)
+    buffer = RegexLexer.lex_buffer()
+
+    edits = [
+        (0, 0, "declare int first;\n"),
+        (source.index("print"), 5, "printLine"),
+        (source.index("print") + 2, 0, "\n\n"),
+        (source.index("\"") + 1, 0, "a\nquoted\n"),
+        (source.index(";"), 1, " # now a comment\n;"),
+        (len(source), 0, "\ndeclare int last;"),
+        (10, 20, ""),
+        (source.index("{"), 0, "$"),
+    ]
+    for offset, removedLength, insertedText in edits:
+        # Each edit is made to the text as left by the edits before it
+        text = buffer.source.data
+        offset = min(offset, len(text))
+        removedLength = min(removedLength, len(text) - offset)
+        relex(buffer, offset, removedLength, insertedText)
+        text = text[:offset] + insertedText + text[offset + removedLength:]
+        assert_equal(buffer.source.data, text)
+
+        RegexLexer.set_source(text)
+        assert_equal(
+            [(type(t), t.original, t.lineNo, t.charStart, t.charEnd)
+                for t in buffer],
+            [(type(t), t.original, t.lineNo, t.charStart, t.charEnd)
+                for t in RegexLexer.tokens()])
+
+    # An edit that cannot be lexed leaves the buffer as it was
+    tokens = list(buffer.kinds)
+    assert_raises(LexerException, relex, buffer, 0, 0, "\"")
+    assert_equal(list(buffer.kinds), tokens)
+
+def test_number_values():
+    source = ("0b101 0o17 0x1F 0xff 42 -42 65535 65536 -32768 -32769 "
+        "4294967295 4294967296 -2147483648 -2147483649")
+    values = [5, 15, 31, 255, 42, -42, 65535, 65536, -32768, -32769,
+        4294967295, 4294967296, -2147483648, -2147483649]
+    for lexer in [Lexer, RegexLexer]:
+        lexer.set_source(source)
+        tokens = list(lexer.tokens())
+        assert_equal([t.value for t in tokens], values)
+        assert_equal([t._value for t in tokens], values)
+        assert_equal([t.fitsSigned16 for t in tokens],
+            [True, True, True, True, True, True, False, False, True, False,
+                False, False, False, False])
+        assert_equal([t.fitsUnsigned16 for t in tokens],
+            [True, True, True, True, True, False, True, False, False, False,
+                False, False, False, False])
+        assert_equal([t.overflows32 for t in tokens],
+            [False] * 11 + [True, False, True])
+
+    RegexLexer.set_source(source)
+    assert_equal([t.value for t in RegexLexer.lex_buffer()], values)
+    assert_equal(UIntBase16Token("0xAbC").value, 0xABC)
+
+    # Literals that do not fit in 32 bits are kept as warnings
+    for lexer in [LexerContext(), RegexLexerContext()]:
+        lexer.set_source(source)
+        lexer.lex_buffer()
+        assert_equal([(w.text, w.value, w.lineNo, w.charStart)
+                for w in lexer.warnings],
+            [("4294967296", 4294967296, 1, 66),
+                ("-2147483649", -2147483649, 1, 89)])
+        assert_equal(str(lexer.warnings[0]), "Lexer Warning: 4294967296 at "
+            "line 1 column 66 does not fit in 32 bits")
+    warnings = []
+    lex_parallel("declare int x = 1;\n" * 8 + source, 2, 64,
+        warnings=warnings)
+    assert_equal([(w.text, w.lineNo, w.charStart) for w in warnings],
+        [("4294967296", 9, 66), ("-2147483649", 9, 89)])
+
+    # Literals that do not fit in 32 bits are also traced as warnings
+    for lexer in [LexerContext(), RegexLexerContext()]:
+        sink = io.StringIO()
+        lexer.trace = Tracer(sink, WARNING, ['errors'])
+        lexer.set_source(source)
+        lexer.lex_buffer()
+        events = [json.loads(line) for line in sink.getvalue().splitlines()]
+        assert_equal([(e["event"], e["text"], e["column"]) for e in events],
+            [("overflow", "4294967296", 66), ("overflow", "-2147483649", 89)])
+
+    # A base prefix needs at least one digit after it
+    for prefix in ["0b", "0o", "0x"]:
+        for lexer in [Lexer, RegexLexer]:
+            lexer.set_source("declare int x = " + prefix + ";")
+            assert_raises(LexerException, list, lexer.tokens())
+        assert_raises(ValueError, UIntBase16Token.value_of, prefix)
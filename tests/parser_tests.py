@@ -1,12 +1,42 @@
 from nose.tools import *
+from concurrent.futures import ThreadPoolExecutor
+import io
+import json
+import os
+import pickle
 import sys
+import tempfile
 
 print("parser_tests: current path is:")
 print(sys.path)
 
 from lexer_tokens import *
-from parser_code import Parser
+from parser_code import Parser, ParserContext, Environment,\
+    ParserVariableUseWithoutDeclareException,\
+    ParserRepeatedDeclarationException,\
+    ParserFunctionSignatureDefinitionNotEqualException,\
+    ParserWrongTokenException, ParserUnknownTypeException,\
+    ParserFunctionUseWithoutDeclareException
 from parser_elements import *
+from lexer_code import Lexer, LexerContext
+from lexer_regex import RegexLexer
+from noggin_trace import Tracer, DEBUG, INFO
+from noggin_cache import FrontEndCache
+import noggin
+from symbol_table import SymbolTable, symbols
+from parser_arena import AstArena, nodeKinds
+from parser_incremental import IncrementalParser
+import parser_binary
+from noggin_types import intern_type, NT_bool, NT_char, NT_int, NT_uint
+from type_checker import TypeChecker, TypeMismatchException,\
+    TypeArgumentCountException, TypeArrayDimensionException
+from name_resolver import NameResolver,\
+    NameFunctionUseWithoutDeclareException,\
+    NameVariableUseWithoutDeclareException
+from call_graph import CallGraph
+
+sourceTestsDir = os.path.join(
+    os.path.dirname(__file__), "..", "noggin_source_tests")
 
 def setup():
     print("Setting up parser tests")
@@ -29,3 +59,744 @@ def test_parse_prog():
         ]
     Parser.set_tokens(prog1)
     p1 = Program.parse()
+
+def test_parse_token_stream():
+    path = os.path.join(sourceTestsDir, "test7.ngs")
+    with open(path) as f:
+        source = f.read()
+
+    Lexer.set_source(source)
+    Parser.set_tokens(list(Lexer.tokens()))
+    listProgram = Program.parse()
+
+    Lexer.set_source(source)
+    Parser.set_token_stream(Lexer.tokens())
+    streamProgram = Program.parse()
+    assert_equal(str(listProgram), str(streamProgram))
+    assert_equal(len(Parser.tokenStream.buffer), 0)
+
+def test_parse_token_buffer():
+    path = os.path.join(sourceTestsDir, "test10.ngs")
+    with open(path) as f:
+        source = f.read()
+
+    Lexer.set_source(source)
+    tokens = list(Lexer.tokens())
+    Parser.set_tokens(tokens)
+    listProgram = Program.parse()
+
+    RegexLexer.set_source(source)
+    buffer = RegexLexer.lex_buffer()
+    assert_equal(len(buffer), len(tokens))
+    assert_equal(list(buffer.kinds), [t.kind for t in tokens])
+    assert_equal(
+        [(type(t), t.original, t.lineNo, t.charStart, t.charEnd)
+            for t in buffer],
+        [(type(t), t.original, t.lineNo, t.charStart, t.charEnd)
+            for t in tokens])
+
+    Parser.set_tokens(buffer)
+    bufferProgram = Program.parse()
+    assert_equal(str(listProgram), str(bufferProgram))
+
+def parse_in_context(source):
+    lexer = LexerContext()
+    lexer.set_source(source)
+    parser = ParserContext(list(lexer.tokens()))
+    try:
+        return str(Program.parse(parser=parser))
+    except ParserException as e:
+        return str(e)
+
+def test_parse_contexts_concurrently():
+    sources = []
+    for name in sorted(os.listdir(sourceTestsDir)):
+        with open(os.path.join(sourceTestsDir, name)) as f:
+            sources.append(f.read())
+    serial = [parse_in_context(source) for source in sources]
+
+    # Each compilation has its own contexts, so they can share the process
+    with ThreadPoolExecutor(4) as executor:
+        concurrent = list(executor.map(parse_in_context, sources * 4))
+    assert_equal(concurrent, serial * 4)
+
+def test_trace_events():
+    path = os.path.join(sourceTestsDir, "test7.ngs")
+    with open(path) as f:
+        source = f.read()
+
+    sink = io.StringIO()
+    tracer = Tracer(sink, DEBUG, ['lexer', 'env'])
+    lexer = LexerContext()
+    lexer.trace = tracer
+    lexer.set_source(source)
+    parser = ParserContext(list(lexer.tokens()))
+    parser.trace = tracer
+    Program.parse(parser=parser)
+
+    events = [json.loads(line) for line in sink.getvalue().splitlines()]
+    assert_equal(set(e["category"] for e in events), set(["lexer", "env"]))
+    tokens = [e for e in events if e["event"] == "token"]
+    assert_equal(len(tokens), len(parser.tokenList))
+    assert_equal(tokens[0], {"category": "lexer", "level": "debug",
+        "event": "token", "kind": "DeclareToken", "text": "declare",
+        "line": 1, "column": 1})
+
+    # An exception is traced as it passes up through each parse() method
+    sink = io.StringIO()
+    lexer.set_source("declare int ;")
+    parser = ParserContext(list(lexer.tokens()))
+    parser.trace = Tracer(sink, INFO)
+    assert_raises(ParserException, Program.parse, None, parser)
+    events = [json.loads(line) for line in sink.getvalue().splitlines()]
+    assert_equal([(e["category"], e["event"]) for e in events],
+        [("errors", "caught"), ("errors", "caught")])
+    assert_equal(events[1]["context"],
+        "Program global variable declaration no 1")
+
+def test_front_end_cache():
+    path = os.path.join(sourceTestsDir, "test13.ngs")
+    with open(path, "rb") as f:
+        sourceBytes = f.read()
+    text = sourceBytes.decode()
+    lexer = LexerContext()
+    lexer.set_source(text)
+    buffer = lexer.lex_buffer()
+    program = Program.parse(parser=ParserContext(buffer))
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache = FrontEndCache(directory)
+        key = FrontEndCache.key(sourceBytes)
+        assert_equal(cache.load(key), None)
+        cache.store(key, buffer, program)
+
+        # The symbols are interned again in whatever table is given
+        table = SymbolTable()
+        cachedBuffer, cachedProgram, cachedWarnings = cache.load(key, table)
+        assert_equal(str(cachedProgram), str(program))
+        assert_equal(cachedBuffer.kinds, buffer.kinds)
+        assert_equal(cachedBuffer.starts, buffer.starts)
+        assert_equal([t.symbol for t in cachedBuffer if t.interned],
+            [table.intern(t.original) for t in buffer if t.interned])
+
+        assert_equal(cachedWarnings, [])
+
+        # Any change to the source or the lexer engine misses
+        assert_equal(cache.load(FrontEndCache.key(sourceBytes + b" ")), None)
+        assert_equal(cache.load(FrontEndCache.key(sourceBytes, "regex")),
+            None)
+
+        # Storing a second entry past the size limit evicts the older one
+        cache.maxSize = os.path.getsize(cache.path(key)) + 1
+        otherKey = FrontEndCache.key(b"")
+        cache.store(otherKey, buffer, program)
+        assert_equal(os.path.exists(cache.path(key)), False)
+        assert_equal(os.path.exists(cache.path(otherKey)), True)
+
+def test_front_end_cache_warnings():
+    # The lexer does not run on a hit, so its warnings are cached too
+    source = "declare int x = 4294967296;\n"
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "overflow.ngs")
+        with open(path, "w") as f:
+            f.write(source)
+        cacheDir = os.path.join(directory, "cache")
+        argv = sys.argv
+        stderr = sys.stderr
+        runs = []
+        try:
+            for run in range(2):
+                sys.argv = ["noggin", path, "--cache-dir", cacheDir]
+                sys.stderr = io.StringIO()
+                noggin.main()
+                runs.append(sys.stderr.getvalue())
+        finally:
+            sys.argv = argv
+            sys.stderr = stderr
+        assert_equal(len(os.listdir(cacheDir)), 1)
+        assert_equal(runs, ["Lexer Warning: 4294967296 at line 1 column 17 "
+            "does not fit in 32 bits\n"] * 2)
+
+def parse_source(source):
+    lexer = LexerContext()
+    lexer.set_source(source)
+    return Program.parse(parser=ParserContext(list(lexer.tokens())))
+
+def parse_buffer(source):
+    lexer = LexerContext()
+    lexer.set_source(source)
+    return lexer.lex_buffer()
+
+def test_environment_scopes():
+    globalScope = Environment()
+    globalScope.add(1, "global")
+    functionScope = globalScope.child()
+    functionScope.add(2, "argument")
+    assert_equal(functionScope.get(1), "global")
+    assert_equal(functionScope.contains(2), True)
+    assert_equal(globalScope.contains(2), False)
+    assert_raises(KeyError, globalScope.get, 2)
+    # A name in an outer scope cannot be declared again in an inner one
+    assert_raises(ParserRepeatedDeclarationException,
+        functionScope.child().add, 1, "again")
+
+    # Each block has its own scope, so sibling blocks may reuse a name
+    parse_source("declare function void f(bool b);\n"
+        "function void f(bool b) {\n"
+        "  if (b) { declare int x = 1; } else { declare int x = 2; }\n"
+        "  while (b) { declare int x = 3; }\n"
+        "}\n")
+    assert_raises(ParserRepeatedDeclarationException, parse_source,
+        "declare function void f(bool b);\n"
+        "function void f(bool b) {\n"
+        "  declare int x = 1;\n"
+        "  while (b) { declare int x = 3; }\n"
+        "}\n")
+
+    # Calls without an environment do not share a default one
+    for i in range(2):
+        lexer = LexerContext()
+        lexer.set_source("declare int x;")
+        DeclareStatement.parse(parser=ParserContext(list(lexer.tokens())))
+
+def parse_expression(source):
+    lexer = LexerContext()
+    lexer.set_source(source)
+    return str(Expression.parse(parser=ParserContext(list(lexer.tokens()))))
+
+def test_expression_precedence():
+    assert_equal(parse_expression("1 + 2 * 3 - 4 << 5 == 6 || 7 && 8 | 9"),
+        "(((((1 + (2 * 3)) - 4) << 5) == 6) || (7 && (8 | 9)))")
+    assert_equal(parse_expression("1 - 2 - 3 - 4"), "(((1 - 2) - 3) - 4)")
+    assert_equal(parse_expression("1 * 2 + 3 * 4 / 5 & 6 | 7"),
+        "((((1 * 2) + ((3 * 4) / 5)) & 6) | 7)")
+
+    # Associativity is set per operator
+    rightAssociative = BinaryOperatorToken.rightAssociative
+    BinaryOperatorToken.rightAssociative = frozenset(["-"])
+    try:
+        assert_equal(parse_expression("1 - 2 * 3 - 4 == 5"),
+            "((1 - ((2 * 3) - 4)) == 5)")
+    finally:
+        BinaryOperatorToken.rightAssociative = rightAssociative
+
+def nested_source(depth):
+    return ("declare function int f(int a);\n"
+        "function int f(int a) {\n"
+        + "if (a < 1) {\n" * depth
+        + "a = " + "f(" * depth + "a" + ")" * depth + ";\n"
+        + "}\n" * depth
+        + "return a;\n}\n")
+
+def parse_nested(source, iterative):
+    lexer = LexerContext()
+    lexer.set_source(source)
+    parser = ParserContext(lexer.lex_buffer())
+    parser.iterative = iterative
+    return Program.parse(parser=parser)
+
+def test_iterative_parsing():
+    # Both modes give the same trees and the same exceptions
+    for name in sorted(os.listdir(sourceTestsDir)):
+        with open(os.path.join(sourceTestsDir, name)) as f:
+            source = f.read()
+        results = []
+        for iterative in [False, True]:
+            try:
+                results.append(str(parse_nested(source, iterative)))
+            except ParserException as e:
+                results.append(str(e))
+        assert_equal(results[0], results[1])
+    assert_equal(str(parse_nested(nested_source(30), True)),
+        str(parse_nested(nested_source(30), False)))
+
+    # Nesting far deeper than the recursion limit
+    depth = sys.getrecursionlimit() * 5
+    assert_raises(RecursionError, parse_nested, nested_source(depth), False)
+    program = parse_nested(nested_source(depth), True)
+    statements = program.functionDefinitions[0].statements
+    for i in range(depth):
+        statements = statements.statements[0].ifThens[0].then
+    expression = statements.statements[0].expression.expression
+    for i in range(depth):
+        expression = expression.callArguments.callExpressions[0]
+    assert_equal(str(expression), "a")
+
+class SkipStatement(Statement):
+    @staticmethod
+    def parse(environment=None, parser=None):
+        expect_token(CaseToken, parser)
+        expect_token(SemiColonToken, parser)
+        return (SkipStatement(), environment)
+
+def test_statement_dispatch():
+    # Every statement starting token has a statement class to parse it
+    assert_equal(set(Statement.parsers),
+        set(t.kind for t in StatementStartingTokens))
+    assert_equal(Statement.parsers[ForToken.kind], ForLoopStatement)
+
+    source = ("declare function int f(int n);\n"
+        "function int f(int n) {\n"
+        "  declare int total = 0;\n"
+        "  for (int i = 0; i < n; i = i + 1) {\n"
+        "    total = total + i;\n"
+        "  }\n"
+        "  return total;\n"
+        "}\n")
+    statements = parse_source(source).functionDefinitions[0].statements
+    assert_equal(str(statements.statements[1]),
+        "for (int i = 0; (i < n); i = (i + 1)) {\n"
+        "total = (total + i);\n"
+        "}")
+    # The loop variable goes out of scope after the loop
+    assert_raises(ParserVariableUseWithoutDeclareException, parse_source,
+        source.replace("return total;", "return i;"))
+
+    # A statement class registered for a token starts being parsed at once
+    parsers = dict(Statement.parsers)
+    startingTokens = list(StatementStartingTokens)
+    try:
+        Statement.register(CaseToken, SkipStatement)
+        assert_equal(CaseToken in StatementStartingTokens, True)
+        lexer = LexerContext()
+        lexer.set_source("case; break;")
+        parser = ParserContext(list(lexer.tokens()))
+        assert_equal(Statement.able_to_start(parser), True)
+        assert_equal(len(Statements.parse(parser=parser).statements), 2)
+    finally:
+        Statement.parsers = parsers
+        StatementStartingTokens[:] = startingTokens
+
+def test_compact_nodes():
+    with open(os.path.join(sourceTestsDir, "test7.ngs")) as f:
+        program = parse_source(f.read())
+    statements = program.functionDefinitions[0].statements.statements
+    for node in [program, statements[0], statements[0].ifThens[0],
+            statements[0].ifThens[0].condition]:
+        assert_equal(hasattr(node, "__dict__"), False)
+    # Slotted nodes still pickle, as the front end cache needs
+    assert_equal(str(pickle.loads(pickle.dumps(program))), str(program))
+
+def arena_walk(arena, n, postorder=False):
+    """Return the indices of node n and the nodes under it, by recursion."""
+    below = [i for child in arena.children(n)
+        for i in arena_walk(arena, child, postorder)]
+    return below + [n] if postorder else [n] + below
+
+def test_arena_round_trip():
+    with open(os.path.join(sourceTestsDir, "test7.ngs")) as f:
+        source = f.read()
+    lexer = LexerContext()
+    lexer.set_source(source)
+    tokens = list(lexer.tokens())
+    program = Program.parse(parser=ParserContext(tokens))
+    arena = AstArena.from_program(program, tokens)
+
+    assert_equal(str(arena.to_program()), str(program))
+    assert_equal(arena.kind_name(0), "Program")
+    assert_equal((arena.firstTokens[0], arena.lastTokens[0]),
+        (0, len(tokens) - 1))
+
+    # The children of each node are laid out next to each other, after it
+    for n in range(len(arena)):
+        for child in arena.children(n):
+            assert_true(child > n)
+
+    assert_equal(list(arena.preorder()), arena_walk(arena, 0))
+    assert_equal(list(arena.postorder()), arena_walk(arena, 0, True))
+    assert_equal(len(list(arena.preorder())), len(arena))
+
+    # A shared node is held once, with links standing in for it elsewhere
+    for n in range(len(arena)):
+        if arena.kind_name(n) == "LINK":
+            assert_true(arena.kinds[arena.data[n]] in nodeKinds.values())
+
+    # A subtree is made with the nodes it links to outside of it
+    n = list(arena.children(0))[2]
+    definition = arena.to_program(arena.childStarts[n])
+    assert_equal(type(definition), FunctionDefinition)
+    assert_equal(type(definition.declaration), FunctionDeclaration)
+    assert_equal(str(definition.declaration),
+        str(program.functionDefinitions[0].declaration))
+
+    # A token that is not one of the buffer is kept as a value
+    madeToken = IdentToken("made")
+    program.functionDefinitions[0].functionName = madeToken
+    arena = AstArena.from_program(program, tokens)
+    assert_true(arena.to_program().functionDefinitions[0].functionName
+        is madeToken)
+
+def parse_lazily(source, tokens="list"):
+    lexer = LexerContext()
+    lexer.set_source(source)
+    parser = ParserContext()
+    if tokens == "stream":
+        parser.set_token_stream(lexer.tokens())
+    elif tokens == "buffer":
+        parser.set_tokens(lexer.lex_buffer())
+    else:
+        parser.set_tokens(list(lexer.tokens()))
+    parser.lazyBodies = True
+    return Program.parse(parser=parser)
+
+def test_lazy_bodies():
+    # Whatever the tokens are held in, a lazily parsed program is the same
+    # once its bodies are used
+    for name in ["test7.ngs", "test9.ngs", "test13.ngs"]:
+        with open(os.path.join(sourceTestsDir, name)) as f:
+            source = f.read()
+        program = parse_source(source)
+        for tokens in ["list", "buffer", "stream"]:
+            lazyProgram = parse_lazily(source, tokens)
+            assert_true(all(d.body is not None
+                for d in lazyProgram.functionDefinitions))
+            assert_equal(str(lazyProgram), str(program))
+            assert_true(all(d.body is None
+                for d in lazyProgram.functionDefinitions))
+
+    # Errors in a body only come out when the body is used, but errors in
+    # the signature still come out at once
+    source = ("declare function int f(int a);\n"
+        "function int f(int a) {\n"
+        "if (a < 1) { return b; }\n"
+        "return a;\n}\n")
+    program = parse_lazily(source)
+    assert_equal(str(program.functionDefinitions[0].lastToken.original), "}")
+    assert_raises(ParserVariableUseWithoutDeclareException,
+        lambda: program.functionDefinitions[0].statements)
+    assert_raises(ParserFunctionSignatureDefinitionNotEqualException,
+        parse_lazily, source.replace("f(int a) {", "f(char a) {"))
+    assert_raises(ParserWrongTokenException,
+        parse_lazily, source[:-2])
+
+def parse_with_workers(source, workers):
+    lexer = LexerContext()
+    lexer.set_source(source)
+    parser = ParserContext(lexer.lex_buffer())
+    parser.workers = workers
+    try:
+        return str(Program.parse(parser=parser))
+    except ParserException as e:
+        return str(e)
+
+def test_parallel_parsing():
+    # The same trees and the same errors as parsing in one process
+    for name in sorted(os.listdir(sourceTestsDir)):
+        with open(os.path.join(sourceTestsDir, name)) as f:
+            source = f.read()
+        assert_equal(parse_with_workers(source, 2),
+            parse_with_workers(source, 0))
+
+    # The error of the first function wins, wherever it is found
+    source = ("declare function int f(int a);\n"
+        "declare function int g(int a);\n"
+        "declare function int h(int a);\n"
+        "function int f(int a) { return a; }\n"
+        "function int g(int a) { return b; }\n"
+        "function int h(char a) { return a; }\n")
+    assert_equal(parse_with_workers(source, 2), parse_with_workers(source, 0))
+    assert_true("variable" in parse_with_workers(source, 2))
+
+    # What a worker process sends back has to survive pickling
+    environment = Environment()
+    environment.add(symbols.intern("a"), "declaration")
+    scope = pickle.loads(pickle.dumps(environment.child()))
+    assert_equal(scope.get(symbols.intern("a")), "declaration")
+    e = ParserUnknownTypeException("double")
+    assert_equal(str(pickle.loads(pickle.dumps(e))), str(e))
+
+def token_positions(program):
+    return [(t.lineNo, t.charStart, t.offsetStart)
+        for d in program.functionDefinitions
+        for t in [d.firstToken, d.lastToken, d.functionName.ident.token]]
+
+def test_incremental_parsing():
+    source = ("declare function int f(int a);\n"
+        "declare function int g(int a);\n"
+        "declare function int h(int a);\n"
+        "function int f(int a) { return a; }\n"
+        "function int g(int a) { return a + 1; }\n"
+        "function int h(int a) { return g(a); }\n")
+    incremental = IncrementalParser()
+    incremental.parse(ParserContext(parse_buffer(source)))
+    assert_equal(incremental.reparsed, 3)
+
+    # Only the changed function is parsed, and the ones after it are moved
+    edited = source.replace("return a + 1;", "\n\n  return a + 2;")
+    program = incremental.parse(ParserContext(parse_buffer(edited)))
+    assert_equal((incremental.reused, incremental.reparsed), (2, 1))
+    fresh = Program.parse(parser=ParserContext(parse_buffer(edited)))
+    assert_equal(str(program), str(fresh))
+    assert_equal(token_positions(program), token_positions(fresh))
+
+    # An error leaves the last parse to be reused
+    broken = edited.replace("return g(a);", "return b;")
+    assert_raises(ParserVariableUseWithoutDeclareException,
+        incremental.parse, ParserContext(parse_buffer(broken)))
+    incremental.parse(ParserContext(parse_buffer(edited)))
+    assert_equal((incremental.reused, incremental.reparsed), (3, 0))
+
+    # A change to the declarations parses everything again
+    edited = "declare int x;\n" + edited
+    program = incremental.parse(ParserContext(parse_buffer(edited)))
+    assert_equal((incremental.reused, incremental.reparsed), (0, 3))
+    assert_equal(str(program),
+        str(Program.parse(parser=ParserContext(parse_buffer(edited)))))
+
+def test_binary_programs():
+    with open(os.path.join(sourceTestsDir, "test9.ngs")) as f:
+        source = f.read()
+    buffer = parse_buffer(source)
+    program = Program.parse(parser=ParserContext(buffer))
+    data = parser_binary.dumps(program, buffer)
+
+    tokens, loaded = parser_binary.loads(data)
+    assert_equal(str(loaded), str(program))
+    assert_equal(list(tokens.kinds), list(buffer.kinds))
+    # The token positions are kept for source references
+    assert_equal(
+        [d.source_ref() for d in loaded.functionDefinitions],
+        [d.source_ref() for d in program.functionDefinitions])
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "test9.nga")
+        parser_binary.save(program, buffer, path)
+        assert_equal(str(parser_binary.load(path)[1]), str(program))
+
+    assert_raises(parser_binary.AstFormatException,
+        parser_binary.loads, b"NGC" + data[3:])
+    assert_raises(parser_binary.AstFormatException,
+        parser_binary.loads, data[:len(data) // 2])
+    # A writer with other token classes is rejected
+    assert_raises(parser_binary.AstFormatException,
+        parser_binary.loads, data.replace(b"IdentToken", b"IdentTokex", 1))
+
+    # The tokens of a memory-mapped source keep byte offsets into its raw
+    # bytes, carriage returns and all
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "crlf.ngs")
+        with open(path, "wb") as f:
+            f.write(source.replace("\n", "\r\n").encode()
+                + "# caf\u00e9\r\n".encode())
+        lexer = LexerContext()
+        mapped = lexer.set_source_file(path)
+        buffer = lexer.lex_buffer()
+        program = Program.parse(parser=ParserContext(buffer))
+        data = parser_binary.dumps(program, buffer)
+        expected = [buffer[i].original for i in range(len(buffer))]
+        mapped.close()
+    tokens, loaded = parser_binary.loads(data)
+    assert_equal(str(loaded), str(program))
+    assert_equal([tokens[i].original for i in range(len(tokens))], expected)
+
+    # A token that is not one of the buffer is saved with its own text and
+    # position
+    buffer = parse_buffer(source)
+    program = Program.parse(parser=ParserContext(buffer))
+    program.functionDefinitions[0].functionName = IdentToken("made", 4, 2, 6)
+    tokens, loaded = parser_binary.loads(parser_binary.dumps(program, buffer))
+    madeToken = loaded.functionDefinitions[0].functionName
+    assert_equal(type(madeToken), IdentToken)
+    assert_equal((madeToken.original, madeToken.lineNo, madeToken.charStart,
+        madeToken.charEnd), ("made", 4, 2, 6))
+    assert_equal(str(loaded), str(program))
+    # A token without a position keeps the placeholders
+    program.functionDefinitions[0].functionName = IdentToken("made")
+    tokens, loaded = parser_binary.loads(parser_binary.dumps(program, buffer))
+    assert_equal(loaded.functionDefinitions[0].functionName.lineNo, "?")
+
+    # Only lexed tokens have offsets to keep in a token buffer
+    assert_raises(ValueError, TokenBuffer.from_tokens,
+        [IdentToken("made")])
+
+def check_types(source):
+    program = parse_source(source)
+    checker = TypeChecker()
+    checker.check(program)
+    return (program, checker)
+
+def test_type_checking():
+    # Types are interned, so equal types are the same object, even pickled
+    assert intern_type("int", 2) is intern_type("int", 2)
+    assert intern_type("int", 2) is not intern_type("int", 1)
+    assert pickle.loads(pickle.dumps(intern_type("char", 1))) \
+        is intern_type("char", 1)
+    assert_equal(str(intern_type("char", 2)), "char[][]")
+
+    source = ("declare function uint lengthOf(char[] s);\n"
+        "declare char[] name;\n"
+        "function uint lengthOf(char[] s) {\n"
+        "    declare int i = 0;\n"
+        "    declare uint n = 0;\n"
+        "    while (i < 10 && s[i] != name[0]) {\n"
+        "        i = i + 1;\n"
+        "        n = n / 2 + i;\n"
+        "    }\n"
+        "    return n;\n"
+        "}\n")
+    (program, checker) = check_types(source)
+    loop = program.functionDefinitions[0].statements.statements[2]
+    condition = loop.whileExpression
+    assert checker.type_of(condition) is NT_bool
+    # The literal takes on the type of i, so the comparison is signed
+    assert checker.operand_type(condition.left) is NT_int
+    assert checker.type_of(condition.left.right) is NT_int
+    assert checker.operand_type(condition.right) is NT_char
+    assert checker.type_of(condition.right.left) is NT_char
+    # A uint and an int are added as uints
+    assignment = loop.doStatements.statements[1].expression
+    assert checker.type_of(assignment.expression) is NT_uint
+    assert checker.operand_type(assignment.expression.left) is NT_uint
+
+    assert_raises(TypeMismatchException, check_types,
+        "declare function void f();\n"
+        "function void f() { declare bool b = true; b = b + 1; }")
+    assert_raises(TypeMismatchException, check_types,
+        "declare function void f();\n"
+        "function void f() { declare int x = 0; if (x) { x = 1; } }")
+    assert_raises(TypeMismatchException, check_types,
+        "declare function void f();\n"
+        "function void f() { return 1; }")
+    assert_raises(TypeArrayDimensionException, check_types,
+        "declare function void f(int[] a);\n"
+        "function void f(int[] a) { declare int x = a[0][1]; }")
+    assert_raises(TypeArgumentCountException, check_types,
+        "declare function int g(int a);\n"
+        "declare function void f();\n"
+        "function void f() { declare int x = g(1, 2); }")
+    # Names are resolved before their types are checked
+    assert_raises(NameVariableUseWithoutDeclareException, check_types,
+        "declare function void f();\n"
+        "function void f() { declare int x = f; }")
+
+    # The checker follows the declarations given by a resolver
+    program = parse_source(source)
+    resolver = NameResolver()
+    resolver.resolve(program)
+    checker = TypeChecker()
+    checker.check(program, resolver)
+    loop = program.functionDefinitions[0].statements.statements[2]
+    assert checker.operand_type(loop.whileExpression.left) is NT_int
+
+def test_name_resolution():
+    source = ("declare function int sum(int[] values, int count);\n"
+        "declare int total = 0;\n"
+        "function int sum(int[] values, int count) {\n"
+        "    declare int s = 0;\n"
+        "    for (int i = 0; i < count; i = i + 1) {\n"
+        "        declare int v = values[i];\n"
+        "        s = s + v;\n"
+        "    }\n"
+        "    declare int last = sum(values, count);\n"
+        "    total = last;\n"
+        "    return s;\n"
+        "}\n")
+    program = parse_source(source)
+    resolver = NameResolver()
+    resolver.resolve(program)
+
+    definition = program.functionDefinitions[0]
+    (values, count) = definition.signatureArguments.signatureArguments
+    (declareS, loop, declareLast, assignTotal, returnS) = \
+        definition.statements.statements
+    (declareV, addV) = loop.statements.statements
+    assert declareV.value.declaration is values
+    assert declareV.value.levelExpression[0].declaration is loop.initialisation
+    assert addV.expression.declaration is declareS
+    assert addV.expression.expression.right.declaration is declareV
+    assert declareLast.value.declaration is program.functionDeclarations[0]
+    assert assignTotal.expression.declaration \
+        is program.globalVariableDeclarations[0]
+    assert returnS.expression.declaration is declareS
+
+    # The arguments come first, and last reuses the slot of the loop variable
+    assert_equal([resolver.slot_of(d) for d in (values, count, declareS,
+        loop.initialisation, declareV, declareLast)], [0, 1, 2, 3, 4, 3])
+    assert_equal(resolver.frame_size(definition), 5)
+    assert_equal(
+        resolver.label_of(program.globalVariableDeclarations[0]),
+        "global_total")
+
+    # The links survive the arena, as links to the declarations
+    arena = AstArena.from_program(program, parse_buffer(source))
+    loaded = arena.to_program()
+    statements = loaded.functionDefinitions[0].statements.statements
+    assert statements[4].expression.declaration is statements[0]
+
+    assert_raises(NameFunctionUseWithoutDeclareException,
+        NameResolver().resolve, parse_source(
+            "declare function void f();\n"
+            "function void f() { g(); }"))
+
+def test_call_graph():
+    source = ("declare function void print(string s);\n"
+        "declare function int even(int n);\n"
+        "declare function int odd(int n);\n"
+        "declare function int fact(int n);\n"
+        "declare function void main();\n"
+        "function int even(int n) {\n"
+        "    if (n == 0) { return 1; }\n"
+        "    return odd(n - 1);\n"
+        "}\n"
+        "function int odd(int n) {\n"
+        "    if (n == 0) { return 0; }\n"
+        "    return even(n - 1);\n"
+        "}\n"
+        "function int fact(int n) {\n"
+        "    if (n == 0) { return 1; }\n"
+        "    return n * fact(n - 1);\n"
+        "}\n"
+        "function void main() {\n"
+        "    declare int x = fact(3);\n"
+        "    print(\"done\");\n"
+        "}\n")
+    program = parse_source(source)
+    resolver = NameResolver()
+    resolver.resolve(program)
+    graph = CallGraph(program, resolver)
+    (printFunction, even, odd, fact, main) = [graph.index_of(name)
+        for name in ("print", "even", "odd", "fact", "main")]
+    assert_equal(graph.callees[main], [fact, printFunction])
+    assert_equal(graph.callers[even], [odd])
+    assert graph.is_leaf(printFunction)
+    assert not graph.is_leaf(main)
+    assert graph.is_recursive(even) and graph.is_recursive(odd)
+    assert graph.is_recursive(fact) and not graph.is_recursive(main)
+    assert_equal(sorted(graph.components[graph.componentOf[even]]),
+        [even, odd])
+    # Callees come before their callers
+    order = graph.bottom_up()
+    assert order.index(printFunction) < order.index(main)
+    assert order.index(fact) < order.index(main)
+    # The frame sizes are those laid out by the resolver, and print is only
+    # declared
+    assert_equal(resolver.frame_size(graph.definitions[main]), 1)
+    assert_equal(graph.stack_usage(resolver),
+        [0, None, None, None, None])
+
+    # Without the recursion, main uses its own frame and that of fact
+    program = parse_source(source.replace("n * fact(n - 1)", "n * 2"))
+    resolver = NameResolver()
+    resolver.resolve(program)
+    graph = CallGraph(program, resolver)
+    assert_equal(graph.stack_usage(resolver)[fact:],
+        [resolver.frame_size(graph.definitions[fact]), 2])
+
+    # A call to a function that is not declared is a resolution error
+    assert_raises(NameFunctionUseWithoutDeclareException, CallGraph,
+        parse_source("declare function void f();\n"
+            "function void f() { g(); }"))
+
+    # A chain of calls deeper than Python's recursion limit
+    depth = 2 * sys.getrecursionlimit()
+    source = ("".join("declare function void f%d();\n" % i
+            for i in range(depth))
+        + "".join("function void f%d() { f%d(); }\n" % (i, i + 1)
+            for i in range(depth - 1)))
+    program = parse_source(source)
+    graph = CallGraph(program)
+    assert_equal(graph.bottom_up(), list(range(depth - 1, -1, -1)))
+    # The last function is only declared, so uses no stack
+    assert_equal(graph.stack_usage(dict(
+            (definition, 1) for definition in program.functionDefinitions)),
+        list(range(depth - 1, -1, -1)))